@@ -1,10 +1,27 @@
 import streamlit as st
 import pandas as pd
-import textwrap
-import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Hashable, Optional, Tuple
+import hashlib
 import datetime
 import json
+import time
+
+import perf
+from archive import ARCHIVE_FORMATS, archive_bytes, archive_sites, filter_archive, import_archive, open_archive, spill_files, spill_to_disk
+from bandit import METHODS, OBJECTIVES, BanditModel
+from constraints import HEADLINE, RuleBook, cell_labels, describe, fit_headline, fit_variants
+from exports import EXPORT_FORMATS, content_digest, export_path
+from dedupe import NearDupIndex, ad_copy, duplicate_groups, signatures
+from directory import SITE_FIELDS, DirectoryOverlay, SiteDirectory, read_sites, validate_site
+from health import SiteChecker
+from ingest import GRAINS, ingest_events
+from store import TABLES, PostingStore
+from rollups import METRIC_COLUMNS, derive_metrics, downsample, rollup_frame
+from recommend import SiteRanker, SiteStats, brief_target, describe as describe_sites, overlay_scores, top
+from scheduler import PostingPlan, RateLimit
+from scoring import SCORE_COLUMNS, LiveScorer, ad_text, load_ads_file, score_corpus
+from variants import MASTER_STYLES, BulkJob, make_variants, read_briefs, variant_id
+from webhooks import SOURCE, WebhookDispatcher
 
 # ---------- App Config ----------
 st.set_page_config(
@@ -14,32 +31,55 @@ st.set_page_config(
 )
 
 # ---------- Session Defaults ----------
-if "sites" not in st.session_state:
-    st.session_state["sites"] = []  # will be populated by upload or code
-if "history" not in st.session_state:
-    st.session_state["history"] = []  # log of postings
-if "variants" not in st.session_state:
-    st.session_state["variants"] = []
-if "ad_saved" not in st.session_state:
-    st.session_state["ad_saved"] = None
-if "campaign" not in st.session_state:
-    st.session_state["campaign"] = []
-if "zap_url" not in st.session_state:
-    st.session_state["zap_url"] = ""
-if "admin_authenticated" not in st.session_state:
-    st.session_state["admin_authenticated"] = False
+# Filled once per browser session instead of being re-checked on every rerun.
+if "_session_ready" not in st.session_state:
+    if "variants" not in st.session_state:
+        st.session_state["variants"] = []
+    # Bumped by set_variants; caches built from the variants are keyed on it.
+    st.session_state["variants_version"] = 0
+    if "ad_saved" not in st.session_state:
+        st.session_state["ad_saved"] = None
+    if "bulk_job" not in st.session_state:
+        st.session_state["bulk_job"] = None
+    if "scored_ads" not in st.session_state:
+        st.session_state["scored_ads"] = None
+    if "zap_url" not in st.session_state:
+        st.session_state["zap_url"] = ""
+    if "admin_authenticated" not in st.session_state:
+        st.session_state["admin_authenticated"] = False
+    # One-shot messages shown after a rerun, one key per place that shows them.
+    if "post_flash" not in st.session_state:
+        st.session_state["post_flash"] = ""
+    if "bulk_flash" not in st.session_state:
+        st.session_state["bulk_flash"] = ""
+    if "live_score" not in st.session_state:
+        st.session_state["live_score"] = None
+    st.session_state["_cache"] = {}
+    st.session_state["_session_ready"] = True
 
 # ---------- Default Sites (if none loaded) ----------
 PRIMARY_SITES: List[Dict[str, Any]] = [
-    {"name":"Craigslist","region":"Global/US","category":"General","needs_account":True,"url":"https://www.craigslist.org","notes":"Local posting; manual; strict rules."},
+    {"name":"Craigslist","region":"Global/US","category":"General","needs_account":True,"url":"https://www.craigslist.org","notes":"Local posting; manual; strict rules.","rules":{"max_headline":70}},
     {"name":"Facebook Marketplace","region":"Global","category":"General","needs_account":True,"url":"https://www.facebook.com/marketplace","notes":"High reach; FB account required."},
     {"name":"Locanto","region":"Global","category":"General","needs_account":True,"url":"https://www.locanto.com","notes":"Many city-based pages; text + images."},
     {"name":"ClassifiedAds","region":"US","category":"General","needs_account":True,"url":"https://www.classifiedads.com","notes":"Free general classifieds."},
     {"name":"OfferUp","region":"US","category":"Local Apps","needs_account":True,"url":"https://offerup.com","notes":"Mobile-first local marketplace."},
 ]
 
-if not st.session_state["sites"]:
-    st.session_state["sites"] = PRIMARY_SITES.copy()
+@st.cache_resource(max_entries=8)
+def shared_sites(digest: str, _source: Any = None) -> Tuple[SiteDirectory, List[str]]:
+    # One read-only directory per distinct sites file (keyed by content hash),
+    # shared by every session; sessions keep their edits in a DirectoryOverlay.
+    if _source is None:
+        return SiteDirectory(dict(s) for s in PRIMARY_SITES), []
+    return read_sites(_source)
+
+@st.cache_resource(max_entries=8)
+def shared_sites_frame(digest: str, _base: SiteDirectory) -> pd.DataFrame:
+    return pd.DataFrame(_base.columns(), columns=SITE_FIELDS)
+
+if "sites" not in st.session_state:
+    st.session_state["sites"] = DirectoryOverlay(shared_sites("primary")[0], "primary")
 
 # ---------- Styles ----------
 st.markdown("""
@@ -122,104 +162,7 @@ div.stDownloadButton > button {
 </style>
 """, unsafe_allow_html=True)
 
-# ---------- Copy Helpers ----------
-EMO_TRIGGERS = ["secret","finally","new","weird","shocking","hidden","proven","guarantee","instantly","limited","exclusive","today","now","fast","breakthrough","odd"]
-CTA_PHRASES = ["click here","tap here","join now","buy now","order now","get started","sign up","enroll now","start now","act now","claim","grab"]
-
-MASTER_STYLES = {
-    "Gary Halbert": "raw, emotional hooks (greed/fear/curiosity), short punchy lines, story lead-ins",
-    "David Ogilvy": "benefit-first, specific proof, facts, and strong subheads",
-    "Dan Kennedy": "no-BS direct response, deadlines, risk reversal, clear offer",
-    "Claude Hopkins": "self-interest, testable claims, unique mechanism/USP",
-    "Joe Sugarman": "slippery-slide curiosity, sensory detail, axioms of trust",
-    "Eugene Schwartz": "awareness stages aligned to market desire, breakthrough promise",
-    "John Carlton": "killer hooks, urgency, vivid storytelling, exclusivity",
-    "Robert Bly": "4 U's (Urgent, Unique, Useful, Ultra-specific), long-form structure",
-    "Neville Medhora": "simple, scannable, problem→solution→proof",
-    "Joanna Wiebe": "voice-of-customer, message mining, test-ready copy",
-    "Hybrid Mix": "blend of the above tuned to conversion",
-}
-
-def analyze_copy_score(text: str) -> Dict[str, float]:
-    if not text.strip():
-        return {"Score": 0, "Length": 0, "Emotion": 0, "Structure": 0, "CTA": 0, "Specificity": 0}
-    t = text.lower()
-    words = re.findall(r"\w+", text)
-    n = len(words)
-    length = 20 if n < 80 else 60 if n <= 1500 else 50
-    emotion = min(sum(1 for k in EMO_TRIGGERS if k in t)/10,1)*100
-    structure = min(sum(1 for k in ["attention","interest","desire","action","problem","agitate","solution","guarantee","bonus"] if k in t)/6,1)*100
-    cta = min(sum(1 for k in CTA_PHRASES if k in t)/3,1)*100
-    specificity = min(
-        sum(bool(re.search(r"\d|\$|\d+%", text)))
-        + sum(1 for k in ["day","days","week","weeks","month","months"] if k in t),
-        5
-    )/5*100
-    score = round(0.2*length + 0.25*emotion + 0.2*structure + 0.15*cta + 0.2*specificity,1)
-    return {
-        "Score":score,
-        "Length":float(length),
-        "Emotion":round(emotion,1),
-        "Structure":round(structure,1),
-        "CTA":round(cta,1),
-        "Specificity":round(specificity,1)
-    }
-
-def make_variants(product: str, benefit: str, audience: str, master: str) -> List[Dict[str, str]]:
-    a = audience.strip() or "someone who needs this"
-    b = benefit.strip() or "get real results without the struggle"
-    short_b = b.split("(")[0].strip()
-    h = []
-    h.append(f"Finally: {product} That Helps You {short_b.capitalize()} — Without The Struggle")
-    h.append(f"How {a.capitalize()} Can {short_b} with {product}")
-    h.append(f"{product}: The “{short_b}” Shortcut You Can Start Using Today")
-    h.append(f"Do You Make These Mistakes When Trying to {short_b}?")
-    h.append(f"The Hidden Shortcut to {short_b} No One Told You About")
-    body = textwrap.dedent(f"""
-    [{master}-inspired tone – {MASTER_STYLES.get(master,'conversion-focused')}]
-
-    ATTENTION
-    If you're {a}, you're not alone. Most attempts to {short_b.lower()} fail because of confusing advice and copy that doesn't speak to what you actually want.
-
-    INTEREST
-    **{product}** is built to change that. It leads with the one thing you care about: {short_b.lower()} (backed by a clear, simple path).
-
-    DESIRE
-    • {short_b}
-    • Save time and guesswork
-    • See real progress you can feel
-
-    ACTION
-    Click to get started now. Limited attention = limited action. Act while it’s top of mind.
-    """).strip()
-    return [{"headline": x, "body": body} for x in h]
-
-def export_ads(ads: List[Dict[str,str]], fmt: str="csv") -> bytes:
-    df = pd.DataFrame(ads)
-    if fmt=="csv":
-        return df.to_csv(index=False).encode("utf-8")
-    if fmt=="md":
-        md = ["# Classified Ads", ""]
-        for i,row in df.iterrows():
-            md += [
-                f"## Ad {i+1}",
-                f"**Headline:** {row.get('headline','')}",
-                "",
-                row.get("body",""),
-                ""
-            ]
-        return "\n".join(md).encode("utf-8")
-    html = ["<html><body><h1>Classified Ads</h1>"]
-    for i,row in df.iterrows():
-        html += [
-            f"<h2>Ad {i+1}</h2>",
-            f"<p><strong>Headline:</strong> {row.get('headline','')}</p>",
-            f"<pre>{row.get('body','')}</pre>",
-            "<hr/>"
-        ]
-    html.append("</body></html>")
-    return "\n".join(html).encode("utf-8")
-
+# ---------- UI Helpers ----------
 def render_footer():
     st.markdown(
         """
@@ -232,6 +175,385 @@ def render_footer():
         unsafe_allow_html=True
     )
 
+@st.cache_resource
+def get_store() -> PostingStore:
+    # One connection per process; history and snapshots outlive browser sessions.
+    # Capped tables spill their oldest rows to Parquet files under data/spill.
+    return PostingStore(spill=spill_to_disk)
+
+@st.cache_resource
+def get_dispatcher() -> WebhookDispatcher:
+    return WebhookDispatcher()
+
+@st.cache_resource
+def get_dup_index() -> NearDupIndex:
+    return NearDupIndex()
+
+@st.cache_resource
+def get_live_scorer() -> LiveScorer:
+    # Line and text caches are shared, so variants scored once are free for every session.
+    return LiveScorer()
+
+@st.cache_resource
+def get_site_checker() -> SiteChecker:
+    # One checker and health cache per process; results persist under data/.
+    return SiteChecker()
+
+@st.cache_resource
+def get_plan_board() -> Dict[str, Optional[PostingPlan]]:
+    # The active posting plan, shared by every operator session in the process.
+    return {"plan": None}
+
+@st.cache_resource
+def get_bandit() -> BanditModel:
+    return BanditModel()
+
+def bandit_model() -> BanditModel:
+    # Shared by all sessions; each call folds in only snapshots added since the last one.
+    model = get_bandit()
+    model.sync(get_store())
+    return model
+
+@st.cache_resource
+def get_site_stats() -> SiteStats:
+    return SiteStats()
+
+def site_stats() -> SiteStats:
+    # Shared by all sessions; each call folds in only rows added since the last one.
+    stats = get_site_stats()
+    stats.sync(get_store())
+    return stats
+
+@st.cache_resource(max_entries=8)
+def shared_site_ranker(digest: str, _base: SiteDirectory) -> SiteRanker:
+    return SiteRanker(_base)
+
+def history_index() -> NearDupIndex:
+    # Shared by all sessions; each call folds in only rows logged since the last one.
+    index = get_dup_index()
+    index.sync(get_store())
+    return index
+
+def emit_event(event: str, data: Dict[str, Any]) -> None:
+    # Queued for the background dispatcher; never blocks the rerun.
+    if st.session_state.get("zap_url"):
+        get_dispatcher().emit(st.session_state["zap_url"], event, data)
+
+def session_cached(key: Hashable, version: Hashable, build: Callable[[], Any]) -> Any:
+    # Per-session cache for DataFrames and payloads; an entry is rebuilt only
+    # when the version of the data it was built from changes.
+    cache = st.session_state["_cache"]
+    hit = cache.get(key)
+    if hit is None or hit[0] != version:
+        hit = cache[key] = (version, build())
+    return hit[1]
+
+def set_variants(variants: List[Dict[str, str]]) -> None:
+    # The saved brief carries the same variants to exports, webhooks and the
+    # posting queue; it is replaced, not edited, since queued events may hold it.
+    st.session_state["variants"] = variants
+    st.session_state["variants_version"] += 1
+    saved = st.session_state.get("ad_saved")
+    if saved is not None:
+        st.session_state["ad_saved"] = {**saved, "variants": variants}
+
+def sites_frame(ids: Optional[List[int]] = None) -> pd.DataFrame:
+    # Rows of this session's directory view, sliced from the shared base table;
+    # only sites the session added are built per session, and nothing is kept.
+    directory = st.session_state["sites"]
+    base = shared_sites_frame(directory.key, directory.base)
+    if not directory.changed:
+        return base if ids is None else base.iloc[ids]
+    if ids is not None:
+        # A page in any order (e.g. sorted) mixing base and added sites.
+        return pd.DataFrame([directory.record(i) for i in ids], columns=SITE_FIELDS)
+    base_ids, added_ids = directory.split(directory.visible_ids())
+    parts = [base.iloc[base_ids]]
+    if added_ids:
+        parts.append(pd.DataFrame(directory.added.columns(added_ids), columns=SITE_FIELDS))
+    return pd.concat(parts, ignore_index=True)
+
+@st.fragment
+@perf.timed("fragment:render_store_table")
+def render_store_table(table: str, page_key: str, empty_msg: str, page_size: int = 100) -> None:
+    # Filtering, sorting and paging all happen in SQLite; only the visible
+    # page is fetched and sent to the browser, however large the table is.
+    store = get_store()
+    if not store.count(table):
+        st.info(empty_msg)
+        return
+    columns = list(TABLES[table])
+    colf = st.columns([2, 2, 1, 1, 1, 1])
+    with colf[0]:
+        search = st.text_input("Search", "", key=f"{page_key}_search", placeholder="text in any column")
+    with colf[1]:
+        site_options = session_cached((table, "sites"), store.versions[table], lambda: store.sites(table))
+        site = st.selectbox("Site", ["All"] + site_options, key=f"{page_key}_site")
+    with colf[2]:
+        since = st.date_input("From", value=None, key=f"{page_key}_since")
+    with colf[3]:
+        until = st.date_input("To", value=None, key=f"{page_key}_until")
+    with colf[4]:
+        order_by = st.selectbox("Sort by", columns, key=f"{page_key}_sort")
+    with colf[5]:
+        newest_first = st.toggle("Descending", value=True, key=f"{page_key}_desc")
+    filters = {
+        "site": None if site == "All" else site,
+        "since": since.isoformat() if since else None,
+        "until": (until + datetime.timedelta(days=1)).isoformat() if until else None,
+        "search": search.strip(),
+    }
+    total = session_cached((table, "count", *filters.values()), store.versions[table], lambda: store.count(table, **filters))
+    if not total:
+        st.info("No rows match these filters.")
+        return
+    pages = (total + page_size - 1) // page_size
+    pg = 1
+    if pages > 1:
+        pg = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1, key=page_key)
+    df = session_cached(
+        (table, "page", pg, page_size, order_by, newest_first, *filters.values()),
+        store.versions[table],
+        lambda: pd.DataFrame(
+            store.fetch(table, limit=page_size, offset=(pg - 1) * page_size, order_by=order_by, newest_first=newest_first, **filters),
+            columns=columns
+        )
+    )
+    first = (pg - 1) * page_size + 1
+    st.caption(f"Rows {first:,}–{first + len(df) - 1:,} of {total:,}.")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+@st.fragment
+@perf.timed("fragment:render_sites_table")
+def render_sites_table(ids: List[int], key: str, filters: Hashable = None, page_size: int = 100) -> None:
+    # Only the visible page of sites is built into a frame; a sort order is
+    # cached per session as positions, not as a copy of the table.
+    directory = st.session_state["sites"]
+    if not ids:
+        st.info("No sites match your filters.")
+        return
+    cols = st.columns([2, 1, 1])
+    with cols[0]:
+        order_by = st.selectbox("Sort by", ["(directory order)"] + SITE_FIELDS, key=f"{key}_sort")
+    with cols[1]:
+        descending = st.toggle("Descending", key=f"{key}_desc")
+    if order_by != "(directory order)":
+        def build_order() -> List[int]:
+            values = directory.columns(ids)[order_by]
+            sort_key = (lambda j: str(values[j]).lower()) if order_by != "needs_account" else values.__getitem__
+            return sorted(range(len(ids)), key=sort_key, reverse=descending)
+        order = session_cached(
+            (key, "order", order_by, descending, filters),
+            (directory.key, directory.version),
+            build_order
+        )
+        ids = [ids[j] for j in order]
+    elif descending:
+        ids = ids[::-1]
+    pages = (len(ids) + page_size - 1) // page_size
+    pg = 1
+    with cols[2]:
+        if pages > 1:
+            pg = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    page_ids = ids[(pg - 1) * page_size:pg * page_size]
+    st.caption(f"Sites {(pg - 1) * page_size + 1:,}–{(pg - 1) * page_size + len(page_ids):,} of {len(ids):,}.")
+    st.dataframe(with_health(sites_frame(page_ids)), use_container_width=True, hide_index=True)
+
+@st.fragment(run_every=1.0)
+@perf.timed("fragment:bulk_job_progress")
+def bulk_job_progress():
+    job = st.session_state["bulk_job"]
+    if job is None:
+        return
+    if not job.running:
+        st.rerun()
+    st.progress(
+        job.progress,
+        text=f"{job.done:,} / {job.total:,} brief × style combos · {job.rows_written:,} variants written"
+    )
+    if st.button("✋ Cancel Bulk Job"):
+        job.cancel()
+
+HEALTH_LABELS = {"up": "✅ up", "moved": "↪️ moved", "down": "❌ down"}
+
+@st.cache_resource(max_entries=8)
+def shared_sites_json(digest: str, _base: SiteDirectory) -> bytes:
+    return json.dumps(_base.records, indent=2).encode("utf-8")
+
+def with_health(df: pd.DataFrame) -> pd.DataFrame:
+    cache = get_site_checker().cache
+    return df.assign(health=[HEALTH_LABELS.get(cache.health(u), "") for u in df["url"]])
+
+def site_totals_frame() -> pd.DataFrame:
+    return session_cached(
+        "site_totals",
+        get_store().versions["campaign"],
+        lambda: rollup_frame(get_store().rollup("site"))
+    )
+
+def posted_pairs(variants: List[Dict[str, str]], sites: List[str]) -> set:
+    # (site, variant index) pairs whose copy is already in the posting history
+    # there; one index query per variant, not per site.
+    index = history_index()
+    wanted = set(sites)
+    store = get_store()
+    out = set()
+    for i, sig in enumerate(signatures(ad_copy(v) for v in variants)):
+        hits = index.query_signature(sig, limit=len(index))
+        rows = store.get_many("history", [k for k, _ in hits]) if hits else {}
+        out.update((r["site"], i) for r in rows.values() if r["site"] in wanted)
+    return out
+
+def rule_book(ids: List[int], filters: Hashable = None) -> RuleBook:
+    # Compiled once per site list and directory version, then reused by every rerun.
+    directory = st.session_state["sites"]
+    return session_cached(
+        ("rule_book", filters),
+        (directory.key, directory.version),
+        lambda: RuleBook(directory.columns(ids)["name"], directory.rules(ids))
+    )
+
+def rule_failures(variants: List[Dict[str, str]], sites: List[str]) -> set:
+    # (site, variant index) pairs whose copy breaks that site's rules.
+    directory = st.session_state["sites"]
+    positions = [directory.position(s) for s in sites]
+    book = RuleBook(sites, [None if p is None else directory.rule(p) for p in positions])
+    rows, cols = book.check(variants).nonzero()
+    return {(sites[j], i) for i, j in zip(rows.tolist(), cols.tolist())}
+
+@st.fragment
+@perf.timed("fragment:copy_rules")
+def copy_rules(ids: List[int], filters: Hashable = None) -> None:
+    # Every variant against every filtered site that sets rules, as one array pass.
+    book = rule_book(ids, filters)
+    ruled = book.ruled_sites
+    if not len(ruled):
+        st.caption(
+            "None of these sites set copy rules. Give a site a `rules` object in sites.json "
+            "(`max_headline`, `max_body`, `banned_words`, `allow_links`, `allow_phone`) to check variants against it."
+        )
+        return
+    variants = st.session_state.get("variants") or []
+    if not variants:
+        st.info(f"{len(ruled):,} of these sites set copy rules. Generate variants to check them.")
+        return
+    with perf.span("rules:check"):
+        directory = st.session_state["sites"]
+        grid = session_cached(
+            ("rule_grid", filters),
+            (directory.key, directory.version, st.session_state["variants_version"]),
+            lambda: book.check(variants)
+        )
+    ok = grid == 0
+    colr = st.columns(3)
+    colr[0].metric("Variant × site pairs passing", f"{int(ok.sum()):,} / {grid.size:,}")
+    colr[1].metric("Sites taking every variant", f"{int(ok.all(axis=0).sum()):,} / {len(book):,}")
+    colr[2].metric("Variants fit for every site", f"{int(ok.all(axis=1).sum()):,} / {len(variants):,}")
+    st.caption("Sites with rules only. H headline too long · B body too long · W banned word · L link not allowed · P phone number not allowed.")
+    st.dataframe(
+        pd.DataFrame(
+            cell_labels(grid[:, ruled].T),
+            index=pd.Index([book.sites[j] for j in ruled], name="site"),
+            columns=[f"V{i+1}" for i in range(len(variants))]
+        ),
+        use_container_width=True
+    )
+    limit = book.headline_limit(ruled)
+    if limit is not None and (grid & HEADLINE).any():
+        if st.button(
+            f"✂️ Fit headlines to {limit} characters",
+            help="Shortens this session's over-long headlines at a word boundary to the strictest limit above. Fitted variants get new variant ids."
+        ):
+            fitted, changed = fit_variants(variants, limit)
+            set_variants(fitted)
+            st.session_state["post_flash"] = f"Headlines fitted to {limit} characters: {changed:,} changed."
+            st.rerun()
+
+def ranked_sites(ids: List[int], filters: Hashable = None) -> List[int]:
+    # ``ids`` best first for the saved brief. Scoring reuses the shared ranker of
+    # the base directory; the order is rebuilt only when the brief, the
+    # directory or the posting/campaign stats change.
+    directory = st.session_state["sites"]
+    stats = site_stats()
+    category, region = brief_target(st.session_state.get("ad_saved"))
+
+    def build() -> List[int]:
+        added = session_cached("site_ranker", directory.version, lambda: SiteRanker(directory.added)) if directory.added else None
+        scores = overlay_scores(shared_site_ranker(directory.key, directory.base), added, stats, category, region)
+        return [ids[j] for j in top(scores[ids], len(ids)).tolist()]
+    return session_cached(
+        ("site_rank", filters),
+        (directory.key, directory.version, stats.version, category, region),
+        build
+    )
+
+@st.fragment
+@perf.timed("fragment:posting_queue")
+def posting_queue():
+    board = get_plan_board()
+    plan = board["plan"]
+    if plan is None:
+        st.info("No active plan. Build one above.")
+        return
+    counts = plan.counts()
+    colq = st.columns(4)
+    colq[0].metric("Pending", f"{counts['pending']:,}")
+    colq[1].metric("Done", f"{counts['done']:,}")
+    colq[2].metric("Skipped", f"{counts['skipped']:,}")
+    colq[3].metric("Unfilled slots", f"{plan.unfilled:,}", help="Site × city slots left empty because every variant was already used or posted there.")
+    upcoming = plan.next_items(25)
+    if not upcoming:
+        st.success("Plan complete.")
+    else:
+        labels = {
+            it.id: f"{it.site} · {it.city or 'any city'} · Variant {it.variant + 1}"
+            for it in upcoming
+        }
+        item_id = st.selectbox("Work item", list(labels), format_func=labels.get, key="queue_item")
+        item = plan.items[item_id]
+        wait = item.due - time.time()
+        if wait > 0:
+            st.caption(f"Not before {datetime.datetime.fromtimestamp(item.due):%Y-%m-%d %H:%M} (rate limit / cooldown for {item.site}).")
+        colw1, colw2 = st.columns([1, 1])
+        with colw2:
+            v = plan.copy(item)
+            st.text_area("Copy Block", value=f"HEADLINE:\n{v['headline']}\n\nBODY:\n{v['body']}", height=200, key=f"queue_copy_{item.id}")
+        with colw1:
+            picked = st.session_state["sites"].get(item.site)
+            if picked and picked.get("url"):
+                st.link_button("🔗 Open Posting Site", picked["url"])
+            link = st.text_input("Live Ad Link (after posting)", "", key=f"queue_link_{item.id}")
+            note = st.text_input("Note", "", key=f"queue_note_{item.id}")
+            cold, cols = st.columns(2)
+            try:
+                if cold.button("✅ Done", key="queue_done"):
+                    entry = plan.complete(item.id, link=link, note=note)
+                    get_store().insert("history", [entry])
+                    emit_event("posting_logged", entry)
+                    st.session_state["post_flash"] = f"Logged {item.site} · {item.city or 'any city'}."
+                    # Full rerun so the history panel picks up the new row.
+                    st.rerun()
+                if cols.button("⏭️ Skip", key="queue_skip"):
+                    plan.skip(item.id)
+                    st.rerun()
+            except ValueError as e:
+                # Another operator finished this item first.
+                st.warning(str(e))
+        st.dataframe(pd.DataFrame([it.as_dict() for it in upcoming]), use_container_width=True, hide_index=True)
+    if st.button("🗑️ Clear Plan", key="queue_clear"):
+        board["plan"] = None
+        st.rerun()
+
+@st.fragment(run_every=1.0)
+@perf.timed("fragment:site_health_progress")
+def site_health_progress():
+    checker = get_site_checker()
+    if not checker.running:
+        st.rerun()
+    st.progress(checker.progress, text=f"Checked {checker.done:,} / {checker.total:,} sites")
+    if st.button("✋ Stop Checking"):
+        checker.cancel()
+
 # ---------- Admin Login Page ----------
 def admin_login_page():
     st.markdown('<div class="ill-card">', unsafe_allow_html=True)
@@ -249,7 +571,11 @@ def admin_login_page():
 
         if submit:
             # Recommended: set ADMIN_PASSWORD in Streamlit Secrets.
-            secret_pwd = st.secrets.get("ADMIN_PASSWORD", "IlluminatiWarRoom!")
+            try:
+                secret_pwd = st.secrets.get("ADMIN_PASSWORD", "IlluminatiWarRoom!")
+            except FileNotFoundError:
+                # No secrets.toml at all (st.secrets.get only falls back on a missing key).
+                secret_pwd = "IlluminatiWarRoom!"
             valid_user = username.strip().lower() in {"deandre", "deandre jefferson"}
             valid_pass = password == secret_pwd
             if valid_user and valid_pass:
@@ -297,6 +623,8 @@ if not st.session_state["admin_authenticated"]:
     st.stop()
 
 # ---------- Pages (only when authenticated) ----------
+# Full-run wall time per page; fragment reruns are timed by their own decorators.
+run_started = time.perf_counter()
 
 if page == "Compose & Variants":
     st.markdown('<div class="ill-card">', unsafe_allow_html=True)
@@ -313,6 +641,13 @@ if page == "Compose & Variants":
         cta = st.text_input("CTA (e.g., Click here to get started)", "Click here to get started")
         master = st.selectbox("Master Style", list(MASTER_STYLES.keys()), index=0)
         body_extra = st.text_area("Short Description / Support (optional)", "")
+        directory = st.session_state["sites"]
+        colb1, colb2 = st.columns(2)
+        with colb1:
+            brief_category = st.selectbox("Site category", ["Any"] + directory.categories(), help="Used to rank sites on the Posting Hub; guessed from the brief when Any.")
+        with colb2:
+            areas = sorted({a.strip() for r in directory.regions() for a in r.split("/")} - {"Global", ""})
+            brief_region = st.selectbox("Target region", ["Any"] + areas)
 
         if st.button("⚡ Generate Variants"):
             if not product or not benefit:
@@ -322,7 +657,7 @@ if page == "Compose & Variants":
                 if body_extra.strip():
                     for v in variants:
                         v["body"] += "\n\n" + body_extra.strip()
-                st.session_state["variants"] = variants
+                set_variants(variants)
                 st.session_state["ad_saved"] = {
                     "product": product,
                     "audience": audience,
@@ -330,33 +665,140 @@ if page == "Compose & Variants":
                     "cta": cta,
                     "master": master,
                     "body_extra": body_extra,
+                    "category": None if brief_category == "Any" else brief_category,
+                    "region": None if brief_region == "Any" else brief_region,
                     "variants": variants,
                 }
+                emit_event("variants_generated", st.session_state["ad_saved"])
                 st.success(f"Generated {len(variants)} variants.")
 
-    with col2:
+    # Typing or scoring here reruns only this panel, not the brief or variant list.
+    @st.fragment
+    @perf.timed("fragment:quality_panel")
+    def quality_panel():
         st.subheader("Quality Heuristic")
-        sample = st.text_area("Paste ad to analyze (optional)", height=220)
-        if st.button("🔍 Analyze"):
-            sc = analyze_copy_score(sample or "")
-            st.metric("Overall Score", f"{sc['Score']} / 100")
+        scorer = get_live_scorer()
+        sample = st.text_area(
+            "Paste ad to analyze (optional)",
+            height=220,
+            help="Scored on every change (Ctrl+Enter or click away); only edited lines are re-tokenized."
+        )
+        if sample.strip():
+            sc = scorer.score(sample)
+            last = st.session_state["live_score"]
+            if last is None or last[0] != sample:
+                # Keep the delta against the previous text until the text changes again.
+                prev = last[1] if last else None
+                last = st.session_state["live_score"] = (sample, sc, prev)
+            prev = last[2]
+            st.metric(
+                "Overall Score",
+                f"{sc['Score']} / 100",
+                delta=round(sc["Score"] - prev["Score"], 1) if prev else None
+            )
             st.write(
                 f"Length: {sc['Length']:.1f} | Emotion: {sc['Emotion']:.1f} | "
                 f"Structure: {sc['Structure']:.1f} | CTA: {sc['CTA']:.1f} | "
                 f"Specificity: {sc['Specificity']:.1f}"
             )
+        variants = st.session_state.get("variants") or []
+        if variants:
+            st.markdown("**Your variants, side by side**")
+            st.dataframe(
+                pd.DataFrame(
+                    [{"Variant": f"Variant {i+1}", **scorer.score(ad_text(v))} for i, v in enumerate(variants)],
+                    columns=["Variant"] + SCORE_COLUMNS
+                ),
+                use_container_width=True,
+                hide_index=True
+            )
         st.caption("Tip: Mention specific numbers, timeframes, and add a clear CTA link for better scores.")
 
+        st.subheader("Score a File")
+        ads_file = st.file_uploader(
+            "Upload ads (CSV or JSONL with a 'text' column, or 'headline'/'body')",
+            type=["csv","jsonl","ndjson","json"]
+        )
+        if ads_file is not None and st.button("📊 Score File"):
+            try:
+                st.session_state["scored_ads"] = score_corpus(load_ads_file(ads_file.getvalue(), ads_file.name))
+            except Exception as e:
+                st.session_state["scored_ads"] = None
+                st.error(f"Could not score file: {e}")
+        scored = st.session_state["scored_ads"]
+        if scored is not None:
+            st.caption(f"{len(scored)} ads scored · mean score {scored['Score'].mean():.1f}")
+            st.dataframe(scored, use_container_width=True, height=260)
+            st.download_button(
+                "⬇️ Scored Ads (CSV)",
+                scored.to_csv(index=False).encode("utf-8"),
+                "scored_ads.csv",
+                "text/csv"
+            )
+
+
+    with col2:
+        quality_panel()
+
     st.markdown("---")
     st.subheader("Your Variants")
     if not st.session_state["variants"]:
         st.info("Generate variants above. They’ll appear here.")
     else:
-        for i, v in enumerate(st.session_state["variants"], start=1):
-            with st.expander(f"Variant {i}: {v['headline'][:80]}"):
+        variants = st.session_state["variants"]
+        dups = session_cached("variant_dups", st.session_state["variants_version"], lambda: duplicate_groups([ad_copy(v) for v in variants]))
+        index = history_index()
+        for i, (v, dup) in enumerate(zip(variants, dups), start=1):
+            posted = index.query(ad_copy(v))
+            flag = " ⚠️" if dup or posted else ""
+            with st.expander(f"Variant {i}: {v['headline'][:80]}{flag}"):
+                if dup:
+                    st.warning(f"Near-duplicate of Variant {dup[0] + 1} ({dup[1]:.0%} similar).")
+                if posted:
+                    st.warning(f"Near-duplicates in the posting history: {len(posted)}{'+' if len(posted) == 20 else ''}")
                 st.markdown(f"**Headline:** {v['headline']}")
                 st.text(v["body"])
 
+    st.markdown("---")
+    st.subheader("Bulk Generate")
+    st.caption("Upload a CSV of briefs (product, benefit, audience, body_extra). Each brief is expanded across the selected master styles in the background and written to disk.")
+    job = st.session_state["bulk_job"]
+    if st.session_state["bulk_flash"]:
+        st.warning(st.session_state["bulk_flash"])
+        st.session_state["bulk_flash"] = ""
+    if job is not None and job.running:
+        bulk_job_progress()
+    else:
+        briefs_file = st.file_uploader("Upload briefs CSV", type=["csv"])
+        masters = st.multiselect("Master Styles", list(MASTER_STYLES.keys()), default=list(MASTER_STYLES.keys()))
+        if st.button("🚀 Start Bulk Job"):
+            briefs, skipped = read_briefs(briefs_file.getvalue()) if briefs_file is not None else ([], 0)
+            if not briefs or not masters:
+                st.error("Upload at least one brief with product and benefit, and pick a master style.")
+            else:
+                if job is not None:
+                    job.discard()
+                st.session_state["bulk_job"] = BulkJob(briefs, masters).start()
+                if skipped:
+                    st.session_state["bulk_flash"] = f"Skipped {skipped} rows without product/benefit."
+                st.rerun()
+
+        if job is not None:
+            elapsed = (job.finished or job.started) - job.started
+            msg = f"Bulk job {job.status}: {job.rows_written:,} variants from {job.done:,} / {job.total:,} combos in {elapsed:.1f}s."
+            if job.status == "done":
+                st.success(msg)
+            elif job.status == "failed":
+                st.error(f"{msg} {job.error}")
+            else:
+                st.warning(msg)
+            if job.rows_written and job.available:
+                st.dataframe(pd.DataFrame(job.preview()), use_container_width=True, height=220)
+                with open(job.path, "rb") as f:
+                    st.download_button("⬇️ Bulk Variants (CSV)", f, "bulk_variants.csv", "text/csv")
+            elif job.rows_written:
+                st.caption("This job's CSV has been cleaned up; start the job again to download it.")
+
     render_footer()
 
 elif page == "Sites & Posting":
@@ -364,82 +806,179 @@ elif page == "Sites & Posting":
     st.write("Choose a site, open the posting page, and paste a variant. Track your post status below.")
     st.caption("Note: Most sites require a login and block automation. This flow keeps you compliant and fast.")
 
+    directory = st.session_state["sites"]
     colf1, colf2, colf3 = st.columns(3)
     with colf1:
-        region = st.selectbox(
-            "Filter by Region",
-            ["All"] + sorted({s.get("region","") for s in st.session_state["sites"] if s.get("region")})
-        )
+        region = st.selectbox("Filter by Region", ["All"] + directory.regions())
     with colf2:
-        category = st.selectbox(
-            "Filter by Category",
-            ["All"] + sorted({s.get("category","") for s in st.session_state["sites"] if s.get("category")})
-        )
+        category = st.selectbox("Filter by Category", ["All"] + directory.categories())
     with colf3:
         search = st.text_input("Search by name", "")
 
-    rows = st.session_state["sites"]
-    if region != "All":
-        rows = [r for r in rows if r.get("region") == region]
-    if category != "All":
-        rows = [r for r in rows if r.get("category") == category]
-    if search.strip():
-        term = search.lower().strip()
-        rows = [r for r in rows if term in r.get("name","").lower()]
-
-    if rows:
-        df = pd.DataFrame(rows)
-        st.dataframe(df[["name","region","category","needs_account","url","notes"]], use_container_width=True)
-    else:
-        st.info("No sites match your filters.")
+    checker = get_site_checker()
+    colh1, colh2 = st.columns([1, 2])
+    with colh1:
+        hide_dead = st.checkbox("Hide dead sites", value=False)
+    with colh2:
+        if checker.running:
+            site_health_progress()
+        else:
+            if st.button("🩺 Check Site Health", help="Probes every site URL in the background; results are cached for a few hours."):
+                checker.start(directory.urls())
+                st.rerun()
+            if checker.error:
+                st.error(f"Health check failed: {checker.error}")
+
+    ids = directory.filter_ids(region, category, search)
+    ids = directory.visible_ids() if ids is None else ids
+    if hide_dead:
+        cache = checker.cache
+        ids = [i for i, u in zip(ids, directory.columns(ids)["url"]) if cache.health(u) != "down"]
+    site_names = directory.columns(ids)["name"]
+    filters = (region, category, search, hide_dead and cache.version)
+    render_sites_table(ids, "posting_sites", filters)
 
     st.markdown("---")
-    st.subheader("Quick Post & Log")
-    colp1, colp2 = st.columns([1,1])
-    with colp1:
-        site_name = st.selectbox("Site", [r["name"] for r in rows]) if rows else None
-        open_url = None
-        if rows and site_name:
-            for r in rows:
-                if r["name"] == site_name:
-                    open_url = r["url"]
-                    break
-        if open_url:
-            st.link_button("🔗 Open Posting Site", open_url, help="Opens the site in a new tab")
-        note = st.text_input("Note (e.g., city/section used)", "")
-        posted_link = st.text_input("Live Ad Link (after posting)", "")
-        if st.button("✅ Log Posting"):
+    st.subheader("Copy Rules")
+    copy_rules(ids, filters)
+
+    # Fragment: typing a note, picking a variant or checking repeats reruns only
+    # this panel, never the filters or the site table.
+    @st.fragment
+    @perf.timed("fragment:quick_post")
+    def quick_post(site_names: List[str]):
+        colp1, colp2 = st.columns([1,1])
+        variants = st.session_state.get("variants") or []
+        with colp2:
+            st.write("Paste your chosen variant for quick copy:")
+            v = None
+            if variants:
+                sel = st.selectbox(
+                    "Choose Variant",
+                    [f"Variant {i+1}" for i in range(len(variants))]
+                )
+                v = variants[int(sel.split()[-1]) - 1]
+                pre = f"HEADLINE:\n{v['headline']}\n\nBODY:\n{v['body']}"
+                st.text_area("Copy Block", value=pre, height=240)
+            else:
+                st.info("No variants yet. Go to Compose & Variants.")
+        with colp1:
+            site_name = st.selectbox("Site", site_names) if site_names else None
+            open_url = None
             if site_name:
-                st.session_state["history"].append({
-                    "time": datetime.datetime.utcnow().isoformat()[:19],
-                    "site": site_name,
-                    "note": note,
-                    "link": posted_link
-                })
-                st.success("Logged.")
+                picked = directory.get(site_name)
+                open_url = picked.get("url") if picked else None
+            if open_url:
+                st.link_button("🔗 Open Posting Site", open_url, help="Opens the site in a new tab")
+            note = st.text_input("Note (e.g., city/section used)", "")
+            posted_link = st.text_input("Live Ad Link (after posting)", "")
+            if v is not None and site_name:
+                pos = directory.position(site_name)
+                rules = directory.rule(pos) if pos is not None else None
+                bits = int(RuleBook([site_name], [rules]).check([v])[0, 0]) if rules else 0
+                if bits:
+                    st.warning(f"Breaks {site_name}'s rules: {', '.join(describe(bits))}.")
+                    if bits & HEADLINE:
+                        st.text_input(f"Headline fitted to {rules['max_headline']} characters", fit_headline(v["headline"], rules["max_headline"]))
+                store = get_store()
+                hits = history_index().query(ad_copy(v), site=site_name)
+                if hits:
+                    rows = store.get_many("history", [k for k, _ in hits])
+                    st.warning(f"Near-duplicates of this variant already posted on {site_name}: {len(hits)}")
+                    st.dataframe(
+                        pd.DataFrame([
+                            {"similarity": f"{sim:.0%}", **{c: rows[k][c] for c in ("time", "note", "link", "headline")}}
+                            for k, sim in hits if k in rows
+                        ]),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            if st.session_state["post_flash"]:
+                st.success(st.session_state["post_flash"])
+                st.session_state["post_flash"] = ""
+            if st.button("✅ Log Posting"):
+                if site_name:
+                    entry = {
+                        "time": datetime.datetime.utcnow().isoformat()[:19],
+                        "site": site_name,
+                        "note": note,
+                        "link": posted_link,
+                        "headline": v["headline"] if v else "",
+                        "body": v["body"] if v else "",
+                    }
+                    get_store().insert("history", [entry])
+                    emit_event("posting_logged", entry)
+                    # Full rerun so the history panel picks up the new row.
+                    st.session_state["post_flash"] = "Logged."
+                    st.rerun()
+                else:
+                    st.error("Select a site first.")
+
+    st.markdown("---")
+    st.subheader("Quick Post & Log")
+    with perf.span("sites:rank"):
+        ranked = ranked_sites(ids, filters)
+    ranked_names = directory.columns(ranked)["name"]
+    category, region = brief_target(st.session_state.get("ad_saved"))
+    with st.expander(f"🎯 Best sites for your brief ({category or 'any category'} · {region or 'any region'})"):
+        st.caption("The Site picker below is ordered the same way: category and region fit, then EPC and Conv% from campaign snapshots, then how often you post there.")
+        cols = directory.columns(ranked[:10])
+        st.dataframe(
+            pd.DataFrame(describe_sites(site_stats(), cols["name"]), columns=["site", "posts", "clicks", "EPC", "Conv%"])
+            .assign(category=cols["category"], region=cols["region"])
+            [["site", "category", "region", "posts", "clicks", "EPC", "Conv%"]],
+            use_container_width=True,
+            hide_index=True
+        )
+    quick_post(ranked_names)
+
+    st.markdown("---")
+    st.subheader("Posting Plan")
+    st.caption("Schedules every variant across sites and cities under per-site rate limits; operators work the queue below.")
+    with st.expander("Build a plan", expanded=get_plan_board()["plan"] is None):
+        plan_sites = st.multiselect("Sites", site_names, key="plan_sites")
+        plan_cities = st.text_area("Target cities (one per line or comma-separated)", "", key="plan_cities")
+        limits_df = st.data_editor(
+            pd.DataFrame({"site": plan_sites, "burst": 2, "per_day": 4.0, "cooldown_min": 60}),
+            column_config={
+                "site": st.column_config.TextColumn(disabled=True),
+                "burst": st.column_config.NumberColumn("Burst", min_value=1, step=1, help="Posts allowed back to back"),
+                "per_day": st.column_config.NumberColumn("Posts/day", min_value=0.1),
+                "cooldown_min": st.column_config.NumberColumn("Cooldown (min)", min_value=0, step=5),
+            },
+            hide_index=True,
+            use_container_width=True,
+            key="plan_limits"
+        )
+        skip_posted = st.checkbox("Skip variants already posted on a site", value=True)
+        skip_broken = st.checkbox("Skip variants that break a site's copy rules", value=True)
+        if st.button("🗓️ Build Plan"):
+            variants = st.session_state.get("variants") or []
+            if not variants or not plan_sites:
+                st.error("Pick at least one site and generate variants first.")
             else:
-                st.error("Select a site first.")
-
-    with colp2:
-        st.write("Paste your chosen variant for quick copy:")
-        if st.session_state.get("variants"):
-            sel = st.selectbox(
-                "Choose Variant",
-                [f"Variant {i+1}" for i in range(len(st.session_state['variants']))]
-            )
-            idx = int(sel.split()[-1]) - 1
-            v = st.session_state["variants"][idx]
-            pre = f"HEADLINE:\n{v['headline']}\n\nBODY:\n{v['body']}"
-            st.text_area("Copy Block", value=pre, height=240)
-        else:
-            st.info("No variants yet. Go to Compose & Variants.")
+                cities = [c for c in plan_cities.replace(",", "\n").splitlines() if c.strip()] or [""]
+                totals = site_totals_frame()
+                epc = dict(zip(totals["site"], totals["EPC"])) if not totals.empty else {}
+                with perf.span("plan:build"):
+                    get_plan_board()["plan"] = PostingPlan(
+                        variants,
+                        plan_sites,
+                        cities,
+                        limits={
+                            r["site"]: RateLimit(r["burst"], r["per_day"], r["cooldown_min"] * 60)
+                            for r in limits_df.to_dict("records")
+                        },
+                        priorities=epc,
+                        exclude=(posted_pairs(variants, plan_sites) if skip_posted else set())
+                        | (rule_failures(variants, plan_sites) if skip_broken else set()),
+                    )
+                st.rerun()
+    posting_queue()
 
     st.markdown("---")
-    st.subheader("Posting History (session)")
-    if st.session_state["history"]:
-        st.dataframe(pd.DataFrame(st.session_state["history"]), use_container_width=True)
-    else:
-        st.info("Nothing logged yet.")
+    st.subheader("Posting History")
+    render_store_table("history", "history_page", "Nothing logged yet.")
 
     render_footer()
 
@@ -447,10 +986,18 @@ elif page == "Campaign Tracker":
     st.markdown('<div class="ill-title center">CAMPAIGN TRACKER</div>', unsafe_allow_html=True)
     st.caption("Lightweight analytics: track impressions, clicks, leads/sales, revenue by site.")
 
+    session_variants = st.session_state.get("variants") or []
+    variant_labels = {variant_id(v): f"Variant {i+1}" for i, v in enumerate(session_variants)}
     with st.form("track_form"):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            site = st.selectbox("Site", [s["name"] for s in st.session_state["sites"]])
+            site = st.selectbox("Site", st.session_state["sites"].names())
+            tagged = st.selectbox(
+                "Variant",
+                [""] + list(variant_labels),
+                format_func=lambda k: f"{variant_labels[k]} · {k}" if k else "(untagged)",
+                help="Which variant this snapshot measured; tagged snapshots feed the recommendations."
+            )
         with col2:
             impressions = st.number_input("Impressions", min_value=0, step=1, value=0)
             clicks = st.number_input("Clicks", min_value=0, step=1, value=0)
@@ -464,7 +1011,7 @@ elif page == "Campaign Tracker":
     if submitted:
         epc = (revenue / clicks) if clicks > 0 else 0.0
         conv_rate = (sales / clicks * 100) if clicks > 0 else 0.0
-        st.session_state["campaign"].append({
+        snapshot = {
             "time": datetime.datetime.utcnow().isoformat()[:19],
             "site": site,
             "impressions": impressions,
@@ -473,14 +1020,117 @@ elif page == "Campaign Tracker":
             "sales": sales,
             "revenue": revenue,
             "EPC": round(epc,2),
-            "Conv%": round(conv_rate,2)
-        })
+            "Conv%": round(conv_rate,2),
+            "variant_id": tagged
+        }
+        get_store().insert("campaign", [snapshot])
+        emit_event("snapshot_added", snapshot)
         st.success("Snapshot added.")
 
-    if st.session_state["campaign"]:
-        st.dataframe(pd.DataFrame(st.session_state["campaign"]), use_container_width=True)
-    else:
-        st.info("No snapshots yet.")
+    with st.expander("📥 Import Tracker Events (CSV / JSONL)"):
+        st.caption(
+            "One row per impression, click, lead or sale, with an event id, time, site (name, domain or "
+            "referrer URL) and optional revenue and variant. Events are summed into one snapshot per site, "
+            "day and variant; event ids already imported are skipped, so re-uploading a file is safe."
+        )
+        events_file = st.file_uploader("Event export", type=["csv", "jsonl", "ndjson", "json", "txt"], key="events_upload")
+        cole1, cole2 = st.columns([1, 2])
+        with cole1:
+            grain = st.radio("Snapshot per", GRAINS, horizontal=True, format_func=str.capitalize)
+        with cole2:
+            alias_text = st.text_area(
+                "Site aliases (tracker value = Site name, one per line)", "", height=80,
+                placeholder="fb = Facebook Marketplace"
+            )
+        if events_file is not None and st.button("⬆️ Ingest Events"):
+            aliases = dict(
+                (k.strip(), v.strip()) for k, _, v in
+                (line.partition("=") for line in alias_text.splitlines() if "=" in line)
+            )
+            try:
+                with st.spinner("Ingesting events..."), perf.span("ingest:events"):
+                    report = ingest_events(get_store(), events_file, st.session_state["sites"], grain=grain, aliases=aliases)
+            except Exception as e:
+                st.error(f"Could not ingest events: {e}")
+            else:
+                st.success(
+                    f"Read {report['read']:,} events: {report['ingested']:,} new in {report['snapshots']:,} snapshots, "
+                    f"{report['duplicates']:,} already imported, {report['rejected']:,} rejected."
+                )
+                if report["rejected_by_reason"]:
+                    st.write(report["rejected_by_reason"])
+                if report["rejected_by_reason"].get("held by another import"):
+                    st.warning("Some event ids are reserved by another import that has not finished. Ingest this file again once it completes; events it did not take will be added then.")
+                if report["unmatched_sites"]:
+                    st.caption("Site values not found in the directory (add them as aliases):")
+                    st.dataframe(pd.DataFrame(report["unmatched_sites"], columns=["value", "events"]), hide_index=True)
+                if report["snapshots"]:
+                    emit_event("events_ingested", {k: report[k] for k in ("read", "ingested", "duplicates", "snapshots", "rejected")})
+
+    site_totals = site_totals_frame()
+    if not site_totals.empty:
+        st.markdown("---")
+        st.subheader("Dashboard")
+        tot = derive_metrics(site_totals[METRIC_COLUMNS].sum().to_frame().T).iloc[0]
+        colm = st.columns(5)
+        colm[0].metric("Clicks", f"{int(tot['clicks']):,}")
+        colm[1].metric("Sales", f"{int(tot['sales']):,}")
+        colm[2].metric("Revenue", f"${tot['revenue']:,.2f}")
+        colm[3].metric("EPC", f"${tot['EPC']:.2f}")
+        colm[4].metric("Conv%", f"{tot['Conv%']:.2f}%")
+
+        @st.fragment
+        @perf.timed("fragment:trend_chart")
+        def trend_chart():
+            store = get_store()
+            grain = st.radio("Time bucket", ["day", "week"], horizontal=True, format_func=str.capitalize)
+            series = session_cached(
+                ("trend", grain),
+                store.versions["campaign"],
+                lambda: downsample(rollup_frame(store.rollup(grain, by_site=False)), max_points=180)
+            )
+            st.line_chart(series.set_index("bucket")[["revenue", "clicks", "sales"]])
+
+        trend_chart()
+
+        st.markdown("**By Site**")
+        by_site = site_totals.drop(columns=["bucket"]).sort_values("revenue", ascending=False)
+        st.bar_chart(by_site.head(20).set_index("site")["EPC"])
+        st.dataframe(by_site, use_container_width=True, hide_index=True)
+
+    @st.fragment
+    @perf.timed("fragment:variant_recommendations")
+    def variant_recommendations():
+        model = bandit_model()
+        store = get_store()
+        colr1, colr2 = st.columns(2)
+        with colr1:
+            method = st.radio("Method", METHODS, horizontal=True, format_func={"thompson": "Thompson sampling", "ucb": "UCB1"}.get)
+        with colr2:
+            objective = st.radio("Optimize", list(OBJECTIVES), horizontal=True, format_func={"conversion": "Sales / click", "ctr": "Clicks / impression"}.get)
+        directory = st.session_state["sites"]
+        tracked = [t for t in store.sites("campaign") if directory.get(t)]
+        sites = st.multiselect("Candidate sites", directory.names(), default=tracked[:50], key="bandit_sites")
+        # Arms: this session's variants plus every variant that has tagged snapshots.
+        ids = list(dict.fromkeys(list(variant_labels) + model.tried_variants()))
+        if not ids or not sites:
+            st.info("Tag snapshots with a variant (or generate variants) and pick candidate sites to get recommendations.")
+            return
+        recs = pd.DataFrame(model.recommend(ids, sites, method=method, objective=objective, k=10))
+        recs.insert(0, "variant", [variant_labels.get(v, "") for v in recs["variant_id"]])
+        best = recs.iloc[0]
+        st.success(f"Next: post **{best['variant'] or best['variant_id']}** on **{best['site']}**")
+        st.caption(f"{len(ids):,} variants × {len(sites):,} sites = {len(ids) * len(sites):,} arms. Thompson picks are random draws; rerun for another.")
+        st.dataframe(recs, use_container_width=True, hide_index=True)
+        st.button("🎲 Draw again", key="bandit_redraw")
+
+    st.markdown("---")
+    st.subheader("Next Best Variant × Site")
+    variant_recommendations()
+
+    st.markdown("---")
+    st.subheader("Snapshots")
+    render_store_table("campaign", "campaign_page", "No snapshots yet.")
 
     render_footer()
 
@@ -491,30 +1141,81 @@ elif page == "Exports":
     if not st.session_state["variants"]:
         st.info("No variants yet. Generate some first.")
     else:
-        ads = st.session_state["variants"]
-        csv_bytes = export_ads(ads, "csv")
-        md_bytes = export_ads(ads, "md")
-        html_bytes = export_ads(ads, "html")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.download_button("⬇️ Variants (CSV)", csv_bytes, "classified_variants.csv", "text/csv")
-        with col2:
-            st.download_button("⬇️ Variants (Markdown)", md_bytes, "classified_variants.md", "text/markdown")
-        with col3:
-            st.download_button("⬇️ Variants (HTML)", html_bytes, "classified_variants.html", "text/html")
+        # Only the chosen format is serialized (once per content hash) and sent to the browser.
+        @st.fragment
+        @perf.timed("fragment:variant_exports")
+        def variant_exports():
+            ads = st.session_state["variants"]
+            fmt = st.radio(
+                "Format",
+                list(EXPORT_FORMATS.keys()),
+                format_func=lambda f: EXPORT_FORMATS[f]["label"],
+                horizontal=True
+            )
+            spec = EXPORT_FORMATS[fmt]
+            digest = session_cached("variants_digest", st.session_state["variants_version"], lambda: content_digest(ads))
+            with open(export_path(ads, fmt, digest), "rb") as f:
+                st.download_button(f"⬇️ Variants ({spec['label']})", f, spec["file"], spec["mime"])
+            st.caption(f"{len(ads):,} variants. The ZIP bundle holds the CSV, Markdown and HTML files.")
+
+        variant_exports()
 
     st.markdown("---")
-    st.subheader("Posting History Export")
-    if st.session_state["history"]:
-        hist_df = pd.DataFrame(st.session_state["history"])
-        st.download_button(
-            "⬇️ History (CSV)",
-            hist_df.to_csv(index=False).encode("utf-8"),
-            "posting_history.csv",
-            "text/csv"
-        )
+    st.subheader("History & Campaign Data")
+    store = get_store()
+    table_labels = {"history": "Posting history", "campaign": "Campaign snapshots"}
+    data_formats = {"csv": "CSV", **{k: v["label"] for k, v in ARCHIVE_FORMATS.items()}}
+    colx1, colx2 = st.columns(2)
+    with colx1:
+        data_table = st.radio("Table", list(table_labels), format_func=table_labels.get, horizontal=True)
+    with colx2:
+        data_fmt = st.radio("Format", list(data_formats), format_func=data_formats.get, horizontal=True)
+    row_count = store.count(data_table)
+    if row_count:
+        if st.button(f"📦 Prepare {table_labels[data_table]} ({row_count:,} rows, {data_formats[data_fmt]})"):
+            if data_fmt == "csv":
+                st.download_button("⬇️ Download (CSV)", b"".join(store.iter_csv(data_table)), f"{data_table}.csv", "text/csv")
+            else:
+                spec = ARCHIVE_FORMATS[data_fmt]
+                with perf.span(f"archive:export:{data_fmt}"):
+                    payload = archive_bytes(store, data_table, data_fmt)
+                st.download_button(f"⬇️ Download ({spec['label']})", payload, f"{data_table}.{spec['file']}", spec["mime"])
     else:
-        st.info("No posting history yet.")
+        st.info(f"No {table_labels[data_table].lower()} yet.")
+
+    st.markdown("**Import an archive**")
+    st.caption("Parquet or Arrow files exported here; rows already stored are skipped, so overlapping archives merge cleanly.")
+    up = st.file_uploader("Archive file", type=["parquet", "arrow", "feather"], key="archive_upload")
+    if up is not None:
+        try:
+            arch_table, arch = session_cached(("archive", up.file_id), up.size, lambda: open_archive(up.getvalue()))
+        except ValueError as e:
+            st.error(f"Could not read archive: {e}")
+        else:
+            cola1, cola2, cola3 = st.columns([2, 1, 1])
+            with cola1:
+                arch_sites = st.multiselect("Sites (all if empty)", archive_sites(arch))
+            with cola2:
+                since = st.date_input("From", value=None)
+            with cola3:
+                until = st.date_input("To", value=None)
+            picked = filter_archive(
+                arch,
+                arch_sites,
+                since,
+                until + datetime.timedelta(days=1) if until else None
+            )
+            st.caption(f"{table_labels[arch_table]}: {len(picked):,} of {len(arch):,} rows selected.")
+            st.dataframe(picked.slice(0, 20).to_pandas(), use_container_width=True, hide_index=True)
+            if st.button(f"📥 Merge {len(picked):,} rows into {table_labels[arch_table].lower()}", disabled=not len(picked)):
+                with perf.span("archive:import"):
+                    result = import_archive(store, arch_table, picked)
+                st.success(
+                    f"Added {result['inserted']:,} rows"
+                    + (f" ({result['restored']:,} restored from a spill)" if result["restored"] else "")
+                    + f"; {result['duplicates']:,} were already stored"
+                    + (f", {result['rejected']:,} had no valid time." if result["rejected"] else ".")
+                )
 
     render_footer()
 
@@ -524,7 +1225,7 @@ elif page == "Add/Manage Sites":
 
     st.markdown("### Current Sites")
     if st.session_state["sites"]:
-        st.dataframe(pd.DataFrame(st.session_state["sites"]), use_container_width=True)
+        render_sites_table(st.session_state["sites"].visible_ids(), "manage_sites")
     else:
         st.info("No sites loaded yet.")
 
@@ -537,25 +1238,62 @@ elif page == "Add/Manage Sites":
         needs_account = st.checkbox("Needs account/login", value=True)
         url = st.text_input("Posting or Home URL", "")
         notes = st.text_input("Notes", "")
+        with st.expander("Copy rules (optional)"):
+            colc1, colc2 = st.columns(2)
+            with colc1:
+                max_headline = st.number_input("Max headline characters (0 = no limit)", min_value=0, value=0, step=5)
+                max_body = st.number_input("Max body characters (0 = no limit)", min_value=0, value=0, step=50)
+            with colc2:
+                banned_words = st.text_input("Banned words or phrases (comma-separated)", "")
+                allow_links = st.checkbox("Links allowed", value=True)
+                allow_phone = st.checkbox("Phone numbers allowed", value=True)
         if st.form_submit_button("➕ Add"):
-            if not name or not url:
-                st.error("Name and URL required.")
+            rec, err = validate_site({
+                "name": name,
+                "region": region or "Global",
+                "category": category,
+                "needs_account": needs_account,
+                "url": url,
+                "notes": notes,
+                "rules": {
+                    "max_headline": max_headline,
+                    "max_body": max_body,
+                    "banned_words": banned_words,
+                    "allow_links": allow_links,
+                    "allow_phone": allow_phone,
+                }
+            })
+            dup = st.session_state["sites"].find_url(url) if rec else None
+            if rec is None:
+                st.error(f"Not added: {err}.")
+            elif dup is not None:
+                st.error(f"Not added: same URL as {st.session_state['sites'].name(dup)!r}.")
             else:
-                st.session_state["sites"].append({
-                    "name": name,
-                    "region": region or "Global",
-                    "category": category,
-                    "needs_account": needs_account,
-                    "url": url,
-                    "notes": notes
-                })
+                st.session_state["sites"].add(rec)
                 st.success("Added.")
 
+    st.subheader("Remove a Site (session only)")
+    directory = st.session_state["sites"]
+    colr1, colr2 = st.columns([3, 1])
+    with colr1:
+        doomed = st.selectbox("Site to remove", directory.names(), index=None, placeholder="Choose a site")
+    with colr2:
+        st.write("")
+        if st.button("🗑️ Remove", disabled=doomed is None):
+            pos = directory.position(doomed)
+            if pos is not None:
+                directory.remove(pos)
+            st.rerun()
+
     st.markdown("---")
     st.subheader("Save/Load Sites (JSON)")
     colx, coly = st.columns(2)
     with colx:
-        sites_bytes = json.dumps(st.session_state["sites"], indent=2).encode("utf-8")
+        directory = st.session_state["sites"]
+        if directory.changed:
+            sites_bytes = json.dumps(directory.records, indent=2).encode("utf-8")
+        else:
+            sites_bytes = shared_sites_json(directory.key, directory.base)
         st.download_button(
             "💾 Download sites.json",
             data=sites_bytes,
@@ -564,12 +1302,25 @@ elif page == "Add/Manage Sites":
         )
     with coly:
         up = st.file_uploader("Upload sites.json", type=["json"])
-        if up is not None:
-            try:
-                st.session_state["sites"] = json.loads(up.read().decode("utf-8"))
-                st.success("Sites loaded.")
-            except Exception as e:
-                st.error(f"Invalid JSON: {e}")
+        # Only (re)index when a different file is uploaded, not on every rerun.
+        if up is not None and st.session_state.get("sites_upload_id") != up.file_id:
+            # Parsed and validated entry by entry; bad rows and repeated URLs are skipped.
+            # Sessions uploading the same file share one parsed directory.
+            h = hashlib.blake2b(digest_size=16)
+            for chunk in iter(lambda: up.read(1 << 20), b""):
+                h.update(chunk)
+            up.seek(0)
+            digest = h.hexdigest()
+            loaded, problems = shared_sites(digest, up)
+            st.session_state["sites_upload_id"] = up.file_id
+            if loaded:
+                st.session_state["sites"] = DirectoryOverlay(loaded, digest)
+                st.success(f"Loaded {len(loaded):,} sites.")
+            else:
+                st.error("No valid sites found; the current directory was kept.")
+            if problems:
+                with st.expander(f"⚠️ Skipped entries ({len(problems)})"):
+                    st.text("\n".join(problems))
 
     render_footer()
 
@@ -582,7 +1333,7 @@ elif page == "Settings":
 
     st.write("Payload example (sent when you click Test):")
     payload = {
-        "source": "Illuminati Ad Poster",
+        "source": SOURCE,
         "ad": st.session_state.get("ad_saved") or {},
         "timestamp": datetime.datetime.utcnow().isoformat()
     }
@@ -592,12 +1343,95 @@ elif page == "Settings":
         if not zap_url:
             st.error("Add a webhook URL first.")
         else:
-            try:
-                import requests
-                r = requests.post(zap_url, json=payload, timeout=10)
-                st.success(f"Sent. Status: {r.status_code}")
-            except Exception as e:
-                st.error(f"Webhook error: {e}")
+            if get_dispatcher().submit(zap_url, payload):
+                st.success("Queued. Delivery status appears under Webhook Delivery below.")
+            else:
+                st.error("Webhook queue is full; the payload was written to the dead-letter file.")
+    st.caption("Posting logs, snapshots and variant generation are also sent here automatically, batched in the background.")
+
+    st.markdown("---")
+    st.subheader("Webhook Delivery")
+
+    # Refreshes on its own so queue depth and latency stay live without a full rerun.
+    @st.fragment(run_every=2.0)
+    @perf.timed("fragment:webhook_delivery")
+    def webhook_delivery():
+        dispatcher = get_dispatcher()
+        colw1, colw2, colw3 = st.columns(3)
+        colw1.metric("Queue depth", dispatcher.queue_depth)
+        dead = dispatcher.dead_letter_count()
+        colw2.metric("Dead letters", dead)
+        with colw3:
+            if dead and st.button("♻️ Replay Dead Letters"):
+                st.success(f"Re-queued {dispatcher.replay_dead_letters()} payloads.")
+        delivery = dispatcher.stats()
+        if delivery:
+            st.dataframe(pd.DataFrame.from_dict(delivery, orient="index"), use_container_width=True)
+        else:
+            st.info("No webhooks sent yet.")
+
+    webhook_delivery()
+
+    st.markdown("---")
+    st.subheader("Storage")
+    st.caption(
+        "Cap a table to keep only its newest rows. Older rows move to Parquet files under data/spill; "
+        "campaign totals keep counting them. Merging a spill file back on the Exports page restores its rows "
+        "under their original ids without counting them twice, but they are spilled again the next time the "
+        "table goes over its cap, so raise or clear the cap first to keep them. 0 = no cap."
+    )
+    store = get_store()
+    colc = st.columns(len(TABLES))
+    caps = {
+        table: colc[i].number_input(
+            f"{table.title()} row cap", min_value=0, step=10_000,
+            value=store.caps.get(table, 0), key=f"cap_{table}"
+        )
+        for i, table in enumerate(TABLES)
+    }
+    if st.button("Apply Caps"):
+        for table, cap in caps.items():
+            if cap != store.caps.get(table, 0):
+                store.set_cap(table, int(cap))
+        st.success("Caps applied.")
+    if store.spill_error:
+        st.error(f"Last spill failed: {store.spill_error}")
+    st.write({table: store.count(table) for table in TABLES})
+    spilled = [dict(f, table=table) for table in TABLES for f in spill_files(table)]
+    if spilled:
+        st.dataframe(pd.DataFrame(spilled), use_container_width=True, hide_index=True)
+
+    st.markdown("---")
+    st.subheader("Performance")
+    st.caption("Wall time per page run, per panel rerun and per hot function, shared by every session on this server.")
+    perf.set_enabled(st.toggle(
+        "Record timings (server-wide)",
+        value=perf.enabled(),
+        help="One switch for the whole server process: turning it on or off starts or stops timing in every open session, not just this one."
+    ))
+    # Session state sizes are this session's own, so they live in its state
+    # rather than in the process-wide registry every session shares.
+    session_gauges = {"session_state_bytes": st.session_state.get("_state_bytes") or {}}
+    snap = perf.snapshot(session_gauges)
+    if snap["timings"]:
+        timings = pd.DataFrame.from_dict(snap["timings"], orient="index").sort_values("total_ms", ascending=False)
+        st.dataframe(timings, use_container_width=True)
+    else:
+        st.info("No timings recorded yet. Turn recording on and use the app.")
+    sizes = snap["gauges"].get("session_state_bytes")
+    if sizes:
+        st.write("This session's state (approximate bytes):")
+        st.dataframe(
+            pd.DataFrame({"bytes": sizes}).sort_values("bytes", ascending=False),
+            use_container_width=True
+        )
+    colp1, colp2, colp3 = st.columns(3)
+    colp1.download_button("⬇️ JSON", perf.to_json(session_gauges), "illuminati_perf.json", "application/json")
+    colp2.download_button("⬇️ Prometheus", perf.to_prometheus(session_gauges), "illuminati_perf.prom", "text/plain")
+    if colp3.button("Reset Timings"):
+        perf.reset()
+        st.session_state.pop("_state_bytes", None)
+        st.rerun()
 
     st.markdown("---")
     st.markdown("Most free classified sites do not provide public APIs and block automation.")
@@ -605,5 +1439,9 @@ elif page == "Settings":
 
     render_footer()
 
-
-
+# ---------- Instrumentation ----------
+if perf.enabled():
+    perf.record(f"page:{page}", time.perf_counter() - run_started)
+    st.session_state["_state_bytes"] = {
+        str(key): perf.approx_size(value) for key, value in st.session_state.items() if key != "_state_bytes"
+    }
@@ -0,0 +1,282 @@
+"""Columnar archives of the history and campaign tables: Parquet or Arrow IPC with explicit dtypes."""
+import datetime
+import io
+import os
+import tempfile
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from store import DATA_DIR, TABLES
+
+ARCHIVE_FORMATS: Dict[str, Dict[str, str]] = {
+    "parquet": {"label": "Parquet (zstd)", "file": "parquet", "mime": "application/vnd.apache.parquet"},
+    # Uncompressed, so an archive on disk is read by memory-mapping it with no decode step.
+    "arrow": {"label": "Arrow IPC", "file": "arrow", "mime": "application/vnd.apache.arrow.file"},
+}
+TIME_TYPE = pa.timestamp("s", tz="UTC")
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TABLE_KEY = b"illuminati.table"
+# Spill files also keep each row's store id, so merging them back can restore it.
+ID_FIELD = pa.field("id", pa.int64())
+SPILL_DIR = os.path.join(DATA_DIR, "spill")
+
+Source = Union[str, bytes, memoryview, BinaryIO]
+
+
+def _field(name: str, sql_type: str) -> pa.Field:
+    if name == "time":
+        return pa.field(name, TIME_TYPE)
+    if name == "site":
+        # A few hundred distinct sites across millions of rows.
+        return pa.field(name, pa.dictionary(pa.int32(), pa.string()))
+    if sql_type.startswith("INTEGER"):
+        return pa.field(name, pa.int64())
+    if sql_type.startswith("REAL"):
+        # Money and ratios, as float64 to match the store's REAL columns exactly.
+        return pa.field(name, pa.float64())
+    return pa.field(name, pa.string())
+
+
+SCHEMAS: Dict[str, pa.Schema] = {
+    table: pa.schema([_field(c, t) for c, t in cols.items()], metadata={TABLE_KEY: table.encode()})
+    for table, cols in TABLES.items()
+}
+
+
+def _parse_times(values: List[str]) -> pa.Array:
+    # Store times are ISO strings; date-only values parse too, anything else becomes null.
+    raw = pa.array(values, pa.string())
+    full = pc.strptime(raw, format=TIME_FORMAT, unit="s", error_is_null=True)
+    day = pc.strptime(raw, format="%Y-%m-%d", unit="s", error_is_null=True)
+    return pc.coalesce(full, day).cast(TIME_TYPE)
+
+
+def to_batch(table: str, columns: Dict[str, list], sites: pa.Array, schema: Optional[pa.Schema] = None) -> pa.RecordBatch:
+    """One record batch; ``sites`` is the site dictionary shared by every batch of a file."""
+    schema = schema or SCHEMAS[table]
+    arrays = []
+    for f in schema:
+        values = columns[f.name]
+        if f.name == "time":
+            arrays.append(_parse_times(values))
+        elif f.name == "site":
+            codes = pc.index_in(pa.array(values, pa.string()), value_set=sites).cast(pa.int32())
+            arrays.append(pa.DictionaryArray.from_arrays(codes, sites))
+        else:
+            arrays.append(pa.array(values, f.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_archive(
+    store: Any,
+    table: str,
+    sink: Union[str, BinaryIO],
+    fmt: str = "parquet",
+    batch: int = 50_000,
+    upto: Optional[int] = None,
+    with_id: bool = False,
+) -> int:
+    """Stream ``table`` out of the store into a Parquet or Arrow file; returns rows written.
+
+    Rows go through in ``batch``-row record batches, so memory stays flat
+    however large the table is. Rows logged after the export starts (or
+    with ids above ``upto``) are left out, so every batch can share one site dictionary (which Arrow
+    IPC files require). Times that are not ISO dates become null
+    and are reported as rejected if the archive is imported again.
+    ``with_id`` adds the rows' store ids as an ``id`` column (spill files).
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {fmt}")
+    schema = SCHEMAS[table].append(ID_FIELD) if with_id else SCHEMAS[table]
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = ipc.new_file(sink, schema)
+    upto = store.last_id(table) if upto is None else upto
+    # Read after fixing ``upto``, so it covers every exported row.
+    sites = pa.array(store.sites(table), pa.string())
+    n = 0
+    try:
+        for columns in store.iter_columns(table, batch=batch, upto=upto, with_id=with_id):
+            writer.write_batch(to_batch(table, columns, sites, schema))
+            n += len(columns["time"])
+    finally:
+        writer.close()
+    return n
+
+
+def archive_bytes(store: Any, table: str, fmt: str = "parquet") -> bytes:
+    buf = io.BytesIO()
+    write_archive(store, table, buf, fmt)
+    return buf.getvalue()
+
+
+def open_archive(source: Source) -> Tuple[str, pa.Table]:
+    """(table name, contents) of a Parquet or Arrow IPC archive.
+
+    A path is memory-mapped: Arrow files are then read without copying and
+    Parquet pages are decoded straight from the mapping. Bytes (e.g. an
+    upload) are wrapped without a copy.
+    """
+    if isinstance(source, str):
+        src = pa.memory_map(source, "r")
+    elif isinstance(source, (bytes, memoryview)):
+        src = pa.BufferReader(pa.py_buffer(source))
+    else:
+        src = pa.PythonFile(source, mode="r")
+    magic = src.read(6)
+    src.seek(0)
+    if magic[:4] == b"PAR1":
+        data = pq.read_table(src)
+    elif magic == b"ARROW1":
+        data = ipc.open_file(src).read_all()
+    else:
+        raise ValueError("Not a Parquet or Arrow IPC file.")
+    meta = data.schema.metadata or {}
+    table = meta.get(TABLE_KEY, b"").decode() or _guess_table(data.column_names)
+    if table not in SCHEMAS:
+        raise ValueError(f"Unrecognized archive columns: {', '.join(data.column_names)}")
+    return table, _conform(table, data)
+
+
+def _guess_table(columns: List[str]) -> str:
+    have = set(columns)
+    for table, schema in SCHEMAS.items():
+        if set(schema.names) - {"variant_id", "headline", "body"} <= have:
+            return table
+    return ""
+
+
+def _conform(table: str, data: pa.Table) -> pa.Table:
+    # Archives from older versions may lack newer columns; fill them with the store's defaults.
+    schema = SCHEMAS[table]
+    columns = []
+    for f in schema:
+        if f.name in data.column_names:
+            col = data.column(f.name)
+            if f.name == "time" and pa.types.is_string(col.type):
+                col = _parse_times(col.to_pylist())
+            columns.append(col.cast(f.type) if col.type != f.type else col)
+        else:
+            default = "" if pa.types.is_string(f.type) else 0
+            columns.append(pa.array([default] * len(data), f.type))
+    if ID_FIELD.name in data.column_names:
+        schema = schema.append(ID_FIELD)
+        columns.append(data.column(ID_FIELD.name).cast(ID_FIELD.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _timestamp(value: Union[str, datetime.date]) -> pa.Scalar:
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return pa.scalar(value.replace(tzinfo=datetime.timezone.utc), TIME_TYPE)
+
+
+def filter_archive(
+    data: pa.Table,
+    sites: Optional[List[str]] = None,
+    since: Optional[Union[str, datetime.date]] = None,
+    until: Optional[Union[str, datetime.date]] = None,
+) -> pa.Table:
+    """Rows for any of ``sites`` within [since, until), evaluated column-wise."""
+    mask = None
+    if sites:
+        mask = pc.is_in(data.column("site").cast(pa.string()), value_set=pa.array(sites, pa.string()))
+    for op, bound in ((pc.greater_equal, since), (pc.less, until)):
+        if bound:
+            m = op(data.column("time"), _timestamp(bound))
+            mask = m if mask is None else pc.and_(mask, m)
+    return data if mask is None else data.filter(mask)
+
+
+def archive_sites(data: pa.Table) -> List[str]:
+    return sorted(pc.unique(data.column("site").cast(pa.string())).drop_null().to_pylist())
+
+
+def _tuples(part: pa.RecordBatch) -> List[tuple]:
+    columns = []
+    for f in part.schema:
+        col = part.column(f.name)
+        if f.name == "time":
+            col = pc.strftime(col, format=TIME_FORMAT)
+        elif pa.types.is_dictionary(f.type):
+            col = col.cast(pa.string())
+        columns.append(col.to_pylist())
+    return list(zip(*columns))
+
+
+def import_archive(store: Any, table: str, data: pa.Table, batch: int = 50_000) -> Dict[str, int]:
+    """Merge archive rows into the store, skipping rows it already holds.
+
+    Rows of a spill file whose ids are at or below the store's spill mark
+    are restored under those ids (``PostingStore.restore_tuples``): they
+    were never taken out of the rollups, so inserting them as new rows
+    would count them twice. Other rows are appended unless an identical
+    row is live. Returns counts of rows ``read``, ``inserted`` (of which
+    ``restored``), ``duplicates`` (already stored) and ``rejected`` (no
+    usable time).
+    """
+    valid = data.filter(pc.is_valid(data.column("time")))
+    rejected = len(data) - len(valid)
+    inserted = restored = 0
+    if ID_FIELD.name in valid.column_names:
+        ids = valid.column(ID_FIELD.name)
+        spilled = pc.less_equal(pc.fill_null(ids, 0), store.spilled_through(table))
+        spilled = pc.and_(spilled, pc.is_valid(ids))
+        back = valid.filter(spilled).select([ID_FIELD.name] + SCHEMAS[table].names)
+        for part in back.to_batches(max_chunksize=batch):
+            restored += store.restore_tuples(table, _tuples(part))
+        valid = valid.filter(pc.invert(spilled))
+        inserted = restored
+    valid = valid.select(SCHEMAS[table].names)
+    for part in valid.to_batches(max_chunksize=batch):
+        inserted += store.insert_tuples(table, _tuples(part), skip_existing=True)
+    return {
+        "read": len(data),
+        "inserted": inserted,
+        "restored": restored,
+        "duplicates": len(data) - rejected - inserted,
+        "rejected": rejected,
+    }
+
+
+def spill_to_disk(store: Any, table: str, upto: int, directory: str = SPILL_DIR) -> str:
+    """Move rows with ids up to ``upto`` into a Parquet file, then delete them from the store.
+
+    Used as the store's ``spill`` callback for capped tables. The file is
+    complete on disk before any row is deleted, and keeps the rows' ids so
+    ``import_archive`` can restore them without counting them twice.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table}-{upto:012d}.parquet")
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        write_archive(store, table, tmp, "parquet", upto=upto, with_id=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    store.delete_through(table, upto)
+    return path
+
+
+def spill_files(table: str, directory: str = SPILL_DIR) -> List[Dict[str, Any]]:
+    if not os.path.isdir(directory):
+        return []
+    out = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(f"{table}-") and name.endswith(".parquet"):
+            path = os.path.join(directory, name)
+            out.append({
+                "file": name,
+                "rows": pq.ParquetFile(path).metadata.num_rows,
+                "MB": round(os.path.getsize(path) / 1e6, 2),
+            })
+    return out
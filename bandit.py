@@ -0,0 +1,206 @@
+"""Variant x site allocation: Beta-Bernoulli bandit over campaign snapshots, vectorized with NumPy."""
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# What counts as a trial and a success for each objective.
+OBJECTIVES = {
+    "conversion": ("clicks", "sales"),
+    "ctr": ("impressions", "clicks"),
+}
+METHODS = ("thompson", "ucb")
+# Pseudo-trials given to the pooled rate when no explicit prior is set.
+PRIOR_STRENGTH = 10.0
+_COUNTS = ["impressions", "clicks", "sales", "revenue"]
+
+
+class BanditModel:
+    """Per-arm counters for (variant_id, site) pairs, fed incrementally from the store.
+
+    Counts live in one growable (arms, 4) float array, so an update is a
+    single ``np.add.at`` and scoring thousands of arms is a handful of array
+    operations. Thompson sampling draws from Beta(a + successes, b +
+    failures), where the prior (a, b) defaults to the pooled rate of all
+    arms worth ``PRIOR_STRENGTH`` trials, so untried arms are explored
+    around what ads usually do rather than around 50%. UCB1 adds
+    sqrt(2 ln N / n) to the observed rate and ranks untried arms first.
+    ``sync`` folds in only snapshots newer than the last one it read.
+    """
+
+    def __init__(self, prior: Optional[Tuple[float, float]] = None):
+        self.prior = prior
+        self.arms: List[Tuple[str, str]] = []
+        self.last_id = 0
+        self.version = 0
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._counts = np.zeros((0, len(_COUNTS)), dtype=np.float64)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.arms)
+
+    def arm_ids(self, variant_ids: Sequence[str], sites: Sequence[str]) -> np.ndarray:
+        """Row of each (variant_id, site) pair, registering unseen arms with zero counts."""
+        with self._lock:
+            out = np.empty(len(variant_ids), dtype=np.int64)
+            for j, key in enumerate(zip(variant_ids, sites)):
+                i = self._index.get(key)
+                if i is None:
+                    i = self._index[key] = len(self.arms)
+                    self.arms.append(key)
+                out[j] = i
+            if len(self.arms) > len(self._counts):
+                grown = np.zeros((max(1024, len(self.arms), 2 * len(self._counts)), len(_COUNTS)))
+                grown[:len(self._counts)] = self._counts
+                self._counts = grown
+            return out
+
+    def lookup(self, variant_ids: Sequence[str], sites: Sequence[str]) -> np.ndarray:
+        """Row of each (variant_id, site) pair, or -1 for an arm no snapshot has reached.
+
+        Read-only: scoring candidates never registers them, so the model only
+        grows with the arms snapshots actually report on.
+        """
+        with self._lock:
+            get = self._index.get
+            return np.fromiter((get(k, -1) for k in zip(variant_ids, sites)), dtype=np.int64, count=len(variant_ids))
+
+    def grid(self, variant_ids: Sequence[str], sites: Sequence[str]) -> np.ndarray:
+        """Arm rows (or -1) for every variant x site combination, variant-major."""
+        return self.lookup([v for v in variant_ids for _ in sites], list(sites) * len(variant_ids))
+
+    def _gather(self, idx: np.ndarray) -> np.ndarray:
+        # Counts of arms by row; -1 (an arm never updated) reads as zeros. Caller holds the lock.
+        if not len(self._counts):
+            return np.zeros((len(idx), len(_COUNTS)))
+        counts = self._counts[np.maximum(idx, 0)]
+        counts[idx < 0] = 0.0
+        return counts
+
+    def tried_variants(self) -> List[str]:
+        """Variant ids with at least one impression or click recorded on some site."""
+        with self._lock:
+            pulled = self._counts[:len(self.arms), :2].sum(axis=1) > 0
+            return list(dict.fromkeys(self.arms[i][0] for i in np.flatnonzero(pulled)))
+
+    def update(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Add snapshot rows to their arms; rows without a variant_id are ignored."""
+        rows = [r for r in rows if r.get("variant_id")]
+        if not rows:
+            return 0
+        with self._lock:
+            idx = self.arm_ids([r["variant_id"] for r in rows], [r["site"] for r in rows])
+            values = np.array([[float(r.get(c) or 0) for c in _COUNTS] for r in rows])
+            np.add.at(self._counts, idx, values)
+            self.version += 1
+        return len(rows)
+
+    def sync(self, store: Any, table: str = "campaign", batch: int = 5000) -> int:
+        """Fold in snapshots the store gained since the last sync; returns how many were read."""
+        read = 0
+        with self._lock:
+            for rows in store.iter_rows(table, batch=batch, after=self.last_id, with_id=True):
+                self.update(rows)
+                self.last_id = rows[-1]["id"]
+                read += len(rows)
+        return read
+
+    def _prior(self, objective: str) -> Tuple[float, float]:
+        if self.prior is not None:
+            return self.prior
+        trial_col, win_col = (_COUNTS.index(c) for c in OBJECTIVES[objective])
+        trials = self._counts[:, trial_col].sum()
+        wins = min(self._counts[:, win_col].sum(), trials)
+        rate = (wins + 1.0) / (trials + 2.0)
+        return PRIOR_STRENGTH * rate, PRIOR_STRENGTH * (1.0 - rate)
+
+    def _trials(self, idx: np.ndarray, objective: str) -> Tuple[np.ndarray, np.ndarray]:
+        trial_col, win_col = (_COUNTS.index(c) for c in OBJECTIVES[objective])
+        counts = self._gather(idx)
+        trials = counts[:, trial_col]
+        return trials, np.minimum(counts[:, win_col], trials)
+
+    def scores(
+        self,
+        idx: np.ndarray,
+        method: str = "thompson",
+        objective: str = "conversion",
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """One score per arm: a posterior draw (Thompson) or an upper confidence bound (UCB1)."""
+        with self._lock:
+            trials, wins = self._trials(idx, objective)
+            a, b = self._prior(objective)
+        if method == "thompson":
+            rng = rng or np.random.default_rng()
+            return rng.beta(a + wins, b + trials - wins)
+        if method == "ucb":
+            total = max(trials.sum(), 1.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                bound = wins / trials + np.sqrt(2.0 * np.log(total) / trials)
+            return np.where(trials > 0, bound, np.inf)
+        raise ValueError(f"Unknown method: {method}")
+
+    def win_rates(
+        self,
+        idx: np.ndarray,
+        objective: str = "conversion",
+        draws: int = 200,
+        shortlist: int = 256,
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """Share of ``draws`` joint posterior samples in which each arm comes out best.
+
+        Only the ``shortlist`` arms with the highest mean + 3 sd are sampled;
+        the rest have a negligible chance of winning and get 0.
+        """
+        with self._lock:
+            trials, wins = self._trials(idx, objective)
+            a, b = self._prior(objective)
+        alpha, beta = a + wins, b + trials - wins
+        out = np.zeros(len(idx))
+        live = np.arange(len(idx))
+        if len(idx) > shortlist:
+            n = alpha + beta
+            upper = alpha / n + 3.0 * np.sqrt(alpha * beta / (n * n * (n + 1.0)))
+            live = np.argpartition(-upper, shortlist - 1)[:shortlist]
+        rng = rng or np.random.default_rng()
+        best = rng.beta(alpha[live], beta[live], size=(draws, len(live))).argmax(axis=1)
+        out[live] = np.bincount(best, minlength=len(live)) / draws
+        return out
+
+    def recommend(
+        self,
+        variant_ids: Sequence[str],
+        sites: Sequence[str],
+        method: str = "thompson",
+        objective: str = "conversion",
+        k: int = 10,
+        rng: Optional[np.random.Generator] = None,
+    ) -> List[Dict[str, Any]]:
+        """The ``k`` best-scoring variant/site pairs with their observed counts."""
+        if not len(variant_ids) or not len(sites):
+            return []
+        idx = self.grid(variant_ids, sites)
+        rng = rng or np.random.default_rng()
+        score = self.scores(idx, method, objective, rng)
+        p_best = self.win_rates(idx, objective, rng=rng) if method == "thompson" else None
+        top = np.argsort(-score, kind="stable")[:k]
+        with self._lock:
+            trials, wins = self._trials(idx[top], objective)
+            counts = self._gather(idx[top])
+        out = []
+        for j, t in enumerate(top):
+            variant, site = variant_ids[t // len(sites)], sites[t % len(sites)]
+            row = {
+                "variant_id": variant,
+                "site": site,
+                "score": round(float(score[t]), 4),
+                "rate": round(float(wins[j] / trials[j]), 4) if trials[j] else None,
+                **{c: round(float(counts[j, i]), 2) for i, c in enumerate(_COUNTS)},
+            }
+            if p_best is not None:
+                row["P(best)"] = round(float(p_best[t]), 3)
+            out.append(row)
+        return out
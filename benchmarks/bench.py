@@ -0,0 +1,556 @@
+"""Reproducible benchmarks for scoring, variants, exports, sites, dedupe, scheduling, the bandit, site copy rules, site ranking, history paging and event ingestion.
+
+    python benchmarks/bench.py                        # 1k + 100k, compare to baseline
+    python benchmarks/bench.py --scales 1k,100k,1m    # include the 1M tier
+    python benchmarks/bench.py --update-baseline      # record a new baseline
+    python benchmarks/bench.py --cases score,site_filter --threshold 0.15
+
+Every case runs in a freshly spawned process on seeded synthetic data, so
+the peak-memory figure (growth of max RSS during the timed section) is not
+polluted by earlier cases. A case regresses when its throughput drops, or
+its peak memory grows, by more than ``--threshold`` relative to the
+baseline; the run then exits with status 1.
+"""
+import argparse
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from typing import List, Dict, Any, Callable, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+# Small cases are repeated until the timed section lasts at least this long.
+MIN_SECONDS = 0.5
+# Absolute slack so tiny cases don't flag allocator noise as a memory regression.
+MEMORY_SLACK_MB = 8.0
+
+_WORDS = (
+    "secret finally new proven guarantee fast today now limited exclusive results simple "
+    "people money time weight sleep energy business home family health local service quality "
+    "click here get started join now claim grab days weeks months attention problem solution bonus "
+    "the a to and of for with your you our in on is it this that"
+).split()
+_REGIONS = ["US", "Global", "Global/US", "Europe", "UK", "Canada", "LATAM", "SE Asia", "India", "Africa", "Australia"]
+_CATEGORIES = ["General", "Local Apps", "Services", "Real Estate", "Pets", "Jobs", "Autos", "Events"]
+
+
+def _rng() -> random.Random:
+    return random.Random(1919)
+
+
+def synthetic_texts(n: int) -> List[str]:
+    rng = _rng()
+    out = []
+    for i in range(n):
+        words = rng.choices(_WORDS, k=rng.choice((40, 120, 400)))
+        if i % 3 == 0:
+            words.append(f"${rng.randint(5, 500)}")
+        out.append(" ".join(words).capitalize() + ".")
+    return out
+
+
+def synthetic_briefs(n: int) -> List[Tuple[str, str, str, str]]:
+    from variants import MASTER_STYLES
+
+    rng = _rng()
+    masters = list(MASTER_STYLES)
+    return [
+        (
+            f"Product {i}",
+            " ".join(rng.choices(_WORDS, k=4)) + " (fast)",
+            " ".join(rng.choices(_WORDS, k=3)),
+            masters[i % len(masters)],
+        )
+        for i in range(n)
+    ]
+
+
+def synthetic_ads(n: int) -> List[Dict[str, str]]:
+    from variants import make_variants
+
+    base = make_variants("Product", "sleep better tonight", "busy parents", "Hybrid Mix")
+    return [{"headline": f"{base[i % 5]['headline']} #{i}", "body": base[i % 5]["body"] + f"\n<ref {i}> & co"} for i in range(n)]
+
+
+def synthetic_sites(n: int) -> List[Dict[str, Any]]:
+    rng = _rng()
+    sites = []
+    for i in range(n):
+        name = " ".join(w.capitalize() for w in rng.choices(_WORDS, k=2)) + f" {i}"
+        sites.append({
+            "name": name,
+            "region": rng.choice(_REGIONS),
+            "category": rng.choice(_CATEGORIES),
+            "needs_account": bool(i % 2),
+            "url": f"https://site{i}.example.com",
+            "notes": "synthetic",
+        })
+    return sites
+
+
+# ---------- Cases ----------
+# Each case takes n and returns (setup, op): setup builds the data untimed,
+# op(data) is the timed section and returns the number of operations done.
+
+def case_score(n: int):
+    from scoring import analyze_copy_score
+
+    def op(texts):
+        for t in texts:
+            analyze_copy_score(t)
+        return len(texts)
+    return lambda: synthetic_texts(n), op
+
+
+def case_live_score(n: int):
+    # n keystrokes, each retyping the last character of one paragraph of ~2,000-word copy.
+    from scoring import LiveScorer
+
+    def setup():
+        rnd = _rng()
+        words = " ".join(synthetic_texts(100)).split()[:2000]
+        paras = [" ".join(words[i:i + 50]) for i in range(0, len(words), 50)]
+        return paras, [(rnd.randrange(len(paras)), rnd.choice("ab ")) for _ in range(n)]
+
+    def op(data):
+        paras, edits = data
+        paras = list(paras)
+        scorer = LiveScorer()
+        for i, ch in edits:
+            paras[i] = paras[i][:-1] + ch
+            scorer.score("\n\n".join(paras))
+        return len(edits)
+    return setup, op
+
+
+def case_variants(n: int):
+    from variants import make_variants
+
+    def op(briefs):
+        for b in briefs:
+            make_variants(*b)
+        return len(briefs)
+    return lambda: synthetic_briefs(n), op
+
+
+def _export_case(fmt: str):
+    def case(n: int):
+        from exports import iter_export
+
+        def op(ads):
+            for _ in iter_export(ads, fmt):
+                pass
+            return len(ads)
+        return lambda: synthetic_ads(n), op
+    return case
+
+
+def case_site_index(n: int):
+    from directory import SiteDirectory
+
+    def op(sites):
+        SiteDirectory(sites)
+        return len(sites)
+    return lambda: synthetic_sites(n), op
+
+
+_FILTER_QUERIES = [
+    ("All", "All", ""),
+    ("US", "All", ""),
+    ("All", "Services", ""),
+    ("Europe", "Jobs", ""),
+    ("All", "All", "se"),
+    ("All", "All", "secret"),
+    ("US", "General", "money"),
+    ("All", "All", "zzz-no-match"),
+]
+
+
+def case_site_filter(n: int):
+    from directory import SiteDirectory
+
+    def setup():
+        return SiteDirectory(synthetic_sites(n))
+
+    def op(directory):
+        # filter_ids is what the Posting Hub calls; filter() additionally builds dicts.
+        rounds = 20
+        for _ in range(rounds):
+            for region, category, search in _FILTER_QUERIES:
+                directory.filter_ids(region, category, search)
+        return rounds * len(_FILTER_QUERIES)
+    return setup, op
+
+
+def case_dedupe_index(n: int):
+    from dedupe import NearDupIndex, signatures
+
+    def op(texts):
+        index = NearDupIndex()
+        index.add_many(range(len(texts)), signatures(texts))
+        return len(texts)
+    return lambda: synthetic_texts(n), op
+
+
+def case_dedupe_query(n: int):
+    from dedupe import NearDupIndex, signature, signatures
+
+    def setup():
+        texts = synthetic_texts(n)
+        index = NearDupIndex()
+        index.add_many(range(n), signatures(texts))
+        return index, [signature(t + " today") for t in texts[:200]]
+
+    def op(data):
+        index, probes = data
+        for sig in probes:
+            index.query_signature(sig)
+        return len(probes)
+    return setup, op
+
+
+def case_site_import(n: int):
+    from directory import read_sites
+
+    def op(data):
+        read_sites(io.BytesIO(data))
+        return n
+    return lambda: json.dumps(synthetic_sites(n)).encode("utf-8"), op
+
+
+def case_schedule(n: int):
+    # n planned posts: 100 cities per site, then work off the first 1% of the queue.
+    from scheduler import PostingPlan
+
+    def setup():
+        return synthetic_ads(150), [f"site {i}" for i in range(max(1, n // 100))], [f"city {i}" for i in range(min(n, 100))]
+
+    def op(data):
+        variants, sites, cities = data
+        plan = PostingPlan(variants, sites, cities, start=0.0)
+        for _ in range(max(1, n // 100)):
+            plan.complete(plan.next_items(1)[0].id, when=0.0)
+        return n
+    return setup, op
+
+
+def case_bandit(n: int):
+    # n arms (100 variants x n/100 sites): fold in a batch of snapshots, then recommend.
+    from bandit import BanditModel
+
+    def setup():
+        rnd = _rng()
+        variants = [f"v{i}" for i in range(100)]
+        sites = [f"site {i}" for i in range(max(1, n // 100))]
+        model = BanditModel()
+        model.arm_ids([v for v in variants for _ in sites], sites * len(variants))
+        rows = [
+            {"variant_id": rnd.choice(variants), "site": rnd.choice(sites), "clicks": 20, "sales": rnd.randint(0, 3)}
+            for _ in range(1000)
+        ]
+        return model, variants, sites, rows
+
+    def op(data):
+        model, variants, sites, rows = data
+        model.update(rows)
+        model.recommend(variants, sites)
+        return n
+    return setup, op
+
+
+def case_site_rules(n: int):
+    # n variant x site checks (1k variants x n/1k sites): compile every site's rules, check the grid.
+    from constraints import RuleBook
+
+    def setup():
+        rnd = _rng()
+        sites = synthetic_sites(max(1, n // 1000))
+        rule_sets = [
+            {
+                "max_headline": rnd.choice([0, 60, 70, 100]),
+                "max_body": rnd.choice([0, 500, 2000]),
+                "banned_words": rnd.sample(_WORDS, 5) + [" ".join(rnd.sample(_WORDS, 2))],
+                "allow_links": rnd.random() < 0.5,
+                "allow_phone": rnd.random() < 0.7,
+            }
+            for _ in range(40)
+        ]
+        rules = [rnd.choice(rule_sets) if rnd.random() < 0.8 else None for _ in sites]
+        return [s["name"] for s in sites], rules, synthetic_ads(1000)
+
+    def op(data):
+        names, rules, ads = data
+        RuleBook(names, rules).check(ads)
+        return len(ads) * len(names)
+    return setup, op
+
+
+def case_site_rank(n: int):
+    # n sites: fold a new batch of snapshots into the site stats, then rank every site for a brief.
+    from directory import SiteDirectory
+    from recommend import SiteRanker, SiteStats, overlay_scores, top
+    from store import PostingStore
+
+    def setup():
+        rnd = _rng()
+        sites = synthetic_sites(n)
+        names = [s["name"] for s in sites]
+        store = PostingStore(":memory:")
+        store.insert("history", (
+            {"time": "2025-01-01T00:00:00", "site": rnd.choice(names), "note": "", "link": "", "headline": "h", "body": "b"}
+            for _ in range(20_000)
+        ))
+        store.insert("campaign", (
+            {"time": "2025-01-01T00:00:00", "site": rnd.choice(names), "clicks": 50, "sales": rnd.randint(0, 5), "revenue": rnd.random() * 200}
+            for _ in range(20_000)
+        ))
+        stats = SiteStats()
+        stats.sync(store)
+        ranker = SiteRanker(SiteDirectory(sites))
+        batch = [
+            {"time": "2025-01-02T00:00:00", "site": rnd.choice(names), "clicks": 20, "sales": 1, "revenue": 40.0}
+            for _ in range(100)
+        ]
+        return store, stats, ranker, batch
+
+    def op(data):
+        store, stats, ranker, batch = data
+        store.insert("campaign", batch)
+        stats.sync(store)
+        top(overlay_scores(ranker, None, stats, "Services", "US"), 10)
+        return n
+    return setup, op
+
+
+def _history_store(n: int):
+    from store import PostingStore
+
+    rnd = _rng()
+    start = datetime.datetime(2025, 1, 1)
+    store = PostingStore(":memory:")
+    store.insert("history", (
+        {
+            "time": (start + datetime.timedelta(seconds=37 * i)).isoformat(),
+            "site": f"site {rnd.randrange(200)}",
+            "note": rnd.choice(_REGIONS),
+            "link": f"https://ads.example.com/{i}",
+            "headline": ad["headline"],
+            "body": ad["body"],
+        }
+        for i, ad in enumerate(synthetic_ads(n))
+    ))
+    return store
+
+
+def _history_roundtrip(fmt: str):
+    # Export the history table and read it back into columns.
+    def case(n: int):
+        def op(store):
+            if fmt == "csv":
+                import csv
+                data = b"".join(store.iter_csv("history")).decode("utf-8")
+                rows = sum(1 for _ in csv.DictReader(io.StringIO(data)))
+            else:
+                from archive import archive_bytes, open_archive
+                rows = len(open_archive(archive_bytes(store, "history", fmt))[1])
+            assert rows == n
+            return n
+
+        def setup():
+            if fmt != "csv":
+                # Load pyarrow here so its import is not timed.
+                import archive
+            return _history_store(n)
+        return setup, op
+    return case
+
+
+def case_history_page(n: int):
+    # What one table render asks the store for: a filtered count and a deep, sorted page.
+    def op(store):
+        for order_by, search in (("time", ""), ("site", ""), ("note", ""), ("time", "Canada")):
+            total = store.count("history", search=search)
+            rows = store.fetch("history", limit=100, offset=max(0, total // 2), order_by=order_by, search=search)
+            assert len(rows) <= 100
+        return n
+    return (lambda: _history_store(n)), op
+
+
+def case_ingest_events(n: int):
+    # A tracker export of n events (names, domains and referrer URLs for sites) into a fresh store.
+    from directory import SiteDirectory
+
+    rnd = _rng()
+    sites = synthetic_sites(200)
+    kinds = ["impression"] * 16 + ["click"] * 3 + ["sale"]
+    buf = io.StringIO()
+    buf.write("event_id,timestamp,source,event,value,variant\n")
+    for i in range(n):
+        s = sites[rnd.randrange(len(sites))]
+        source = s["name"] if i % 3 else s["url"] + "/listing/" + str(i % 97)
+        kind = kinds[i % len(kinds)]
+        buf.write(f"e{i},2025-03-{1 + i % 30:02d}T{i % 24:02d}:00:00Z,{source},{kind},{'19.99' if kind == 'sale' else ''},v{i % 5}\n")
+    data = buf.getvalue().encode("utf-8")
+
+    def op(directory):
+        from ingest import ingest_events
+        from store import PostingStore
+        # A fresh store each time, or the repeats would all be skipped as already ingested.
+        report = ingest_events(PostingStore(":memory:"), data, directory)
+        assert report["ingested"] == n, report
+        return n
+    return (lambda: SiteDirectory(sites)), op
+
+
+CASES: Dict[str, Callable[[int], Any]] = {
+    "score": case_score,
+    "live_score": case_live_score,
+    "variants": case_variants,
+    "export_csv": _export_case("csv"),
+    "export_md": _export_case("md"),
+    "export_html": _export_case("html"),
+    "site_index": case_site_index,
+    "site_filter": case_site_filter,
+    "site_import": case_site_import,
+    "dedupe_index": case_dedupe_index,
+    "dedupe_query": case_dedupe_query,
+    "schedule": case_schedule,
+    "bandit": case_bandit,
+    "site_rules": case_site_rules,
+    "site_rank": case_site_rank,
+    "history_csv": _history_roundtrip("csv"),
+    "history_parquet": _history_roundtrip("parquet"),
+    "history_arrow": _history_roundtrip("arrow"),
+    "history_page": case_history_page,
+    "ingest_events": case_ingest_events,
+}
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_case(name: str, n: int, conn) -> None:
+    try:
+        setup, op = CASES[name](n)
+        data = setup()
+        before = _max_rss_mb()
+        start = time.perf_counter()
+        ops = op(data)
+        while time.perf_counter() - start < MIN_SECONDS:
+            ops += op(data)
+        seconds = time.perf_counter() - start
+        conn.send({
+            "n": n,
+            "ops": ops,
+            "seconds": round(seconds, 4),
+            "throughput": round(ops / seconds, 1) if seconds else float("inf"),
+            "peak_mb": round(max(_max_rss_mb() - before, 0.0), 1),
+        })
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_case(name: str, n: int) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_run_case, args=(name, n, child))
+    proc.start()
+    child.close()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    problems = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base or "error" in cur or "error" in base:
+            continue
+        if cur["throughput"] < base["throughput"] * (1 - threshold):
+            problems.append(f"{key}: throughput {cur['throughput']:,.0f}/s vs baseline {base['throughput']:,.0f}/s")
+        if cur["peak_mb"] > base["peak_mb"] * (1 + threshold) + MEMORY_SLACK_MB:
+            problems.append(f"{key}: peak memory {cur['peak_mb']} MB vs baseline {base['peak_mb']} MB")
+    return problems
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scales", default="1k,100k", help=f"comma list of {', '.join(SCALES)}")
+    p.add_argument("--cases", default=",".join(CASES), help="comma list of cases")
+    p.add_argument("--baseline", default=DEFAULT_BASELINE)
+    p.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression (0.25 = 25%%)")
+    p.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    p.add_argument("--output", help="also write this run's results to a JSON file")
+    args = p.parse_args(argv)
+
+    scales = [s.strip().lower() for s in args.scales.split(",") if s.strip()]
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [s for s in scales if s not in SCALES] + [c for c in cases if c not in CASES]
+    if unknown:
+        p.error(f"unknown scale/case: {', '.join(unknown)}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for scale in scales:
+        for case in cases:
+            key = f"{case}@{scale}"
+            res = run_case(case, SCALES[scale])
+            results[key] = res
+            if "error" in res:
+                print(f"{key:<22} ERROR {res['error']}")
+            else:
+                print(f"{key:<22} {res['throughput']:>14,.0f} ops/s {res['seconds']:>9.3f}s {res['peak_mb']:>8.1f} MB")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat()[:19],
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = any("error" in r for r in results.values())
+    if args.update_baseline or not os.path.exists(args.baseline):
+        merged = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                merged = json.load(f).get("results", {})
+        merged.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": report["meta"], "results": merged}, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 1 if failed else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f).get("results", {})
+    problems = compare(results, baseline, args.threshold)
+    for msg in problems:
+        print(f"REGRESSION {msg}")
+    if not problems and not failed:
+        print(f"no regressions beyond {args.threshold:.0%} of baseline")
+    return 1 if problems or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Multi-session load test: scripted operator sessions run concurrently against app.py.
+
+    python benchmarks/loadtest.py                          # 1, 4 and 16 sessions
+    python benchmarks/loadtest.py --sessions 8 --rounds 5  # one level, longer sessions
+    python benchmarks/loadtest.py --sessions 1,8,32 --p95-budget 1500 --output load.json
+
+Each session is a Streamlit ``AppTest`` driven on its own thread, and all
+sessions of a level share one process, so the process-wide resources (site
+directory, store, caches) are shared exactly as under ``streamlit run``.
+A session logs in, then for each round generates variants, filters the
+site table, logs a posting, adds a campaign snapshot and exports history.
+Every ``.run()`` is one rerun and is timed.
+
+Each level runs in a freshly spawned process with its own empty data
+directory and one untimed warm-up session. It reports rerun latency
+percentiles (overall and per step) and resident memory per session: the
+growth of the process RSS from before the sessions start to when all of
+them are loaded, divided by the number of sessions. The run exits with
+status 1 if any rerun raised, or if ``--p95-budget`` is given and a
+level's p95 latency exceeds it.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+APP_PATH = os.path.join(ROOT, "app.py")
+DEFAULT_SESSIONS = "1,4,16"
+DEFAULT_USER = "deandre"
+# The app's fallback password when no ADMIN_PASSWORD secret is configured.
+DEFAULT_PASSWORD = "IlluminatiWarRoom!"
+STEPS = ["login", "generate", "navigate", "filter", "log_posting", "snapshot", "export"]
+
+_PRODUCTS = ["Sleep Pro", "Lawn Rescue", "Budget Movers", "Keto Meals", "Dog Walkers", "Tax Helpers"]
+_BENEFITS = ["sleep better tonight", "save hours every week", "cut costs by half", "feel great again"]
+
+
+def _rss_mb() -> float:
+    # Current resident set size; falls back to the peak where /proc is unavailable.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: List[float]) -> Dict[str, Any]:
+    ms = [x * 1000 for x in latencies]
+    return {
+        "reruns": len(ms),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "max_ms": round(max(ms, default=0.0), 1),
+    }
+
+
+def _share_runtime() -> None:
+    """Make concurrent AppTest runs behave like sessions of one server process.
+
+    AppTest is built for one run at a time: each run installs a mock Runtime
+    in a global and clears it afterwards, patches its test-mode config flag
+    in and out, and recompiles the script (CPython's compiler is not safe to
+    run on several threads at once). A server shares one runtime and one
+    bytecode cache across sessions, so do the same here.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    config.set_option("global.appTest", True)
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+class Session:
+    """One scripted operator; records (step, seconds) for every rerun it triggers."""
+
+    def __init__(self, number: int, rounds: int, think: float, password: str, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.rounds = rounds
+        self.think = think
+        self.password = password
+        self.rnd = random.Random(number)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings: List[tuple] = []
+        self.errors: List[str] = []
+
+    def _run(self, step: str, target: Any) -> None:
+        start = time.perf_counter()
+        target.run()
+        self.timings.append((step, time.perf_counter() - start))
+        for e in self.at.exception:
+            self.errors.append(f"{step}: {e.message}")
+
+    def _pause(self) -> None:
+        if self.think:
+            time.sleep(self.rnd.uniform(0, 2 * self.think))
+
+    def _widget(self, elements: Any, label: str, last: bool = False) -> Any:
+        matches = [w for w in elements if w.label == label]
+        if not matches:
+            raise LookupError(f"no widget labelled {label!r}")
+        return matches[-1 if last else 0]
+
+    def _button(self, text: str) -> Any:
+        for b in self.at.button:
+            if text in b.label:
+                return b
+        raise LookupError(f"no button containing {text!r}")
+
+    def _goto(self, page: str) -> None:
+        self._run("navigate", self.at.sidebar.radio[0].set_value(page))
+
+    def login(self) -> None:
+        self._run("login", self.at)
+        self._widget(self.at.text_input, "Username").set_value(DEFAULT_USER)
+        self._widget(self.at.text_input, "Password").set_value(self.password)
+        self._run("login", self._button("Enter War Room").click())
+        if not self.at.session_state["admin_authenticated"]:
+            raise RuntimeError("login failed; pass --password if ADMIN_PASSWORD is set")
+
+    def one_round(self) -> None:
+        at, rnd = self.at, self.rnd
+        self._goto("Compose & Variants")
+        self._widget(at.text_input, "Offer / Product Name").set_value(rnd.choice(_PRODUCTS))
+        self._widget(at.text_input, "Single Biggest Benefit").set_value(rnd.choice(_BENEFITS))
+        self._run("generate", self._button("Generate Variants").click())
+        self._pause()
+
+        self._goto("Sites & Posting")
+        region = self._widget(at.selectbox, "Filter by Region")
+        self._run("filter", region.set_value(rnd.choice(region.options)))
+        self._run("filter", self._widget(at.text_input, "Search by name").set_value(rnd.choice("aeiou")))
+        self._run("filter", self._widget(at.text_input, "Search by name").set_value(""))
+        self._run("filter", self._widget(at.selectbox, "Filter by Region").set_value("All"))
+        self._widget(at.text_input, "Note (e.g., city/section used)").set_value(f"loadtest {self.number}")
+        self._run("log_posting", self._button("Log Posting").click())
+        self._pause()
+
+        self._goto("Campaign Tracker")
+        self._widget(at.number_input, "Impressions").set_value(rnd.randrange(100, 5000))
+        self._widget(at.number_input, "Clicks").set_value(rnd.randrange(1, 100))
+        self._widget(at.number_input, "Sales").set_value(rnd.randrange(0, 5))
+        self._run("snapshot", self._button("Add Snapshot").click())
+        self._pause()
+
+        self._goto("Exports")
+        self._run("export", self._widget(at.radio, "Format", last=True).set_value("parquet"))
+        self._run("export", self._button("Prepare").click())
+        self._pause()
+
+    def state_bytes(self) -> int:
+        import perf
+
+        state = self.at.session_state
+        return sum(perf.approx_size(state[k]) for k in state._state._keys() if not k.startswith("$$"))
+
+
+def _run_level(sessions: int, rounds: int, think: float, password: str, timeout: float, data_dir: str, conn) -> None:
+    try:
+        os.environ["ILLUMINATI_DATA_DIR"] = data_dir
+        os.chdir(ROOT)
+        _share_runtime()
+        # Warm imports, bytecode and process-wide resources so the first session doesn't pay for them.
+        warm = Session(-1, 1, 0.0, password, timeout)
+        warm.login()
+        warm.one_round()
+        if warm.errors:
+            raise RuntimeError(f"warm-up session failed: {warm.errors[0]}")
+        before = _rss_mb()
+
+        pool = [Session(i, rounds, think, password, timeout) for i in range(sessions)]
+        loaded = threading.Barrier(sessions + 1)
+        done = threading.Barrier(sessions + 1)
+
+        def drive(s: Session) -> None:
+            try:
+                s.login()
+                for _ in range(s.rounds):
+                    s.one_round()
+            except Exception as e:
+                s.errors.append(f"{type(e).__name__}: {e}")
+            finally:
+                loaded.wait()
+                # Stay alive until memory has been measured with every session loaded.
+                done.wait()
+
+        threads = [threading.Thread(target=drive, args=(s,), name=f"loadtest-{s.number}") for s in pool]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        loaded.wait()
+        wall = time.perf_counter() - start
+        after = _rss_mb()
+        done.wait()
+        for t in threads:
+            t.join()
+
+        latencies = [sec for s in pool for _, sec in s.timings]
+        steps = {
+            step: summarize([sec for s in pool for name, sec in s.timings if name == step])
+            for step in STEPS
+        }
+        errors = [f"session {s.number} {msg}" for s in pool for msg in s.errors]
+        conn.send({
+            "sessions": sessions,
+            "rounds": rounds,
+            "wall_s": round(wall, 2),
+            "reruns_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+            **summarize(latencies),
+            "rss_mb": round(after, 1),
+            "rss_per_session_mb": round(max(after - before, 0.0) / sessions, 2),
+            "state_kb_per_session": round(sum(s.state_bytes() for s in pool) / sessions / 1024, 1),
+            "steps": {k: v for k, v in steps.items() if v["reruns"]},
+            "errors": errors[:50],
+            "error_count": len(errors),
+        })
+    except Exception as e:
+        conn.send({"sessions": sessions, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_level(sessions: int, rounds: int, think: float, password: str, timeout: float, data_dir: Optional[str]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="illuminati-load-") as tmp:
+        ctx = multiprocessing.get_context("spawn")
+        parent, child = ctx.Pipe(duplex=False)
+        args = (sessions, rounds, think, password, timeout, data_dir or tmp, child)
+        proc = ctx.Process(target=_run_level, args=args)
+        proc.start()
+        child.close()
+        result = parent.recv()
+        proc.join()
+    return result
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sessions", default=DEFAULT_SESSIONS, help="comma list of concurrent session counts")
+    p.add_argument("--rounds", type=int, default=2, help="workflow rounds per session after login")
+    p.add_argument("--think", type=float, default=0.0, help="mean pause in seconds between steps")
+    p.add_argument("--password", default=os.environ.get("ILLUMINATI_ADMIN_PASSWORD", DEFAULT_PASSWORD))
+    p.add_argument("--timeout", type=float, default=120.0, help="seconds allowed for one rerun")
+    p.add_argument("--data-dir", help="data directory to run against (default: a fresh temporary one)")
+    p.add_argument("--p95-budget", type=float, help="fail when a level's p95 rerun latency exceeds this (ms)")
+    p.add_argument("--verbose", action="store_true", help="print per-step percentiles")
+    p.add_argument("--output", help="also write results to a JSON file")
+    args = p.parse_args(argv)
+
+    try:
+        levels = [int(x) for x in args.sessions.split(",") if x.strip()]
+    except ValueError:
+        p.error("--sessions takes a comma list of integers")
+    if not levels or min(levels) < 1:
+        p.error("--sessions needs at least one count >= 1")
+
+    print(f"{'sessions':>8} {'reruns':>7} {'rerun/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'MB/sess':>8} {'errors':>6}")
+    results = []
+    failed = False
+    for n in levels:
+        res = run_level(n, args.rounds, args.think, args.password, args.timeout, args.data_dir)
+        results.append(res)
+        if "error" in res:
+            print(f"{n:>8} ERROR {res['error']}")
+            failed = True
+            continue
+        print(
+            f"{n:>8} {res['reruns']:>7} {res['reruns_per_s']:>8.1f} {res['p50_ms']:>8.1f} {res['p95_ms']:>8.1f} "
+            f"{res['p99_ms']:>8.1f} {res['max_ms']:>8.1f} {res['rss_per_session_mb']:>8.2f} {res['error_count']:>6}"
+        )
+        if args.verbose:
+            for step, s in res["steps"].items():
+                print(f"{'':>8}   {step:<12} {s['reruns']:>5} reruns  p50 {s['p50_ms']:>7.1f}  p95 {s['p95_ms']:>7.1f}  p99 {s['p99_ms']:>7.1f}")
+        for msg in res["errors"][:5]:
+            print(f"{'':>8}   ERROR {msg}")
+        if res["error_count"]:
+            failed = True
+        if args.p95_budget is not None and res["p95_ms"] > args.p95_budget:
+            print(f"{'':>8}   OVER BUDGET p95 {res['p95_ms']:.1f} ms > {args.p95_budget:.1f} ms")
+            failed = True
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.datetime.utcnow().isoformat()[:19],
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "rounds": args.rounds,
+                    "think": args.think,
+                },
+                "results": results,
+            }, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
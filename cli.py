@@ -0,0 +1,243 @@
+"""Headless entry point for batch jobs: generate, score and export without the UI.
+
+    python cli.py generate --briefs briefs.csv --all-masters --workers 4 --out variants.csv
+    python cli.py score ads.jsonl --workers 8 --out scored.csv
+    python cli.py export variants.csv --format zip --out bundle.zip
+    python cli.py archive-export history --out history.parquet
+    python cli.py archive-import history.parquet --site Craigslist --since 2025-01-01
+    python cli.py ingest-events clicks.csv --alias "fb=Facebook Marketplace"
+    python cli.py startup --budget-ms 300
+
+Only the standard library and the pure modules are imported, so startup
+stays fast enough for cron jobs and worker processes; the archive and
+ingest commands load pyarrow and the store when they run.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from exports import EXPORT_FORMATS, iter_export, write_bundle
+from scoring import iter_scored_records
+from variants import BRIEF_FIELDS, MASTER_STYLES, iter_bulk_variants, read_briefs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORE_MODULES = ["scoring", "variants", "exports", "parallel"]
+HEAVY_MODULES = ["pandas", "streamlit"]
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream dict records from a CSV, JSONL/NDJSON or JSON-array file ("-" = stdin)."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        name = path.lower()
+        if name.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif name.endswith(".json"):
+            yield from json.load(f)
+        else:
+            yield from csv.DictReader(f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _open_out(path: str):
+    return sys.stdout.buffer if path == "-" else open(path, "wb")
+
+
+def _format_for(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"markdown": "md", "htm": "html", "ndjson": "jsonl"}.get(ext, ext) if ext else "csv"
+
+
+def _write_rows(rows: Iterable[Dict[str, Any]], out_path: str, fmt: str, columns: Optional[List[str]] = None) -> int:
+    count = 0
+
+    def counted():
+        nonlocal count
+        for r in rows:
+            count += 1
+            yield r
+
+    if fmt == "zip":
+        if out_path == "-":
+            raise SystemExit("zip output needs --out FILE")
+        write_bundle(list(counted()), out_path)
+        return count
+    out = _open_out(out_path)
+    try:
+        if fmt == "jsonl":
+            for r in counted():
+                out.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+        else:
+            for chunk in iter_export(counted(), fmt, columns):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return count
+
+
+def cmd_generate(args: argparse.Namespace) -> int:
+    if args.briefs:
+        with open(args.briefs, "rb") as f:
+            briefs, skipped = read_briefs(f.read())
+        if skipped:
+            print(f"skipped {skipped} briefs without product/benefit", file=sys.stderr)
+    elif args.product and args.benefit:
+        briefs = [{"product": args.product, "benefit": args.benefit, "audience": args.audience, "body_extra": args.body_extra}]
+    else:
+        raise SystemExit("generate needs --briefs FILE or --product and --benefit")
+    masters = list(MASTER_STYLES) if args.all_masters else (args.master or ["Gary Halbert"])
+    unknown = [m for m in masters if m not in MASTER_STYLES]
+    if unknown:
+        raise SystemExit(f"unknown master style(s): {', '.join(unknown)}")
+    rows = iter_bulk_variants(briefs, masters, workers=args.workers)
+    return _write_rows(rows, args.out, _format_for(args.out, args.format))
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+    rows = iter_scored_records(read_records(args.input), workers=args.workers)
+    return _write_rows(rows, args.out, _format_for(args.out, args.format))
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    fmt = _format_for(args.out, args.format)
+    return _write_rows(read_records(args.input), args.out, fmt)
+
+
+def cmd_archive_export(args: argparse.Namespace) -> int:
+    from archive import write_archive
+    from store import PostingStore
+    fmt = args.format or ("arrow" if args.out.lower().endswith((".arrow", ".feather")) else "parquet")
+    return write_archive(PostingStore(), args.table, args.out, fmt)
+
+
+def cmd_archive_import(args: argparse.Namespace) -> int:
+    from archive import filter_archive, import_archive, open_archive
+    from store import PostingStore
+    table, data = open_archive(args.input)
+    result = import_archive(PostingStore(), table, filter_archive(data, args.site, args.since, args.until))
+    print(json.dumps({"table": table, **result}), file=sys.stderr)
+    return result["inserted"]
+
+
+def cmd_ingest_events(args: argparse.Namespace) -> int:
+    from directory import read_sites
+    from ingest import ingest_events
+    from store import PostingStore
+    with open(args.sites, "rb") as f:
+        directory, _ = read_sites(f)
+    aliases = dict(a.split("=", 1) for a in args.alias or [] if "=" in a)
+    source = sys.stdin.buffer if args.input == "-" else args.input
+    result = ingest_events(PostingStore(), source, directory, fmt=args.format, grain=args.grain, aliases=aliases)
+    print(json.dumps(result), file=sys.stderr)
+    return result["ingested"]
+
+
+def measure_startup() -> Dict[str, Any]:
+    """Import the core modules in a fresh interpreter and time it."""
+    probe = (
+        "import sys, time; t = time.perf_counter(); "
+        f"import {', '.join(CORE_MODULES)}; "
+        "ms = (time.perf_counter() - t) * 1000; "
+        f"print(ms, *[m in sys.modules for m in {HEAVY_MODULES!r}])"
+    )
+    t = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", probe], cwd=HERE, capture_output=True, text=True, check=True).stdout.split()
+    wall = (time.perf_counter() - t) * 1000
+    return {
+        "import_ms": round(float(out[0]), 1),
+        "process_ms": round(wall, 1),
+        "heavy_modules_loaded": [m for m, flag in zip(HEAVY_MODULES, out[1:]) if flag == "True"],
+    }
+
+
+def cmd_startup(args: argparse.Namespace) -> int:
+    result = measure_startup()
+    print(json.dumps(result, indent=2))
+    if result["heavy_modules_loaded"] or result["import_ms"] > args.budget_ms:
+        print(f"startup budget exceeded ({args.budget_ms} ms, no {'/'.join(HEAVY_MODULES)})", file=sys.stderr)
+        raise SystemExit(1)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="cli.py", description="Illuminati AI classified ad tools (headless).")
+    sub = p.add_subparsers(dest="command", required=True)
+    fmts = ["csv", "jsonl", "md", "html", "zip"]
+
+    g = sub.add_parser("generate", help="generate variants for one brief or a CSV of briefs")
+    g.add_argument("--briefs", help=f"CSV with columns {', '.join(BRIEF_FIELDS)}")
+    g.add_argument("--product")
+    g.add_argument("--benefit")
+    g.add_argument("--audience", default="")
+    g.add_argument("--body-extra", default="")
+    g.add_argument("--master", action="append", help="master style (repeatable)")
+    g.add_argument("--all-masters", action="store_true", help="expand across every master style")
+    g.add_argument("--workers", type=int, default=1, help="processes used to expand briefs")
+    g.add_argument("--format", choices=fmts)
+    g.add_argument("--out", default="-", help="output file (default stdout)")
+    g.set_defaults(func=cmd_generate)
+
+    s = sub.add_parser("score", help="score ads in a CSV/JSONL file")
+    s.add_argument("input", help="CSV/JSONL/JSON with a 'text' column or 'headline'/'body'")
+    s.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    s.add_argument("--format", choices=["csv", "jsonl"])
+    s.add_argument("--out", default="-")
+    s.set_defaults(func=cmd_score)
+
+    e = sub.add_parser("export", help="convert a variants file to CSV/Markdown/HTML/zip")
+    e.add_argument("input")
+    e.add_argument("--format", choices=[f for f in fmts if f == "jsonl" or f in EXPORT_FORMATS])
+    e.add_argument("--out", default="-")
+    e.set_defaults(func=cmd_export)
+
+    ae = sub.add_parser("archive-export", help="write the posting history or campaign snapshots to Parquet/Arrow")
+    ae.add_argument("table", choices=["history", "campaign"])
+    ae.add_argument("--format", choices=["parquet", "arrow"], help="default: from the file extension, else parquet")
+    ae.add_argument("--out", required=True)
+    ae.set_defaults(func=cmd_archive_export)
+
+    ai = sub.add_parser("archive-import", help="merge a Parquet/Arrow archive into the store, skipping stored rows")
+    ai.add_argument("input", help="archive file (memory-mapped)")
+    ai.add_argument("--site", action="append", help="only rows for this site (repeatable)")
+    ai.add_argument("--since", help="ISO date/time, inclusive")
+    ai.add_argument("--until", help="ISO date/time, exclusive")
+    ai.set_defaults(func=cmd_archive_import)
+
+    ie = sub.add_parser("ingest-events", help="sum a tracker event export into campaign snapshots, skipping known event ids")
+    ie.add_argument("input", help="CSV or JSONL events file (\"-\" = stdin)")
+    ie.add_argument("--sites", default=os.path.join(HERE, "sites.json"), help="directory the site values are matched against")
+    ie.add_argument("--alias", action="append", help="TRACKER_VALUE=Site name (repeatable)")
+    ie.add_argument("--grain", choices=["day", "hour"], default="day", help="one snapshot per site and day or hour")
+    ie.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension or first byte")
+    ie.set_defaults(func=cmd_ingest_events)
+
+    st = sub.add_parser("startup", help="measure import time of the core modules")
+    st.add_argument("--budget-ms", type=float, default=300.0)
+    st.set_defaults(func=cmd_startup)
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    t = time.perf_counter()
+    n = args.func(args)
+    if args.command != "startup":
+        print(f"{args.command}: {n:,} rows in {time.perf_counter() - t:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Per-site copy rules: every variant checked against every site's limits in one vectorized pass."""
+import re
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Violation bits, in the order they are reported.
+HEADLINE, BODY, BANNED, LINK, PHONE = 1, 2, 4, 8, 16
+VIOLATIONS: Dict[int, str] = {
+    HEADLINE: "headline too long",
+    BODY: "body too long",
+    BANNED: "banned word",
+    LINK: "link",
+    PHONE: "phone number",
+}
+# One-letter codes for grid cells.
+CODES: Dict[int, str] = {HEADLINE: "H", BODY: "B", BANNED: "W", LINK: "L", PHONE: "P"}
+ELLIPSIS = "…"
+
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+_LINK = re.compile(
+    r"https?://|\bwww\.|\b[a-z0-9-]+\.(?:com|net|org|io|co|us|info|biz|me|ly|gg|app|shop|site|online)\b",
+    re.IGNORECASE
+)
+_PHONE = re.compile(r"(?<![\w+])(?:\+?\d{1,3}[\s.-]?)?(?:\(\d{3}\)|\d{3})[\s.-]?\d{3}[\s.-]?\d{4}(?!\w)")
+
+
+def _phrase(text: str) -> str:
+    # Words lowercased and single-spaced, padded so " phrase " only matches whole words.
+    return " " + " ".join(_WORD.findall(text.lower())) + " "
+
+
+def _key(rules: Optional[Dict[str, Any]]) -> Tuple:
+    r = rules or {}
+    return (
+        r.get("max_headline") or 0,
+        r.get("max_body") or 0,
+        tuple(r.get("banned_words") or ()),
+        r.get("allow_links", True),
+        r.get("allow_phone", True),
+    )
+
+
+class RuleBook:
+    """Copy rules of a list of sites, compiled into arrays once.
+
+    Sites sharing identical rules share one compiled rule set, so the work
+    per check grows with the number of distinct rule sets, not sites. Each
+    ad is read once into features (lengths, link and phone flags, and which
+    of the book's banned words it contains); the ads x rule sets verdict is
+    then a few array comparisons and one boolean matrix product, widened to
+    ads x sites by indexing.
+    """
+
+    def __init__(self, sites: Sequence[str], rules: Sequence[Optional[Dict[str, Any]]]):
+        self.sites = list(sites)
+        keys: Dict[Tuple, int] = {}
+        self.site_set = np.array([keys.setdefault(_key(r), len(keys)) for r in rules], dtype=np.int64)
+        sets = list(keys)
+        self.ruled = np.array([any(k[:3]) or not k[3] or not k[4] for k in sets], dtype=bool)
+        self.max_headline = np.array([k[0] or np.inf for k in sets], dtype=np.float64)
+        self.max_body = np.array([k[1] or np.inf for k in sets], dtype=np.float64)
+        self.no_links = np.array([not k[3] for k in sets], dtype=bool)
+        self.no_phone = np.array([not k[4] for k in sets], dtype=bool)
+        self.words: List[str] = sorted({w for k in sets for w in k[2]})
+        self._word_index = {w: j for j, w in enumerate(self.words)}
+        # Single words are looked up in an ad's word set; phrases by substring.
+        self._phrases = [(j, f" {w} ") for j, w in enumerate(self.words) if " " in w]
+        self.banned = np.zeros((len(sets), len(self.words)), dtype=np.uint8)
+        for s, k in enumerate(sets):
+            for w in k[2]:
+                self.banned[s, self._word_index[w]] = 1
+        self._features: Dict[Tuple[str, str], Tuple[int, int, bool, bool, List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.sites)
+
+    @property
+    def ruled_sites(self) -> np.ndarray:
+        """Positions of the sites that set at least one rule."""
+        return np.flatnonzero(self.ruled[self.site_set])
+
+    def _read(self, headline: str, body: str) -> Tuple[int, int, bool, bool, List[int]]:
+        text = f"{headline}\n{body}"
+        hits = []
+        if self.words:
+            tokens = set(_WORD.findall(text.lower()))
+            hits = [self._word_index[t] for t in tokens if t in self._word_index]
+            if self._phrases:
+                flat = _phrase(text)
+                hits += [j for j, p in self._phrases if p in flat]
+        return (
+            len(headline),
+            len(body),
+            _LINK.search(text) is not None,
+            _PHONE.search(text) is not None,
+            hits,
+        )
+
+    def features(self, ads: Sequence[Dict[str, str]]) -> Tuple[np.ndarray, ...]:
+        """(headline length, body length, has link, has phone, banned word hits) arrays for ``ads``."""
+        n = len(ads)
+        hl = np.empty(n, dtype=np.float64)
+        bl = np.empty(n, dtype=np.float64)
+        link = np.empty(n, dtype=bool)
+        phone = np.empty(n, dtype=bool)
+        hits = np.zeros((n, len(self.words)), dtype=np.uint8)
+        memo = self._features
+        for i, ad in enumerate(ads):
+            key = (str(ad.get("headline", "")), str(ad.get("body", "")))
+            f = memo.get(key)
+            if f is None:
+                f = memo[key] = self._read(*key)
+            hl[i], bl[i], link[i], phone[i] = f[:4]
+            if f[4]:
+                hits[i, f[4]] = 1
+        return hl, bl, link, phone, hits
+
+    def check(self, ads: Sequence[Dict[str, str]]) -> np.ndarray:
+        """(ads, sites) array of violation bits; 0 means the ad may be posted there as written."""
+        if not len(ads) or not len(self.sites):
+            return np.zeros((len(ads), len(self.sites)), dtype=np.uint8)
+        hl, bl, link, phone, hits = self.features(ads)
+        per_set = (hl[:, None] > self.max_headline[None, :]) * np.uint8(HEADLINE)
+        per_set |= (bl[:, None] > self.max_body[None, :]) * np.uint8(BODY)
+        if self.words:
+            per_set |= (hits @ self.banned.T.astype(np.int32) > 0) * np.uint8(BANNED)
+        per_set |= (link[:, None] & self.no_links[None, :]) * np.uint8(LINK)
+        per_set |= (phone[:, None] & self.no_phone[None, :]) * np.uint8(PHONE)
+        return per_set.astype(np.uint8)[:, self.site_set]
+
+    def headline_limit(self, sites: Optional[Sequence[int]] = None) -> Optional[int]:
+        """The strictest headline limit among ``sites`` (positions; default all), or None."""
+        sets = self.site_set if sites is None else self.site_set[np.asarray(sites, dtype=np.int64)]
+        limit = self.max_headline[sets].min() if len(sets) else np.inf
+        return None if np.isinf(limit) else int(limit)
+
+
+def describe(bits: int) -> List[str]:
+    return [label for bit, label in VIOLATIONS.items() if bits & bit]
+
+
+def cell_labels(grid: np.ndarray) -> np.ndarray:
+    """Grid of violation bits as display strings: "✅", or "❌" with the codes of what failed."""
+    table = np.array(
+        ["✅"] + ["❌ " + "".join(c for bit, c in CODES.items() if b & bit) for b in range(1, 32)],
+        dtype=object
+    )
+    return table[grid]
+
+
+def fit_headline(headline: str, limit: Optional[int]) -> str:
+    """Shorten ``headline`` to at most ``limit`` characters, cutting at a word where possible."""
+    if limit is None or len(headline) <= limit:
+        return headline
+    if limit <= len(ELLIPSIS):
+        return headline[:limit]
+    room = limit - len(ELLIPSIS)
+    cut = headline[:room + 1]
+    space = cut.rfind(" ")
+    # Keep at least half the room; a single very long word is cut mid-word instead.
+    cut = cut[:space] if space >= room // 2 else cut[:room]
+    return cut.rstrip(" ,;:-–—!.?") + ELLIPSIS
+
+
+def fit_variants(ads: Sequence[Dict[str, str]], limit: Optional[int]) -> Tuple[List[Dict[str, str]], int]:
+    """Copies of ``ads`` with headlines fitted to ``limit``, and how many changed."""
+    out, changed = [], 0
+    for ad in ads:
+        headline = fit_headline(ad.get("headline", ""), limit)
+        if headline != ad.get("headline", ""):
+            ad = {**ad, "headline": headline}
+            changed += 1
+        out.append(ad)
+    return out, changed
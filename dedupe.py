@@ -0,0 +1,224 @@
+"""Near-duplicate ad detection: MinHash signatures over word shingles plus an LSH band index."""
+import re
+import threading
+import zlib
+from typing import List, Any, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from parallel import chunked
+
+SHINGLE = 3
+NUM_PERM = 40
+BANDS = 10
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard similarity of word 3-shingles above which copy counts as a repeat.
+DEFAULT_THRESHOLD = 0.7
+# Rows appended since the last rebuild are scanned directly until there are this many.
+MERGE_TAIL = 4096
+
+_TOKEN_RE = re.compile(r"\w+")
+_MASK32 = np.uint64(0xFFFFFFFF)
+_seed = np.random.default_rng(20240611)
+# Multiply-shift hash family: the high 32 bits of (a * x + b) mod 2**64, a odd.
+_A = _seed.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _seed.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _seed.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+_EMPTY = np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+
+
+def ad_copy(ad: dict) -> str:
+    return f"{ad.get('headline') or ''}\n{ad.get('body') or ''}".strip()
+
+
+def _shingles(texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns the shingle hashes of all texts back to back, plus each text's count.
+    # Tokens are hashed once; neighbouring token hashes are then mixed into
+    # shingle hashes in one vectorized pass. Texts shorter than a shingle use
+    # their tokens as features.
+    tokens = [_TOKEN_RE.findall((t or "").lower()) for t in texts]
+    lens = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    flat = np.fromiter(
+        (zlib.crc32(w.encode("utf-8")) for t in tokens for w in t),
+        dtype=np.uint64,
+        count=int(lens.sum()),
+    )
+    mixed = np.concatenate((flat, np.zeros(SHINGLE - 1, dtype=np.uint64)))
+    h = mixed[:len(flat)].copy()
+    for k in range(1, SHINGLE):
+        h = (h * np.uint64(0x9E3779B1) ^ mixed[k:k + len(flat)]) & _MASK32
+    long = lens > SHINGLE
+    counts = np.where(long, lens - SHINGLE + 1, lens)
+    starts = np.cumsum(lens) - lens
+    firsts = np.cumsum(counts) - counts
+    pos = np.repeat(starts - firsts, counts) + np.arange(int(counts.sum()))
+    return np.where(np.repeat(long, counts), h[pos], flat[pos]), counts
+
+
+def signatures(texts: Iterable[str], batch: int = 500) -> np.ndarray:
+    """MinHash signatures, one uint32 row of ``NUM_PERM`` values per text.
+
+    Texts are processed ``batch`` at a time, so memory stays flat for large
+    streams. Texts without any words get a sentinel row; ``is_empty`` detects it.
+    """
+    parts = []
+    for texts_part in chunked(texts, batch):
+        feats, counts = _shingles(texts_part)
+        out = np.tile(_EMPTY, (len(counts), 1))
+        rows = np.nonzero(counts)[0]
+        if len(rows):
+            hashed = ((feats[:, None] * _A + _B) >> np.uint64(32)).astype(np.uint32)
+            out[rows] = np.minimum.reduceat(hashed, (np.cumsum(counts) - counts)[rows], axis=0)
+        parts.append(out)
+    return np.concatenate(parts) if parts else np.empty((0, NUM_PERM), dtype=np.uint32)
+
+
+def signature(text: str) -> np.ndarray:
+    return signatures([text])[0]
+
+
+def is_empty(sig: np.ndarray) -> bool:
+    return bool((sig == _EMPTY).all())
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two texts' shingle sets."""
+    return float((a == b).mean())
+
+
+def _band_keys(sigs: np.ndarray) -> np.ndarray:
+    # (n, NUM_PERM) -> (n, BANDS): each band of ROWS values folded into one uint64.
+    bands = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    return (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+
+class NearDupIndex:
+    """LSH index over MinHash signatures for sub-millisecond near-duplicate lookups.
+
+    Signatures are split into ``BANDS`` bands; two texts become candidates
+    when any band matches exactly, and candidates are confirmed by comparing
+    full signatures. Band keys live in per-band sorted arrays searched with
+    ``np.searchsorted``; newly added rows sit in a short tail that is scanned
+    directly and merged once it passes ``MERGE_TAIL`` rows, so memory stays a
+    few hundred bytes per entry however many ads are indexed.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.keys: List[Any] = []
+        self.sites: List[str] = []
+        self.last_id = 0
+        self._sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._bands = np.empty((0, BANDS), dtype=np.uint64)
+        self._sorted: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._sorted_n = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _grow(self, extra: int) -> None:
+        n = len(self.keys)
+        if n + extra <= len(self._sigs):
+            return
+        cap = max(1024, n + extra, len(self._sigs) * 2)
+        sigs = np.empty((cap, NUM_PERM), dtype=np.uint32)
+        bands = np.empty((cap, BANDS), dtype=np.uint64)
+        sigs[:n] = self._sigs[:n]
+        bands[:n] = self._bands[:n]
+        self._sigs, self._bands = sigs, bands
+
+    def _merge(self) -> None:
+        n = len(self.keys)
+        self._sorted = []
+        for j in range(BANDS):
+            order = np.argsort(self._bands[:n, j], kind="stable").astype(np.int32)
+            self._sorted.append((self._bands[:n, j][order], order))
+        self._sorted_n = n
+
+    def add_many(self, keys: Sequence[Any], sigs: np.ndarray, sites: Optional[Sequence[str]] = None) -> None:
+        """Index signature rows under the caller's keys; empty texts are skipped."""
+        keep = ~(sigs == _EMPTY).all(axis=1)
+        if not keep.all():
+            keys = [k for k, ok in zip(keys, keep) if ok]
+            sites = None if sites is None else [s for s, ok in zip(sites, keep) if ok]
+            sigs = sigs[keep]
+        if not len(keys):
+            return
+        with self._lock:
+            n = len(self.keys)
+            self._grow(len(keys))
+            self._sigs[n:n + len(keys)] = sigs
+            self._bands[n:n + len(keys)] = _band_keys(sigs)
+            self.keys.extend(keys)
+            self.sites.extend(sites if sites is not None else [""] * len(keys))
+            if len(self.keys) - self._sorted_n > MERGE_TAIL:
+                self._merge()
+
+    def add(self, key: Any, text: str, site: str = "") -> None:
+        self.add_many([key], signatures([text]), [site])
+
+    def query_signature(
+        self,
+        sig: np.ndarray,
+        site: Optional[str] = None,
+        threshold: Optional[float] = None,
+        limit: int = 20,
+    ) -> List[Tuple[Any, float]]:
+        """(key, similarity) of indexed texts at or above ``threshold``, most similar first."""
+        if is_empty(sig):
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        bk = _band_keys(sig[None, :])[0]
+        with self._lock:
+            cand = set()
+            for j, (keys, order) in enumerate(self._sorted):
+                lo, hi = np.searchsorted(keys, bk[j], "left"), np.searchsorted(keys, bk[j], "right")
+                if hi > lo:
+                    cand.update(order[lo:hi].tolist())
+            n = len(self.keys)
+            if n > self._sorted_n:
+                hits = np.nonzero((self._bands[self._sorted_n:n] == bk).any(axis=1))[0]
+                cand.update((hits + self._sorted_n).tolist())
+            if site is not None:
+                cand = {i for i in cand if self.sites[i] == site}
+            if not cand:
+                return []
+            ids = np.fromiter(cand, dtype=np.int64, count=len(cand))
+            sims = (self._sigs[ids] == sig).mean(axis=1)
+            keep = sims >= threshold
+            ids, sims = ids[keep], sims[keep]
+            top = np.argsort(-sims, kind="stable")[:limit]
+            return [(self.keys[ids[i]], round(float(sims[i]), 3)) for i in top]
+
+    def query(self, text: str, site: Optional[str] = None, threshold: Optional[float] = None, limit: int = 20) -> List[Tuple[Any, float]]:
+        return self.query_signature(signature(text), site, threshold, limit)
+
+    def sync(self, store: Any, table: str = "history", batch: int = 2000) -> int:
+        """Index rows the store gained since the last sync; returns how many were read.
+
+        Keys are the rows' ids, so matches can be looked up with ``store.get_many``.
+        """
+        read = 0
+        with self._lock:
+            for rows in store.iter_rows(table, batch=batch, after=self.last_id, with_id=True):
+                self.add_many(
+                    [r["id"] for r in rows],
+                    signatures(ad_copy(r) for r in rows),
+                    [r["site"] for r in rows],
+                )
+                self.last_id = rows[-1]["id"]
+                read += len(rows)
+        return read
+
+
+def duplicate_groups(texts: Sequence[str], threshold: float = DEFAULT_THRESHOLD) -> List[Optional[Tuple[int, float]]]:
+    """For each text, the earliest earlier text it nearly duplicates as (index, similarity), else None."""
+    index = NearDupIndex(threshold)
+    sigs = signatures(texts)
+    out: List[Optional[Tuple[int, float]]] = []
+    for i, sig in enumerate(sigs):
+        hits = index.query_signature(sig, limit=len(texts))
+        out.append(min(hits) if hits else None)
+        index.add_many([i], sig[None, :])
+    return out
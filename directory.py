@@ -0,0 +1,621 @@
+"""Indexed site directory backing the Posting Hub filters and search, plus a streaming sites.json reader."""
+import codecs
+import json
+import sys
+from array import array
+from typing import List, Dict, Any, IO, Iterable, Iterator, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+SITE_FIELDS = ["name", "region", "category", "needs_account", "url", "notes"]
+REQUIRED_FIELDS = ["name", "region", "category", "needs_account", "url"]
+# Optional per-site copy rules (an entry's "rules" object): field -> expected type.
+RULE_FIELDS: Dict[str, type] = {
+    "max_headline": int,
+    "max_body": int,
+    "banned_words": list,
+    "allow_links": bool,
+    "allow_phone": bool,
+}
+# Problems beyond this many are counted but not itemized.
+MAX_REPORTED = 200
+# A single entry larger than this is treated as malformed rather than buffered further.
+MAX_ITEM_CHARS = 1 << 20
+
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0", ""}
+_NO_POSTINGS = array("i")
+
+
+def _trigrams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def normalize_url(url: str) -> str:
+    """Key used to spot the same site twice: scheme, "www.", default port, case of the host and trailing "/" are ignored."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    return f"{host}{path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def validate_rules(raw: Any) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Return (clean rules, "") or (None, reason) for a site's "rules" object.
+
+    Limits are character counts (0 or null means none), banned words are
+    matched case-insensitively as whole words or phrases, and links or
+    phone numbers are allowed unless set to false. Unset fields are dropped.
+    """
+    if not isinstance(raw, dict):
+        return None, "rules must be an object"
+    unknown = [k for k in raw if k not in RULE_FIELDS]
+    if unknown:
+        return None, f"unknown rules field {', '.join(map(str, unknown))}"
+    rules: Dict[str, Any] = {}
+    for f in ("max_headline", "max_body"):
+        v = raw.get(f)
+        if v is None or v == 0:
+            continue
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0 or not float(v).is_integer():
+            return None, f"rules.{f} must be a whole number of characters"
+        rules[f] = int(v)
+    words = raw.get("banned_words")
+    if isinstance(words, str):
+        words = words.split(",")
+    if words is not None:
+        if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+            return None, "rules.banned_words must be a list of strings"
+        words = sorted({" ".join(w.lower().split()) for w in words} - {""})
+        if words:
+            rules["banned_words"] = words
+    for f in ("allow_links", "allow_phone"):
+        v = raw.get(f)
+        if isinstance(v, str) and v.strip().lower() in _TRUE | _FALSE:
+            v = v.strip().lower() in _TRUE
+        if v is None or v is True:
+            continue
+        if v is not False:
+            return None, f"rules.{f} must be true or false"
+        rules[f] = False
+    return rules, ""
+
+
+def validate_site(raw: Any) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Return (clean record, "") or (None, reason) for one sites.json entry."""
+    if not isinstance(raw, dict):
+        return None, "not an object"
+    missing = [f for f in REQUIRED_FIELDS if f not in raw]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    rec: Dict[str, Any] = {}
+    for f in ("name", "region", "category", "url"):
+        v = raw[f]
+        if not isinstance(v, str) or not v.strip():
+            return None, f"{f} must be a non-empty string"
+        rec[f] = v.strip()
+    needs = raw["needs_account"]
+    if isinstance(needs, str) and needs.strip().lower() in _TRUE | _FALSE:
+        needs = needs.strip().lower() in _TRUE
+    elif isinstance(needs, (int, float)) and not isinstance(needs, bool) and needs in (0, 1):
+        needs = bool(needs)
+    if not isinstance(needs, bool):
+        return None, "needs_account must be true or false"
+    rec["needs_account"] = needs
+    try:
+        parts = urlsplit(rec["url"])
+        ok = parts.scheme in ("http", "https") and bool(parts.hostname)
+    except ValueError:
+        ok = False
+    if not ok:
+        return None, f"url is not an http(s) URL: {rec['url'][:80]}"
+    notes = raw.get("notes", "")
+    rec["notes"] = "" if notes is None else str(notes)
+    if raw.get("rules") is not None:
+        rules, err = validate_rules(raw["rules"])
+        if rules is None:
+            return None, err
+        if rules:
+            rec["rules"] = rules
+    return rec, ""
+
+
+def iter_json_objects(stream: IO[Any], chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield the items of a JSON array one at a time without loading the whole file.
+
+    Also accepts newline-delimited objects and an array missing its
+    brackets. Raises ValueError at the first malformed item.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof, started = "", 0, False, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        data = stream.read(chunk_size)
+        while isinstance(data, bytes):
+            raw = data
+            data = utf8.decode(raw, final=not raw)
+            if not data and raw:
+                # Only part of a multi-byte character (or the BOM) so far.
+                data = stream.read(chunk_size)
+        if not data:
+            eof = True
+            return False
+        buf = buf[pos:] + data
+        pos = 0
+        return True
+
+    n = 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof or not fill():
+                return
+            continue
+        ch = buf[pos]
+        if not started and ch == "[":
+            started = True
+            pos += 1
+            continue
+        if ch == "]":
+            return
+        started = True
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if not eof and len(buf) - pos < MAX_ITEM_CHARS and fill():
+                continue
+            raise ValueError(f"malformed JSON in item {n + 1}: {e.msg}") from None
+        if end == len(buf) and not eof and fill():
+            # A value ending exactly at the buffer edge (e.g. a number) may be cut short.
+            continue
+        pos = end
+        n += 1
+        yield item
+
+
+def read_sites(stream: IO[Any]) -> Tuple["SiteDirectory", List[str]]:
+    """Stream a sites.json into a new directory; returns it with a list of problems.
+
+    Invalid entries and entries whose normalized URL was already seen are
+    skipped and reported by item number. Parsing stops at the first
+    malformed JSON item, keeping what was read so far.
+    """
+    directory = SiteDirectory()
+    problems: List[str] = []
+    skipped = 0
+
+    def report(msg: str) -> None:
+        nonlocal skipped
+        skipped += 1
+        if len(problems) < MAX_REPORTED:
+            problems.append(msg)
+
+    n = 0
+    try:
+        for n, raw in enumerate(iter_json_objects(stream), start=1):
+            rec, err = validate_site(raw)
+            if rec is None:
+                report(f"item {n}: {err}")
+                continue
+            dup = directory.find_url(rec["url"])
+            if dup is not None:
+                report(f"item {n}: duplicate of {directory.name(dup)!r} ({rec['url']})")
+                continue
+            directory.add(rec)
+    except ValueError as e:
+        report(str(e))
+    if skipped > len(problems):
+        problems.append(f"... and {skipped - len(problems)} more")
+    return directory, problems
+
+
+class _Pool:
+    """Interns a low-cardinality string column as small integer codes."""
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values: List[str] = [""]
+        self.codes: Dict[str, int] = {"": 0}
+
+    def code(self, value: str) -> int:
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+
+class SiteDirectory:
+    """Site records stored column-wise, plus inverted indexes on region, category and name trigrams.
+
+    Names, URLs and notes are plain string lists; region and category are
+    interned into ``array('H')`` codes and ``needs_account`` is a bytearray,
+    so a site costs a few small slots instead of a dict. Records are
+    addressed by position; each index maps a key to the positions holding
+    it, so filters are set intersections instead of list scans. Trigram
+    postings are append-only ``array('i')`` runs, already sorted because
+    positions only grow. Records come back as fresh dicts (``record``,
+    iteration, ``records``); fields outside ``SITE_FIELDS`` are not kept,
+    except ``rules``, held only for the few sites that set any.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = ()):
+        self._names: List[str] = []
+        self._urls: List[str] = []
+        self._notes: List[str] = []
+        self._needs = bytearray()
+        self._rules: Dict[int, Dict[str, Any]] = {}
+        self._regions = array("H")
+        self._categories = array("H")
+        self._region_pool = _Pool()
+        self._category_pool = _Pool()
+        self._lower_names: List[str] = []
+        self._by_name: Dict[str, int] = {}
+        self._by_url: Dict[str, int] = {}
+        self._by_region: Dict[str, Set[int]] = {}
+        self._by_category: Dict[str, Set[int]] = {}
+        self._by_trigram: Dict[str, array] = {}
+        self._option_cache: Dict[str, List[str]] = {}
+        self.version = 0
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __sizeof__(self) -> int:
+        size = object.__sizeof__(self) + sys.getsizeof(self.__dict__)
+        for values in (self._names, self._urls, self._notes, self._lower_names):
+            size += sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+        for pool in (self._region_pool, self._category_pool):
+            size += sys.getsizeof(pool.values) + sys.getsizeof(pool.codes) + sum(map(sys.getsizeof, pool.values))
+        for index in (self._by_region, self._by_category, self._by_trigram):
+            size += sys.getsizeof(index) + sum(map(sys.getsizeof, index.values()))
+        size += sum(map(sys.getsizeof, self._by_trigram))
+        for other in (self._needs, self._regions, self._categories, self._by_name, self._by_url, self._rules):
+            size += sys.getsizeof(other)
+        return size
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.record(i) for i in range(len(self._names)))
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def record(self, i: int) -> Dict[str, Any]:
+        rec = {
+            "name": self._names[i],
+            "region": self._region_pool.values[self._regions[i]],
+            "category": self._category_pool.values[self._categories[i]],
+            "needs_account": bool(self._needs[i]),
+            "url": self._urls[i],
+            "notes": self._notes[i],
+        }
+        rules = self._rules.get(i)
+        if rules is not None:
+            rec["rules"] = dict(rules)
+        return rec
+
+    def name(self, i: int) -> str:
+        return self._names[i]
+
+    def columns(self, ids: Optional[List[int]] = None) -> Dict[str, List[Any]]:
+        """Field -> values, for building a DataFrame without per-row dicts."""
+        rp, cp = self._region_pool.values, self._category_pool.values
+        if ids is None:
+            return {
+                "name": list(self._names),
+                "region": [rp[c] for c in self._regions],
+                "category": [cp[c] for c in self._categories],
+                "needs_account": [bool(b) for b in self._needs],
+                "url": list(self._urls),
+                "notes": list(self._notes),
+            }
+        return {
+            "name": [self._names[i] for i in ids],
+            "region": [rp[self._regions[i]] for i in ids],
+            "category": [cp[self._categories[i]] for i in ids],
+            "needs_account": [bool(self._needs[i]) for i in ids],
+            "url": [self._urls[i] for i in ids],
+            "notes": [self._notes[i] for i in ids],
+        }
+
+    def coded(self, field: str) -> Tuple[array, List[str]]:
+        """A "region" or "category" column as (per-site codes, value of each code)."""
+        if field == "region":
+            return self._regions, self._region_pool.values
+        if field == "category":
+            return self._categories, self._category_pool.values
+        raise ValueError(f"Not a coded field: {field}")
+
+    def rule(self, i: int) -> Optional[Dict[str, Any]]:
+        """The site's copy rules (shared, do not modify), or None if it sets none."""
+        return self._rules.get(i)
+
+    def rules(self, ids: Optional[List[int]] = None) -> List[Optional[Dict[str, Any]]]:
+        get = self._rules.get
+        return [get(i) for i in (range(len(self._names)) if ids is None else ids)]
+
+    def add(self, record: Dict[str, Any]) -> int:
+        i = len(self._names)
+        name = str(record.get("name") or "")
+        lower = name.lower()
+        region = str(record.get("region") or "")
+        category = str(record.get("category") or "")
+        url = str(record.get("url") or "")
+        self._names.append(name)
+        self._urls.append(url)
+        self._notes.append(str(record.get("notes") or ""))
+        self._needs.append(1 if record.get("needs_account") else 0)
+        if record.get("rules"):
+            self._rules[i] = dict(record["rules"])
+        self._regions.append(self._region_pool.code(region))
+        self._categories.append(self._category_pool.code(category))
+        self._lower_names.append(lower)
+        self._by_name.setdefault(name, i)
+        if url:
+            self._by_url.setdefault(normalize_url(url), i)
+        if region:
+            self._by_region.setdefault(region, set()).add(i)
+        if category:
+            self._by_category.setdefault(category, set()).add(i)
+        for g in _trigrams(lower):
+            postings = self._by_trigram.get(g)
+            if postings is None:
+                postings = self._by_trigram[g] = array("i")
+            postings.append(i)
+        self._option_cache.clear()
+        self.version += 1
+        return i
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        for r in records:
+            self.add(r)
+
+    def position(self, name: str) -> Optional[int]:
+        return self._by_name.get(name)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        i = self._by_name.get(name)
+        return None if i is None else self.record(i)
+
+    def find_url(self, url: str) -> Optional[int]:
+        """Position of the site with the same normalized URL, if any."""
+        return self._by_url.get(normalize_url(url))
+
+    def counts(self, field: str) -> Dict[str, int]:
+        """Number of sites per non-empty "region" or "category" value."""
+        if field == "region":
+            return {v: len(ids) for v, ids in self._by_region.items()}
+        if field == "category":
+            return {v: len(ids) for v, ids in self._by_category.items()}
+        raise ValueError(f"Not a coded field: {field}")
+
+    def regions(self) -> List[str]:
+        if "region" not in self._option_cache:
+            self._option_cache["region"] = sorted(self._by_region)
+        return self._option_cache["region"]
+
+    def categories(self) -> List[str]:
+        if "category" not in self._option_cache:
+            self._option_cache["category"] = sorted(self._by_category)
+        return self._option_cache["category"]
+
+    def names(self) -> List[str]:
+        return self._names
+
+    def urls(self) -> List[str]:
+        return self._urls
+
+    def _search(self, term: str, within: Optional[Set[int]]) -> Set[int]:
+        names = self._lower_names
+        if len(term) < 3:
+            pool = within if within is not None else range(len(names))
+            return {i for i in pool if term in names[i]}
+        postings = sorted((self._by_trigram.get(g, _NO_POSTINGS) for g in _trigrams(term)), key=len)
+        cand = set(postings[0])
+        if within is not None:
+            cand &= within
+        for p in postings[1:]:
+            # Once few candidates remain, confirming them directly beats walking long postings.
+            if len(cand) * 8 < len(p):
+                break
+            cand.intersection_update(p)
+        # Trigrams can co-occur without being contiguous; confirm the substring.
+        return {i for i in cand if term in names[i]}
+
+    def filter_ids(self, region: Optional[str] = None, category: Optional[str] = None, search: str = "") -> Optional[List[int]]:
+        """Sorted positions of matching records, or None when nothing is filtered out.
+
+        Region/category of "All" or None skip that filter; ``search`` is a
+        case-insensitive name substring.
+        """
+        term = search.lower().strip()
+        ids: Optional[Set[int]] = None
+        if region and region != "All":
+            ids = self._by_region.get(region, set())
+        if category and category != "All":
+            cat = self._by_category.get(category, set())
+            ids = cat if ids is None else ids & cat
+        if term:
+            ids = self._search(term, ids)
+        return None if ids is None else sorted(ids)
+
+    def filter(self, region: Optional[str] = None, category: Optional[str] = None, search: str = "") -> List[Dict[str, Any]]:
+        ids = self.filter_ids(region, category, search)
+        if ids is None:
+            return self.records
+        return [self.record(i) for i in ids]
+
+
+class DirectoryOverlay:
+    """One session's view of a shared, never-mutated SiteDirectory.
+
+    The session only holds what it changed: its own small directory of
+    added sites and the set of hidden positions. Positions below
+    ``len(base)`` address base sites and the rest address added ones, so
+    ``filter_ids`` results work with ``record`` and ``columns`` like those
+    of a plain SiteDirectory. ``key`` names the base (e.g. its file hash).
+    """
+    __slots__ = ("base", "key", "added", "removed", "version", "_options")
+
+    def __init__(self, base: SiteDirectory, key: str = ""):
+        self.base = base
+        self.key = key
+        self.added = SiteDirectory()
+        self.removed: Set[int] = set()
+        self.version = 0
+        self._options: Tuple[int, Dict[str, List[str]]] = (0, {})
+
+    def __sizeof__(self) -> int:
+        # The base is shared by every session, so only the overlay itself counts.
+        size = object.__sizeof__(self) + sys.getsizeof(self.removed) + sum(map(sys.getsizeof, self.removed))
+        return size + sys.getsizeof(self.added)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.added) - len(self.removed)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.record(i) for i in self.visible_ids())
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added) or bool(self.removed)
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def visible_ids(self) -> List[int]:
+        ids = range(len(self.base) + len(self.added))
+        return [i for i in ids if i not in self.removed] if self.removed else list(ids)
+
+    def split(self, ids: Iterable[int]) -> Tuple[List[int], List[int]]:
+        """Positions as (base positions, positions within ``added``)."""
+        nb = len(self.base)
+        base_ids, added_ids = [], []
+        for i in ids:
+            if i < nb:
+                base_ids.append(i)
+            else:
+                added_ids.append(i - nb)
+        return base_ids, added_ids
+
+    def record(self, i: int) -> Dict[str, Any]:
+        nb = len(self.base)
+        return self.base.record(i) if i < nb else self.added.record(i - nb)
+
+    def name(self, i: int) -> str:
+        nb = len(self.base)
+        return self.base.name(i) if i < nb else self.added.name(i - nb)
+
+    def columns(self, ids: Optional[List[int]] = None) -> Dict[str, List[Any]]:
+        base_ids, added_ids = self.split(self.visible_ids() if ids is None else ids)
+        cols = self.base.columns(base_ids)
+        for k, v in self.added.columns(added_ids).items():
+            cols[k].extend(v)
+        return cols
+
+    def rule(self, i: int) -> Optional[Dict[str, Any]]:
+        nb = len(self.base)
+        return self.base.rule(i) if i < nb else self.added.rule(i - nb)
+
+    def rules(self, ids: Optional[List[int]] = None) -> List[Optional[Dict[str, Any]]]:
+        return [self.rule(i) for i in (self.visible_ids() if ids is None else ids)]
+
+    def _column(self, base_values: List[str], added_values: List[str]) -> List[str]:
+        if not self.changed:
+            return base_values
+        if not self.removed:
+            return base_values + added_values
+        return [v for i, v in enumerate(base_values + added_values) if i not in self.removed]
+
+    def names(self) -> List[str]:
+        return self._column(self.base.names(), self.added.names())
+
+    def urls(self) -> List[str]:
+        return self._column(self.base.urls(), self.added.urls())
+
+    def _values(self, field: str) -> List[str]:
+        # Values still held by a visible site: the base's counts, less the
+        # removed base sites, plus the visible added ones; cached per version.
+        version, options = self._options
+        if version != self.version:
+            options = {}
+            self._options = (self.version, options)
+        if field not in options:
+            nb = len(self.base)
+            counts = self.base.counts(field)
+            codes, values = self.base.coded(field)
+            for i in self.removed:
+                if i < nb and codes[i]:
+                    counts[values[codes[i]]] -= 1
+            codes, values = self.added.coded(field)
+            for j, c in enumerate(codes):
+                if c and nb + j not in self.removed:
+                    counts[values[c]] = counts.get(values[c], 0) + 1
+            options[field] = sorted(v for v, n in counts.items() if n > 0)
+        return options[field]
+
+    def regions(self) -> List[str]:
+        if not self.changed:
+            return self.base.regions()
+        return self._values("region")
+
+    def categories(self) -> List[str]:
+        if not self.changed:
+            return self.base.categories()
+        return self._values("category")
+
+    def position(self, name: str) -> Optional[int]:
+        i = self.base.position(name)
+        if i is not None and i not in self.removed:
+            return i
+        j = self.added.position(name)
+        if j is not None and len(self.base) + j not in self.removed:
+            return len(self.base) + j
+        return None
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        i = self.position(name)
+        return None if i is None else self.record(i)
+
+    def find_url(self, url: str) -> Optional[int]:
+        i = self.base.find_url(url)
+        if i is not None and i not in self.removed:
+            return i
+        j = self.added.find_url(url)
+        if j is not None and len(self.base) + j not in self.removed:
+            return len(self.base) + j
+        return None
+
+    def add(self, record: Dict[str, Any]) -> int:
+        i = len(self.base) + self.added.add(record)
+        self.version += 1
+        return i
+
+    def remove(self, i: int) -> None:
+        self.removed.add(i)
+        self.version += 1
+
+    def filter_ids(self, region: Optional[str] = None, category: Optional[str] = None, search: str = "") -> Optional[List[int]]:
+        base_ids = self.base.filter_ids(region, category, search)
+        if not self.changed:
+            return base_ids
+        nb = len(self.base)
+        added_ids = self.added.filter_ids(region, category, search)
+        ids = list(range(nb)) if base_ids is None else base_ids
+        ids += [nb + j for j in (range(len(self.added)) if added_ids is None else added_ids)]
+        if self.removed:
+            ids = [i for i in ids if i not in self.removed]
+        return ids
+
+    def filter(self, region: Optional[str] = None, category: Optional[str] = None, search: str = "") -> List[Dict[str, Any]]:
+        ids = self.filter_ids(region, category, search)
+        return self.records if ids is None else [self.record(i) for i in ids]
@@ -0,0 +1,168 @@
+"""Variant exports: streamed CSV/Markdown/HTML, a zip bundle, and a content-hash cache."""
+import csv
+import hashlib
+import html
+import io
+import os
+import tempfile
+import zipfile
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from parallel import chunked
+from perf import timed
+
+EXPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    "csv": {"label": "CSV", "file": "classified_variants.csv", "mime": "text/csv"},
+    "md": {"label": "Markdown", "file": "classified_variants.md", "mime": "text/markdown"},
+    "html": {"label": "HTML", "file": "classified_variants.html", "mime": "text/html"},
+    "zip": {"label": "ZIP bundle", "file": "classified_variants.zip", "mime": "application/zip"},
+}
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "illuminati_exports")
+MAX_CACHED_EXPORTS = 24
+_BATCH = 1000
+
+
+def _columns(ads: List[Dict[str, Any]]) -> List[str]:
+    # Same column order pd.DataFrame(ads) would produce: keys by first appearance.
+    cols: Dict[str, None] = {}
+    for ad in ads:
+        for k in ad:
+            cols.setdefault(k, None)
+    return list(cols)
+
+
+def _text(ad: Dict[str, Any], key: str) -> str:
+    v = ad.get(key)
+    return "" if v is None else str(v)
+
+
+def _iter_csv(ads: Iterable[Dict[str, Any]], columns: Optional[List[str]] = None) -> Iterator[str]:
+    batches = chunked(ads, _BATCH)
+    if columns is None:
+        if isinstance(ads, list):
+            columns = _columns(ads)
+        else:
+            # A stream can't be scanned twice; take the columns from its first batch.
+            first = next(batches, [])
+            columns = _columns(first)
+            batches = chain([first], batches)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, restval="", extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _md_block(n: int, ad: Dict[str, Any]) -> str:
+    return f"## Ad {n}\n**Headline:** {_text(ad, 'headline')}\n\n{_text(ad, 'body')}\n"
+
+
+def _iter_md(ads: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield "# Classified Ads\n\n"
+    n = 0
+    for batch in chunked(ads, _BATCH):
+        chunk = "\n".join(_md_block(i, ad) for i, ad in enumerate(batch, start=n + 1))
+        yield chunk if n == 0 else "\n" + chunk
+        n += len(batch)
+
+
+def _iter_html(ads: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    esc = html.escape
+    yield "<html><body><h1>Classified Ads</h1>"
+    n = 0
+    for batch in chunked(ads, _BATCH):
+        yield "".join(
+            f"\n<h2>Ad {i}</h2>"
+            f"\n<p><strong>Headline:</strong> {esc(_text(ad, 'headline'))}</p>"
+            f"\n<pre>{esc(_text(ad, 'body'))}</pre>"
+            "\n<hr/>"
+            for i, ad in enumerate(batch, start=n + 1)
+        )
+        n += len(batch)
+    yield "\n</body></html>"
+
+
+def iter_export(ads: Iterable[Dict[str, Any]], fmt: str = "csv", columns: Optional[List[str]] = None) -> Iterator[bytes]:
+    """Yield the export as UTF-8 chunks of about a thousand ads each.
+
+    ``ads`` may be a list or any iterable, e.g. a generator of bulk variants.
+    """
+    parts = _iter_csv(ads, columns) if fmt == "csv" else _iter_md(ads) if fmt == "md" else _iter_html(ads)
+    for part in parts:
+        yield part.encode("utf-8")
+
+
+@timed()
+def export_ads(ads: List[Dict[str, Any]], fmt: str = "csv") -> bytes:
+    return b"".join(iter_export(ads, fmt))
+
+
+def write_bundle(ads: List[Dict[str, Any]], dest: Any) -> None:
+    """Write the CSV, Markdown and HTML exports into one zip (path or binary file)."""
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for sub in ("csv", "md", "html"):
+            with zf.open(EXPORT_FORMATS[sub]["file"], "w") as out:
+                for chunk in iter_export(ads, sub):
+                    out.write(chunk)
+
+
+@timed()
+def content_digest(ads: List[Dict[str, Any]]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for ad in ads:
+        for k, v in ad.items():
+            h.update(f"{k}\x00{v}\x01".encode("utf-8"))
+        h.update(b"\x02")
+    return h.hexdigest()
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prune_cache() -> None:
+    # Skip ``.tmp`` files: another session may still be writing one.
+    paths = [os.path.join(EXPORT_DIR, p) for p in os.listdir(EXPORT_DIR) if not p.endswith(".tmp")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for p in paths[MAX_CACHED_EXPORTS:]:
+        _discard(p)
+
+
+@timed()
+def export_path(ads: List[Dict[str, Any]], fmt: str = "csv", digest: str = "") -> str:
+    """Path of the cached export for these ads, streaming it to disk on a miss.
+
+    Files are keyed by ``content_digest(ads)``, so unchanged variants are never
+    serialized twice and only one chunk is in memory while writing.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    digest = digest or content_digest(ads)
+    path = os.path.join(EXPORT_DIR, f"{digest}.{fmt}")
+    if os.path.exists(path):
+        return path
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=EXPORT_DIR)
+    try:
+        if fmt == "zip":
+            os.close(fd)
+            write_bundle(ads, tmp)
+        else:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter_export(ads, fmt):
+                    out.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+    _prune_cache()
+    return path
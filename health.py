@@ -0,0 +1,242 @@
+"""Site liveness checks: asyncio fan-out with per-host pacing and a TTL cache persisted to disk."""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from directory import normalize_url
+from store import DATA_DIR
+
+HEALTH_PATH = os.path.join(DATA_DIR, "site_health.json")
+DEFAULT_TTL = 6 * 3600
+# Answers that prove the site is gone; anything else below 500 means a server replied.
+DEAD_STATUSES = {404, 410}
+USER_AGENT = "Mozilla/5.0 (compatible; IlluminatiSiteCheck/1.0)"
+
+
+def classify(url: str, status: Optional[int], final_url: str) -> str:
+    """"up", "moved" (redirected to another site or path) or "down"."""
+    if status is None or status in DEAD_STATUSES or status >= 500:
+        return "down"
+    if final_url and normalize_url(final_url) != normalize_url(url):
+        return "moved"
+    return "up"
+
+
+class HealthCache:
+    """URL -> last probe result, kept in memory and flushed to a JSON file.
+
+    Entries older than ``ttl`` seconds still show up in ``get`` (stale data
+    beats none in the table) but are probed again by the checker.
+    """
+
+    def __init__(self, path: str = HEALTH_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(url)
+
+    def is_fresh(self, url: str, now: Optional[float] = None) -> bool:
+        e = self._entries.get(url)
+        return e is not None and (now or time.time()) - e["checked"] < self.ttl
+
+    def health(self, url: str) -> str:
+        e = self._entries.get(url)
+        return e["health"] if e else ""
+
+    def put(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[result["url"]] = result
+            self.version += 1
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._entries)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+class SiteChecker:
+    """Probes directory URLs on a background thread running one asyncio loop.
+
+    At most ``concurrency`` probes are in flight, and requests to the same
+    host start at least ``per_host_interval`` seconds apart. Each probe is a
+    HEAD (falling back to a streamed GET when HEAD is refused) over a pooled
+    ``requests.Session``, run in a thread pool of the same size as the
+    concurrency limit. Results land in the cache as they arrive and the
+    cache is saved when a run ends.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[HealthCache] = None,
+        concurrency: int = 16,
+        per_host_interval: float = 1.0,
+        timeout: float = 10.0,
+        session: Optional[requests.Session] = None,
+    ):
+        self.cache = cache if cache is not None else HealthCache()
+        self.concurrency = concurrency
+        self.per_host_interval = per_host_interval
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+        self._session = session
+        self.total = 0
+        self.done = 0
+        self.status = "idle"
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.0
+
+    def stale(self, urls: Iterable[str]) -> List[str]:
+        now = time.time()
+        return list(dict.fromkeys(u for u in urls if u and not self.cache.is_fresh(u, now)))
+
+    def start(self, urls: Iterable[str], force: bool = False) -> bool:
+        """Check ``urls`` in the background (only stale ones unless ``force``); False if a run is active."""
+        if self.running:
+            return False
+        todo = list(dict.fromkeys(u for u in urls if u)) if force else self.stale(urls)
+        self.total, self.done, self.error = len(todo), 0, None
+        self.status = "running"
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run, args=(todo,), name="site-health", daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, urls: List[str]) -> None:
+        try:
+            asyncio.run(self.check_all(urls))
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.cache.save()
+
+    async def check_all(self, urls: List[str]) -> None:
+        sem = asyncio.Semaphore(self.concurrency)
+        host_locks: Dict[str, asyncio.Lock] = {}
+        last_start: Dict[str, float] = {}
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="site-health-probe")
+
+        async def one(url: str) -> None:
+            try:
+                host = (urlsplit(url).hostname or "").lower()
+            except ValueError:
+                host = ""  # probe() records why the URL is bad
+            lock = host_locks.setdefault(host, asyncio.Lock())
+            try:
+                # The host lock is held until the probe has a slot, so starts to one
+                # host are always at least per_host_interval apart. A cancel is
+                # checked before every wait, so pending probes drop out at once.
+                async with lock:
+                    if self._cancel.is_set():
+                        return
+                    delay = last_start.get(host, float("-inf")) + self.per_host_interval - loop.time()
+                    if delay > 0:
+                        await self._sleep(delay)
+                    if self._cancel.is_set():
+                        return
+                    await sem.acquire()
+                    last_start[host] = loop.time()
+                try:
+                    if not self._cancel.is_set():
+                        self.cache.put(await loop.run_in_executor(pool, self.probe, url))
+                finally:
+                    sem.release()
+            finally:
+                # Skipped probes count as done too, so a cancelled run's progress completes.
+                self.done += 1
+
+        try:
+            await asyncio.gather(*(one(u) for u in urls))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _sleep(self, seconds: float) -> None:
+        # cancel() is called from another thread, so poll it instead of sleeping through.
+        end = time.monotonic() + seconds
+        while not self._cancel.is_set():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, 0.05))
+
+    def probe(self, url: str) -> Dict[str, Any]:
+        """One blocking check of ``url``: status, final URL after redirects, latency."""
+        start = time.perf_counter()
+        status: Optional[int] = None
+        final_url = ""
+        error = ""
+        try:
+            r = self._session.head(url, allow_redirects=True, timeout=self.timeout)
+            if r.status_code in (405, 501) or r.status_code >= 500:
+                # Some servers refuse or mishandle HEAD; confirm with a GET without reading the body.
+                r.close()
+                r = self._session.get(url, allow_redirects=True, timeout=self.timeout, stream=True)
+            status, final_url = r.status_code, r.url
+            r.close()
+        except Exception as e:
+            # Anything a malformed URL or server can raise marks this site only, not the run.
+            error = f"{type(e).__name__}: {e}"[:300]
+        return {
+            "url": url,
+            "status": status,
+            "final_url": final_url,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "checked": time.time(),
+            "error": error,
+            "health": classify(url, status, final_url),
+        }
@@ -0,0 +1,350 @@
+"""Bulk campaign ingestion: tracker event exports (CSV/JSONL) streamed into per-site snapshots."""
+import csv
+import datetime
+import io
+import functools
+import json
+import math
+import operator
+import os
+from collections import Counter
+from typing import List, Dict, Any, IO, Iterator, Optional, Set, Tuple, Union
+
+from directory import normalize_url
+
+# Normalized event fields, and the column names trackers commonly use for each.
+EVENT_FIELDS = ["event_id", "time", "site", "type", "revenue", "variant_id"]
+FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "event_id": ("event_id", "eventid", "event id", "id", "click_id", "conversion_id", "transaction_id", "txn_id"),
+    "time": ("time", "timestamp", "ts", "datetime", "date", "created_at", "event_time"),
+    "site": ("site", "source", "publisher", "placement", "utm_source", "referrer", "referer", "url"),
+    "type": ("type", "event", "event_type", "action", "kind"),
+    "revenue": ("revenue", "value", "amount", "payout", "sale_amount"),
+    "variant_id": ("variant_id", "variant", "creative_id", "ad_id"),
+}
+# Event type -> index into the snapshot counters (impressions, clicks, leads, sales).
+EVENT_TYPES: Dict[str, int] = {
+    "impression": 0, "impressions": 0, "view": 0, "views": 0,
+    "click": 1, "clicks": 1,
+    "lead": 2, "leads": 2, "signup": 2, "optin": 2,
+    "sale": 3, "sales": 3, "conversion": 3, "purchase": 3, "order": 3,
+}
+GRAINS = ("day", "hour")
+
+
+def _match_columns(header: List[str]) -> Dict[str, int]:
+    # Event field -> column position, taking the first alias present.
+    position = {h.strip().lower(): i for i, h in reversed(list(enumerate(header)))}
+    out = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for a in aliases:
+            if a in position:
+                out[field] = position[a]
+                break
+    return out
+
+
+def iter_events(stream: IO[bytes], fmt: str = "csv") -> Iterator[tuple]:
+    """Stream ``(event_id, time, site, type, revenue, variant_id)`` tuples from a CSV or JSONL export.
+
+    Columns are matched to fields through ``FIELD_ALIASES``; missing fields
+    come back as "". Only one line is held at a time.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        yield from (_iter_jsonl(text) if fmt == "jsonl" else _iter_csv(text))
+    finally:
+        # Leave the caller's stream open.
+        text.detach()
+
+
+def _iter_jsonl(text: IO[str]) -> Iterator[tuple]:
+    keys: Dict[Tuple[str, ...], List[Optional[str]]] = {}
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield ("",) * len(EVENT_FIELDS)
+            continue
+        if not isinstance(obj, dict):
+            yield ("",) * len(EVENT_FIELDS)
+            continue
+        shape = tuple(obj)
+        names = keys.get(shape)
+        if names is None:
+            cols = _match_columns(list(shape))
+            names = keys[shape] = [shape[cols[f]] if f in cols else None for f in EVENT_FIELDS]
+        # Arrays and objects become text, so they are rejected like any other bad value.
+        yield tuple("" if k is None or obj[k] is None else _scalar(obj[k]) for k in names)
+
+
+def _scalar(value: Any) -> Any:
+    return str(value) if isinstance(value, (list, dict)) else value
+
+
+def _iter_csv(text: IO[str]) -> Iterator[tuple]:
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if not header:
+        return
+    cols = _match_columns(header)
+    # Missing fields read a blank column padded onto the end of each row.
+    blank = len(header)
+    get = operator.itemgetter(*[cols.get(f, blank) for f in EVENT_FIELDS])
+    width = blank + 1 if len(cols) < len(EVENT_FIELDS) else blank
+    for row in reader:
+        if len(row) < width:
+            row += [""] * (width - len(row))
+        yield get(row)
+
+
+class SiteResolver:
+    """Maps tracker site values (names, domains, referrer URLs) to directory site names.
+
+    Matches, in order: an explicit alias, the exact name, the name ignoring
+    case, then the host of a URL or bare domain against the hosts of the
+    directory's URLs, dropping subdomains one at a time (so
+    "https://sfbay.craigslist.org/x" finds Craigslist). Trackers repeat a few
+    hundred values across millions of events, so each value is resolved once.
+    """
+
+    def __init__(self, directory: Any, aliases: Optional[Dict[str, str]] = None):
+        cols = directory.columns()
+        names = cols["name"]
+        self._exact = set(names)
+        self._lower = {n.lower(): n for n in reversed(names)}
+        self._hosts: Dict[str, str] = {}
+        for name, url in zip(names, cols["url"]):
+            self._hosts.setdefault(normalize_url(url).split("/", 1)[0], name)
+        self._aliases = {k.strip().lower(): v for k, v in (aliases or {}).items()}
+        self._memo: Dict[str, Optional[str]] = {}
+
+    def __call__(self, value: str) -> Optional[str]:
+        hit = self._memo.get(value, False)
+        if hit is False:
+            hit = self._memo[value] = self._resolve(value)
+        return hit
+
+    def _resolve(self, value: str) -> Optional[str]:
+        v = str(value).strip()
+        if not v:
+            return None
+        alias = self._aliases.get(v.lower())
+        if alias is not None:
+            return alias
+        if v in self._exact:
+            return v
+        name = self._lower.get(v.lower())
+        if name is not None:
+            return name
+        if "." not in v:
+            return None
+        host = normalize_url(v if "://" in v else f"https://{v}").split("/", 1)[0].split(":", 1)[0]
+        while host.count(".") >= 1:
+            name = self._hosts.get(host)
+            if name is not None:
+                return name
+            host = host.split(".", 1)[1]
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_day(day: str) -> bool:
+    # Events cluster on few days, so each distinct "YYYY-MM-DD" is parsed once.
+    try:
+        datetime.date.fromisoformat(day)
+    except ValueError:
+        return False
+    return True
+
+
+def _bucket(value: Any, grain: str) -> Optional[str]:
+    # Snapshot time for an event: the start of its day or hour. ISO strings are
+    # bucketed as written; numbers are Unix seconds (or milliseconds) in UTC.
+    if isinstance(value, str):
+        v = value.strip()
+        if len(v) >= 10 and v[4] == "-" and v[7] == "-":
+            if not _is_day(v[:10]):
+                return None
+            if grain == "day":
+                return f"{v[:10]}T00:00:00"
+            hour = v[11:13] if len(v) >= 13 and v[11:13].isdigit() else "00"
+            if hour > "23":
+                return None
+            return f"{v[:10]}T{hour}:00:00"
+        try:
+            value = float(v)
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value > 1e11:
+        value /= 1000.0
+    try:
+        t = datetime.datetime.utcfromtimestamp(value)
+    except (OverflowError, OSError, ValueError):
+        return None
+    return t.strftime("%Y-%m-%dT00:00:00" if grain == "day" else "%Y-%m-%dT%H:00:00")
+
+
+def _snapshot(time: str, site: str, variant_id: str, totals: List[float]) -> Dict[str, Any]:
+    # Same EPC/Conv% rules as a snapshot entered by hand on the tracker form.
+    impressions, clicks, leads, sales, revenue = totals
+    return {
+        "time": time,
+        "site": site,
+        "impressions": int(impressions),
+        "clicks": int(clicks),
+        "leads": int(leads),
+        "sales": int(sales),
+        "revenue": round(revenue, 2),
+        "EPC": round(revenue / clicks, 2) if clicks > 0 else 0.0,
+        "Conv%": round(sales / clicks * 100, 2) if clicks > 0 else 0.0,
+        "variant_id": variant_id,
+    }
+
+
+def detect_format(name: str, head: bytes) -> str:
+    ext = os.path.splitext(name.lower())[1]
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    return "jsonl" if head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1] == b"{" else "csv"
+
+
+def ingest_events(
+    store: Any,
+    source: Union[str, bytes, IO[bytes]],
+    directory: Any,
+    fmt: Optional[str] = None,
+    grain: str = "day",
+    aliases: Optional[Dict[str, str]] = None,
+    batch: int = 100_000,
+) -> Dict[str, Any]:
+    """Aggregate a tracker event export into campaign snapshots; safe to run again on the same file.
+
+    Events are read ``batch`` at a time. Each batch's ids are reserved in
+    the store (``PostingStore.stage_events``), which reports the ones
+    already ingested, and the rest are added to per (site, day or hour,
+    variant) totals. Memory therefore grows with the number of distinct
+    totals, not with the file. At the end the totals are written as one
+    snapshot each, in the same transaction that marks the ids ingested, so
+    an import either lands completely or not at all.
+
+    Events with no id, an unknown type, an unreadable time or a site not in
+    ``directory`` are rejected and counted by reason, as are events whose
+    ids another import still in progress has reserved ("held by another
+    import"; run the file again once it finishes). The most common
+    unmatched site values are returned so they can be given ``aliases``.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain: {grain}")
+    if isinstance(source, str):
+        stream: IO[bytes] = open(source, "rb")
+        name = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        stream, name = io.BytesIO(source), ""
+    else:
+        stream, name = source, getattr(source, "name", "") or ""
+
+    resolve = SiteResolver(directory, aliases)
+    rejected: Counter = Counter()
+    unmatched: Counter = Counter()
+    totals: Dict[Tuple[str, str, str], List[float]] = {}
+    read = ingested = 0
+    store.release_stale_events()
+    stage = store.new_stage()
+
+    def fold(events: Dict[str, tuple]) -> None:
+        nonlocal ingested
+        seen, held = store.stage_events(stage, list(events))
+        ingested += len(events) - len(seen) - len(held)
+        if held:
+            rejected["held by another import"] += len(held)
+        for eid, (key, kind, revenue) in events.items():
+            if eid in seen or eid in held:
+                continue
+            acc = totals.get(key)
+            if acc is None:
+                acc = totals[key] = [0.0, 0.0, 0.0, 0.0, 0.0]
+            acc[kind] += 1
+            acc[4] += revenue
+
+    try:
+        if fmt is None:
+            if hasattr(stream, "peek"):
+                head = stream.peek(64)[:64]
+            else:
+                head = stream.read(64)
+                stream.seek(0)
+            fmt = detect_format(str(name), head)
+        events: Dict[str, tuple] = {}
+        sites: Dict[Any, Optional[str]] = {}
+        for eid, time, site_value, kind, revenue, variant in iter_events(stream, fmt):
+            read += 1
+            if eid.__class__ is not str:
+                eid = str(eid)
+            if not eid:
+                rejected["no event id"] += 1
+                continue
+            if eid in events:
+                continue
+            k = EVENT_TYPES.get(kind)
+            if k is None:
+                k = EVENT_TYPES.get(str(kind).strip().lower())
+                if k is None:
+                    rejected["unknown type"] += 1
+                    continue
+            # Fast path for ISO times bucketed by day; everything else goes through _bucket.
+            if grain == "day" and time.__class__ is str and len(time) >= 10 and time[4] == "-" and time[7] == "-" and _is_day(time[:10]):
+                bucket = time[:10] + "T00:00:00"
+            else:
+                bucket = _bucket(time, grain)
+                if bucket is None:
+                    rejected["bad time"] += 1
+                    continue
+            site = sites.get(site_value, False)
+            if site is False:
+                site = sites[site_value] = resolve(site_value)
+            if site is None:
+                rejected["unknown site"] += 1
+                unmatched[str(site_value)] += 1
+                continue
+            if revenue == "" or revenue is None:
+                value = 0.0
+            else:
+                try:
+                    value = float(revenue)
+                except (TypeError, ValueError):
+                    value = math.nan
+                if not math.isfinite(value):
+                    rejected["bad revenue"] += 1
+                    continue
+            events[eid] = ((site, bucket, variant if variant.__class__ is str else str(variant)), k, value)
+            if len(events) >= batch:
+                fold(events)
+                events = {}
+        if events:
+            fold(events)
+        snapshots = [_snapshot(b, s, v, acc) for (s, b, v), acc in sorted(totals.items(), key=lambda kv: kv[0][1])]
+        written = store.commit_events(stage, "campaign", snapshots)
+    except BaseException:
+        store.abort_events(stage)
+        raise
+    finally:
+        if isinstance(source, str):
+            stream.close()
+
+    accepted = read - sum(rejected.values())
+    return {
+        "read": read,
+        "ingested": ingested,
+        "duplicates": accepted - ingested,
+        "snapshots": written,
+        "rejected": sum(rejected.values()),
+        "rejected_by_reason": dict(rejected),
+        "unmatched_sites": unmatched.most_common(20),
+    }
@@ -0,0 +1,37 @@
+"""Order-preserving, bounded-memory process-pool helpers for batch jobs."""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered_map(fn: Callable[[T], Any], items: Iterable[T], workers: int = 1, window: int = 0) -> Iterator[Any]:
+    """Like ``map(fn, items)`` across ``workers`` processes, results in input order.
+
+    At most ``window`` tasks (default twice the worker count) are in flight,
+    so an unbounded input stream is consumed only as fast as results are
+    taken; ``Pool.imap`` would read the whole input up front.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    window = window or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,189 @@
+"""Opt-in wall-time instrumentation for pages and hot functions, exportable as JSON or Prometheus text."""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+PROM_PREFIX = "illuminati"
+
+# Checked on every instrumented call, so disabled timing costs one global lookup.
+_enabled = os.environ.get("ILLUMINATI_PERF", "") == "1"
+_lock = threading.Lock()
+_timings: Dict[str, "Timing"] = {}
+_gauges: Dict[str, Dict[str, float]] = {}
+
+
+class Timing:
+    __slots__ = ("calls", "total", "max", "last")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = self.max = self.last = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "last_ms": round(self.last * 1000, 3),
+        }
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(on: bool) -> None:
+    """Turn recording on or off for the whole process, i.e. every session at once."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset() -> None:
+    with _lock:
+        _timings.clear()
+        _gauges.clear()
+
+
+def record(name: str, seconds: float) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        t = _timings.get(name)
+        if t is None:
+            t = _timings[name] = Timing()
+        t.calls += 1
+        t.total += seconds
+        t.last = seconds
+        if seconds > t.max:
+            t.max = seconds
+
+
+def set_gauge(family: str, label: str, value: float) -> None:
+    if _enabled:
+        with _lock:
+            _gauges.setdefault(family, {})[label] = value
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator recording calls and wall time under ``name`` (default: the function name)."""
+    def deco(fn: F) -> F:
+        key = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(key, time.perf_counter() - start)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+
+def approx_size(obj: Any, sample: int = 200, depth: int = 3) -> int:
+    """Rough deep size in bytes; large containers are sampled and extrapolated."""
+    usage = getattr(obj, "memory_usage", None)
+    if callable(usage) and hasattr(obj, "shape"):
+        n = len(obj)
+        head = obj if n <= sample else obj.head(sample)
+        m = head.memory_usage(index=True, deep=True)
+        m = int(m.sum()) if hasattr(m, "sum") else int(m)
+        return m if n <= sample else m * n // sample
+    size = sys.getsizeof(obj)
+    if depth <= 0 or isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        items = obj.items()
+        n = len(obj)
+        taken = 0
+        sub = 0
+        for k, v in items:
+            if taken >= sample:
+                break
+            sub += approx_size(k, sample, depth - 1) + approx_size(v, sample, depth - 1)
+            taken += 1
+        return size + (sub * n // taken if taken else 0)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        n = len(obj)
+        taken = 0
+        sub = 0
+        for v in obj:
+            if taken >= sample:
+                break
+            sub += approx_size(v, sample, depth - 1)
+            taken += 1
+        return size + (sub * n // taken if taken else 0)
+    attrs = getattr(obj, "__dict__", None)
+    if isinstance(attrs, dict):
+        return size + approx_size(attrs, sample, depth - 1)
+    return size
+
+
+def snapshot(gauges: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
+    """Current timings and gauges; ``gauges`` adds families kept by the caller, e.g. one session's."""
+    with _lock:
+        snap = {
+            "enabled": _enabled,
+            "timings": {k: t.as_dict() for k, t in _timings.items()},
+            "gauges": {f: dict(v) for f, v in _gauges.items()},
+        }
+    for family, values in (gauges or {}).items():
+        snap["gauges"].setdefault(family, {}).update(values)
+    return snap
+
+
+def to_json(gauges: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    return json.dumps(snapshot(gauges), indent=2, sort_keys=True)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(gauges: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """Prometheus text exposition (format 0.0.4) of the current timings and gauges."""
+    snap = snapshot(gauges)
+    timings = sorted(snap["timings"].items())
+    name = f"{PROM_PREFIX}_call_seconds"
+    lines = [
+        f"# HELP {name} Wall time spent in instrumented pages and functions.",
+        f"# TYPE {name} summary",
+    ]
+    for key, t in timings:
+        lines.append(f'{name}_count{{name="{_label(key)}"}} {t["calls"]}')
+        lines.append(f'{name}_sum{{name="{_label(key)}"}} {t["total_ms"] / 1000:.6f}')
+    slowest = f"{PROM_PREFIX}_call_max_seconds"
+    lines += [
+        f"# HELP {slowest} Slowest single call.",
+        f"# TYPE {slowest} gauge",
+    ]
+    for key, t in timings:
+        lines.append(f'{slowest}{{name="{_label(key)}"}} {t["max_ms"] / 1000:.6f}')
+    for family, values in sorted(snap["gauges"].items()):
+        metric = f"{PROM_PREFIX}_{family}"
+        lines.append(f"# TYPE {metric} gauge")
+        for label, v in sorted(values.items()):
+            lines.append(f'{metric}{{key="{_label(label)}"}} {v}')
+    return "\n".join(lines) + "\n"
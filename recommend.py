@@ -0,0 +1,228 @@
+"""Site recommendations for an ad brief: directory fit plus posting and campaign history, ranked with NumPy."""
+import math
+import re
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Points for each signal; fit signals are 0-1 (0.5 for "General" or "Global"
+# sites), performance signals are scaled to 0-1 against the best site.
+WEIGHTS = {"category": 3.0, "region": 2.0, "epc": 2.0, "conv": 1.0, "posts": 1.0}
+# Clicks' worth of the overall EPC / conversion rate every site starts with,
+# so a site with one lucky sale does not outrank one with a long record.
+PRIOR_CLICKS = 50.0
+# Brief words that point to a directory category when the brief names none.
+CATEGORY_HINTS: Dict[str, Tuple[str, ...]] = {
+    "Real Estate": ("apartment", "apartments", "rent", "rental", "condo", "house", "houses", "lease", "realtor", "property", "room"),
+    "Pets": ("dog", "dogs", "puppy", "puppies", "cat", "cats", "kitten", "kittens", "pet", "pets", "grooming"),
+    "Jobs": ("hiring", "job", "jobs", "career", "careers", "recruiting", "vacancy", "resume", "salary"),
+    "Services": ("cleaning", "repair", "repairs", "plumbing", "tutoring", "coaching", "lessons", "moving", "consulting", "installation", "service", "services"),
+}
+_COUNTS = ["posts", "impressions", "clicks", "sales", "revenue"]
+_WORD = re.compile(r"[a-z]+")
+
+
+def brief_target(brief: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """(category, region) a brief aims at; the category is guessed from its words if not set."""
+    brief = brief or {}
+    category = brief.get("category") or None
+    region = brief.get("region") or None
+    if category is None:
+        words = set(_WORD.findall(" ".join(str(brief.get(f) or "") for f in ("product", "benefit", "audience")).lower()))
+        hits = [(len(words.intersection(hints)), c) for c, hints in CATEGORY_HINTS.items()]
+        best = max(hits)
+        category = best[1] if best[0] else None
+    return category, region
+
+
+def _category_fit(value: str, category: Optional[str]) -> float:
+    if not category:
+        return 0.0
+    if value == category:
+        return 1.0
+    return 0.5 if value == "General" else 0.0
+
+
+def _region_fit(value: str, region: Optional[str]) -> float:
+    # Site regions name one or more areas, e.g. "US/EU" or "Global/US".
+    if not region:
+        return 0.0
+    parts = {p.strip().lower() for p in value.split("/")}
+    if region.lower() in parts:
+        return 1.0
+    return 0.5 if "global" in parts else 0.0
+
+
+class SiteStats:
+    """Per-site posting counts and campaign totals, fed incrementally from the store.
+
+    One growable (sites, 5) float array of posts, impressions, clicks,
+    sales and revenue; ``sync`` folds in only history and campaign rows
+    newer than the last ones it read, with one ``np.add.at`` per batch.
+    Shared by every session and directory: sites are keyed by name.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.last_ids: Dict[str, int] = {"history": 0, "campaign": 0}
+        self.version = 0
+        self._index: Dict[str, int] = {}
+        self._counts = np.zeros((0, len(_COUNTS)), dtype=np.float64)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _rows(self, sites: Sequence[str]) -> np.ndarray:
+        index = self._index
+        out = np.empty(len(sites), dtype=np.int64)
+        for j, site in enumerate(sites):
+            i = index.get(site)
+            if i is None:
+                i = index[site] = len(self.names)
+                self.names.append(site)
+            out[j] = i
+        if len(self.names) > len(self._counts):
+            grown = np.zeros((max(1024, len(self.names), 2 * len(self._counts)), len(_COUNTS)))
+            grown[:len(self._counts)] = self._counts
+            self._counts = grown
+        return out
+
+    def sync(self, store: Any, batch: int = 50_000) -> int:
+        """Fold in history and campaign rows the store gained since the last sync; returns how many were read."""
+        read = 0
+        with self._lock:
+            for table in ("history", "campaign"):
+                for cols in store.iter_columns(table, batch=batch, after=self.last_ids[table], with_id=True):
+                    idx = self._rows(cols["site"])
+                    if table == "history":
+                        np.add.at(self._counts[:, 0], idx, 1.0)
+                    else:
+                        values = np.nan_to_num(np.array([cols[c] for c in _COUNTS[1:]], dtype=np.float64).T)
+                        np.add.at(self._counts[:, 1:], idx, values)
+                    self.last_ids[table] = cols["id"][-1]
+                    read += len(idx)
+            if read:
+                self.version += 1
+        return read
+
+    def position(self, site: str) -> int:
+        return self._index.get(site, -1)
+
+    def totals(self, rows: np.ndarray) -> np.ndarray:
+        """(len(rows), 5) counts for stats rows; -1 (a site never seen) gives zeros."""
+        with self._lock:
+            if not len(self.names):
+                return np.zeros((len(rows), len(_COUNTS)))
+            out = self._counts[np.maximum(rows, 0)]
+        out[rows < 0] = 0.0
+        return out
+
+    def performance(self, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        """Smoothed EPC and conversion rate, and post counts, each scaled to 0-1 against the best site."""
+        with self._lock:
+            all_counts = self._counts[:len(self.names)]
+            clicks_all = all_counts[:, 2].sum()
+            epc_all = all_counts[:, 4].sum() / clicks_all if clicks_all else 0.0
+            conv_all = all_counts[:, 3].sum() / clicks_all if clicks_all else 0.0
+            prior = PRIOR_CLICKS
+            # Scale against every known site, so rankings of different directories agree.
+            epc_top = ((all_counts[:, 4] + prior * epc_all) / (all_counts[:, 2] + prior)).max(initial=0.0)
+            conv_top = ((all_counts[:, 3] + prior * conv_all) / (all_counts[:, 2] + prior)).max(initial=0.0)
+            posts_top = math.log1p(all_counts[:, 0].max(initial=0.0))
+        counts = self.totals(rows)
+        epc = (counts[:, 4] + prior * epc_all) / (counts[:, 2] + prior)
+        conv = (counts[:, 3] + prior * conv_all) / (counts[:, 2] + prior)
+        return {
+            "epc": epc / epc_top if epc_top > 0 else np.zeros(len(rows)),
+            "conv": conv / conv_top if conv_top > 0 else np.zeros(len(rows)),
+            "posts": np.log1p(counts[:, 0]) / posts_top if posts_top > 0 else np.zeros(len(rows)),
+        }
+
+
+class SiteRanker:
+    """Scores every site of one SiteDirectory for a brief, as a handful of array operations.
+
+    Region and category fit are worked out once per distinct value and
+    spread over the sites through the directory's interned codes. Each
+    site's row in ``SiteStats`` is looked up once; later syncs only map the
+    site names the stats gained since. With 50k sites a full ranking is a
+    few milliseconds.
+    """
+
+    def __init__(self, directory: Any):
+        self.directory = directory
+        codes, self._regions = directory.coded("region")
+        self._region_codes = np.array(codes, dtype=np.int64)
+        codes, self._categories = directory.coded("category")
+        self._category_codes = np.array(codes, dtype=np.int64)
+        self._stats_rows = np.full(len(directory), -1, dtype=np.int64)
+        self._mapped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._stats_rows)
+
+    def _map(self, stats: SiteStats) -> np.ndarray:
+        with self._lock:
+            names = stats.names
+            for j in range(self._mapped, len(names)):
+                i = self.directory.position(names[j])
+                if i is not None and i < len(self._stats_rows):
+                    self._stats_rows[i] = j
+            self._mapped = len(names)
+            return self._stats_rows
+
+    def signals(self, stats: SiteStats, category: Optional[str] = None, region: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Each signal of ``WEIGHTS`` as one 0-1 value per site."""
+        out = {
+            "category": np.array([_category_fit(v, category) for v in self._categories])[self._category_codes],
+            "region": np.array([_region_fit(v, region) for v in self._regions])[self._region_codes],
+        }
+        out.update(stats.performance(self._map(stats)))
+        return out
+
+    def scores(self, stats: SiteStats, category: Optional[str] = None, region: Optional[str] = None) -> np.ndarray:
+        signals = self.signals(stats, category, region)
+        return sum(WEIGHTS[k] * v for k, v in signals.items())
+
+
+def overlay_scores(
+    base: SiteRanker,
+    added: Optional[SiteRanker],
+    stats: SiteStats,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+) -> np.ndarray:
+    """Scores by DirectoryOverlay position: the shared base's sites, then the ones a session added."""
+    scores = base.scores(stats, category, region)
+    if added is not None and len(added):
+        scores = np.concatenate((scores, added.scores(stats, category, region)))
+    return scores
+
+
+def top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the ``k`` highest scores, best first; ties keep directory order."""
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.lexsort((part, -scores[part]))]
+
+
+def describe(stats: SiteStats, sites: Sequence[str]) -> List[Dict[str, Any]]:
+    """Raw history of ``sites``: posts, clicks, observed EPC and Conv%."""
+    rows = np.array([stats.position(s) for s in sites], dtype=np.int64)
+    counts = stats.totals(rows)
+    out = []
+    for site, (posts, _, clicks, sales, revenue) in zip(sites, counts.tolist()):
+        out.append({
+            "site": site,
+            "posts": int(posts),
+            "clicks": int(clicks),
+            "EPC": round(revenue / clicks, 2) if clicks > 0 else 0.0,
+            "Conv%": round(sales / clicks * 100, 2) if clicks > 0 else 0.0,
+        })
+    return out
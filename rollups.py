@@ -0,0 +1,43 @@
+"""Campaign Tracker analytics over the store's incremental rollups."""
+from typing import List, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ["snapshots", "impressions", "clicks", "leads", "sales", "revenue"]
+
+
+def derive_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Add EPC, Conv% and CTR% column-wise, using the tracker's zero-click rules."""
+    out = df.copy()
+    clicks = out["clicks"].to_numpy(dtype=float)
+    impressions = out["impressions"].to_numpy(dtype=float)
+    has_clicks = clicks > 0
+    safe_clicks = np.where(has_clicks, clicks, 1.0)
+    out["EPC"] = np.round(np.where(has_clicks, out["revenue"].to_numpy(dtype=float) / safe_clicks, 0.0), 2)
+    out["Conv%"] = np.round(np.where(has_clicks, out["sales"].to_numpy(dtype=float) / safe_clicks * 100, 0.0), 2)
+    out["CTR%"] = np.round(np.where(impressions > 0, clicks / np.where(impressions > 0, impressions, 1.0) * 100, 0.0), 2)
+    return out
+
+
+def rollup_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return pd.DataFrame(columns=["bucket"] + METRIC_COLUMNS + ["EPC", "Conv%", "CTR%"])
+    return derive_metrics(df)
+
+
+def downsample(df: pd.DataFrame, max_points: int = 180) -> pd.DataFrame:
+    """Merge consecutive buckets so a time series has at most ``max_points`` rows.
+
+    Totals are summed and the derived metrics recomputed from them, so the
+    chart shows true EPC/Conv% rather than an average of ratios.
+    """
+    n = len(df)
+    if n <= max_points:
+        return df
+    step = -(-n // max_points)
+    groups = np.arange(n) // step
+    totals = df.groupby(groups, sort=True)[METRIC_COLUMNS].sum()
+    totals.insert(0, "bucket", df["bucket"].to_numpy()[::step][: len(totals)])
+    return derive_metrics(totals.reset_index(drop=True))
@@ -0,0 +1,214 @@
+"""Posting plans: variants x sites x cities scheduled under per-site token buckets and cooldowns."""
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+ITEM_STATUSES = ("pending", "done", "skipped")
+
+
+class RateLimit:
+    """Per-site posting budget: a token bucket of ``burst`` posts refilled at
+    ``per_day`` posts a day, plus a minimum ``cooldown`` in seconds between posts."""
+    __slots__ = ("burst", "per_day", "cooldown")
+
+    def __init__(self, burst: int = 2, per_day: float = 4.0, cooldown: float = 3600.0):
+        self.burst = max(1, int(burst))
+        self.per_day = max(float(per_day), 1e-6)
+        self.cooldown = max(0.0, float(cooldown))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"burst": self.burst, "per_day": self.per_day, "cooldown_min": self.cooldown / 60}
+
+
+class _SiteState:
+    # Token bucket plus the time of the last real post for one site.
+    __slots__ = ("limit", "tokens", "updated", "last_post", "items")
+
+    def __init__(self, limit: RateLimit, start: float):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = start
+        self.last_post: Optional[float] = None
+        self.items: List[int] = []
+
+    def _refill(self, tokens: float, since: float, until: float) -> float:
+        rate = self.limit.per_day / 86400.0
+        return min(float(self.limit.burst), tokens + max(0.0, until - since) * rate)
+
+    def take(self, when: float) -> None:
+        self.tokens = self._refill(self.tokens, self.updated, when) - 1.0
+        self.updated = when
+        self.last_post = when
+
+    def schedule(self, count: int, not_before: float) -> List[float]:
+        """Earliest start times of the next ``count`` posts, simulated from the current state."""
+        rate = self.limit.per_day / 86400.0
+        tokens, updated, last = self.tokens, self.updated, self.last_post
+        out = []
+        for _ in range(count):
+            t = max(not_before, updated)
+            if last is not None:
+                t = max(t, last + self.limit.cooldown)
+            tokens = self._refill(tokens, updated, t)
+            if tokens < 1.0:
+                t += (1.0 - tokens) / rate
+                tokens = 1.0
+            tokens -= 1.0
+            updated = last = t
+            out.append(t)
+        return out
+
+
+class PlanItem:
+    __slots__ = ("id", "site", "city", "variant", "due", "priority", "status", "version", "finished")
+
+    def __init__(self, id: int, site: str, city: str, variant: int, priority: float):
+        self.id = id
+        self.site = site
+        self.city = city
+        self.variant = variant
+        self.due = 0.0
+        self.priority = priority
+        self.status = "pending"
+        self.version = 0
+        self.finished: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "due": datetime.datetime.fromtimestamp(self.due).isoformat(" ", "minutes"),
+            "site": self.site,
+            "city": self.city,
+            "variant": self.variant + 1,
+            "priority": round(self.priority, 3),
+            "status": self.status,
+        }
+
+
+class PostingPlan:
+    """A prioritized posting work queue shared by everyone processing it.
+
+    Each (site, city) slot gets a variant not yet used on that site (and not
+    in ``exclude``, e.g. copy already posted there), rotating the start
+    variant per site so neighbouring sites don't carry the same copy. Slots
+    beyond the available variants are reported in ``unfilled``. Due times
+    come from simulating each site's token bucket and cooldown; the queue is
+    a heap ordered by (due, -priority). Completing or skipping an item
+    re-times only the pending items of that site, and superseded heap
+    entries are dropped lazily when they surface.
+    """
+
+    def __init__(
+        self,
+        variants: List[Dict[str, str]],
+        sites: Iterable[str],
+        cities: Iterable[str] = ("",),
+        limits: Optional[Dict[str, RateLimit]] = None,
+        default_limit: Optional[RateLimit] = None,
+        priorities: Optional[Dict[str, float]] = None,
+        exclude: Optional[Set[Tuple[str, int]]] = None,
+        start: Optional[float] = None,
+    ):
+        self.variants = list(variants)
+        self.cities = [c.strip() for c in cities] or [""]
+        self.start = time.time() if start is None else start
+        self.created = self.start
+        self.items: List[PlanItem] = []
+        self.unfilled = 0
+        self._sites: Dict[str, _SiteState] = {}
+        self._heap: List[Tuple[float, float, int, int]] = []
+        self._lock = threading.RLock()
+        limits = limits or {}
+        default_limit = default_limit or RateLimit()
+        priorities = priorities or {}
+        exclude = exclude or set()
+        n_variants = len(self.variants)
+        for offset, site in enumerate(dict.fromkeys(sites)):
+            state = self._sites[site] = _SiteState(limits.get(site, default_limit), self.start)
+            allowed = [v for v in range(n_variants) if (site, v) not in exclude]
+            for c, city in enumerate(self.cities):
+                if c >= len(allowed):
+                    self.unfilled += len(self.cities) - c
+                    break
+                item = PlanItem(len(self.items), site, city, allowed[(c + offset) % len(allowed)], priorities.get(site, 0.0))
+                self.items.append(item)
+                state.items.append(item.id)
+        for site in self._sites:
+            self._retime(site)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _retime(self, site: str, now: Optional[float] = None) -> None:
+        state = self._sites[site]
+        pending = [self.items[i] for i in state.items if self.items[i].status == "pending"]
+        for item, due in zip(pending, state.schedule(len(pending), self.start if now is None else now)):
+            item.due = due
+            item.version += 1
+            heapq.heappush(self._heap, (due, -item.priority, item.id, item.version))
+        if len(self._heap) > 2 * len(self.items) + 1024:
+            # Mostly superseded entries: rebuild from the live ones.
+            self._heap = [e for e in self._heap if self._live(e)]
+            heapq.heapify(self._heap)
+
+    def _live(self, entry: Tuple[float, float, int, int]) -> bool:
+        item = self.items[entry[2]]
+        return item.status == "pending" and item.version == entry[3]
+
+    def next_items(self, n: int = 20) -> List[PlanItem]:
+        """The first ``n`` pending items in queue order, without removing them."""
+        with self._lock:
+            out: List[PlanItem] = []
+            popped = []
+            while self._heap and len(out) < n:
+                entry = heapq.heappop(self._heap)
+                if self._live(entry):
+                    out.append(self.items[entry[2]])
+                    popped.append(entry)
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+            return out
+
+    def copy(self, item: PlanItem) -> Dict[str, str]:
+        return self.variants[item.variant]
+
+    def complete(self, item_id: int, link: str = "", note: str = "", when: Optional[float] = None) -> Dict[str, Any]:
+        """Mark an item posted; returns the posting-history row to store for it."""
+        when = time.time() if when is None else when
+        with self._lock:
+            item = self.items[item_id]
+            if item.status != "pending":
+                raise ValueError(f"Plan item {item_id} is already {item.status}.")
+            item.status, item.finished = "done", when
+            self._sites[item.site].take(when)
+            self._retime(item.site, when)
+        v = self.copy(item)
+        return {
+            "time": datetime.datetime.utcfromtimestamp(when).isoformat()[:19],
+            "site": item.site,
+            "note": " · ".join(x for x in (item.city, note) if x),
+            "link": link,
+            "headline": v.get("headline", ""),
+            "body": v.get("body", ""),
+        }
+
+    def skip(self, item_id: int) -> None:
+        with self._lock:
+            item = self.items[item_id]
+            if item.status != "pending":
+                raise ValueError(f"Plan item {item_id} is already {item.status}.")
+            item.status, item.finished = "skipped", time.time()
+            self._retime(item.site, time.time())
+
+    def counts(self) -> Dict[str, int]:
+        out = dict.fromkeys(ITEM_STATUSES, 0)
+        for item in self.items:
+            out[item.status] += 1
+        return out
+
+    def rows(self, status: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        items = (i for i in self.items if status is None or i.status == status)
+        return [i.as_dict() for i in itertools.islice(items, limit)]
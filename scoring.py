@@ -0,0 +1,252 @@
+"""Copy-quality heuristic: single-ad scoring plus a bulk corpus scorer.
+
+pandas is only imported by the DataFrame helpers, so scoring from a script
+or worker process stays cheap to start.
+"""
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Iterable, Iterator, Optional, Tuple
+
+from parallel import chunked, ordered_map
+from perf import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ---------- Keyword Tables ----------
+EMO_TRIGGERS = ["secret","finally","new","weird","shocking","hidden","proven","guarantee","instantly","limited","exclusive","today","now","fast","breakthrough","odd"]
+CTA_PHRASES = ["click here","tap here","join now","buy now","order now","get started","sign up","enroll now","start now","act now","claim","grab"]
+STRUCTURE_KEYS = ["attention","interest","desire","action","problem","agitate","solution","guarantee","bonus"]
+TIMEFRAME_KEYS = ["day","days","week","weeks","month","months"]
+
+SCORE_COLUMNS = ["Score", "Length", "Emotion", "Structure", "CTA", "Specificity"]
+
+_WORD_RE = re.compile(r"\w+")
+_SPECIFIC_RE = re.compile(r"\d|\$|\d+%")
+
+
+def _build_keyword_table() -> Tuple[Tuple[str, int, int, int, int], ...]:
+    # Each distinct keyword is scanned once per ad; its hit counts towards every
+    # group that lists it (e.g. "guarantee" is both an emotion and a structure cue).
+    groups = (EMO_TRIGGERS, STRUCTURE_KEYS, CTA_PHRASES, TIMEFRAME_KEYS)
+    weights: Dict[str, List[int]] = {}
+    for gi, keys in enumerate(groups):
+        for k in keys:
+            weights.setdefault(k, [0, 0, 0, 0])[gi] += 1
+    return tuple((k, *w) for k, w in weights.items())
+
+
+_KEYWORD_TABLE = _build_keyword_table()
+_KEYWORD_BITS = tuple((entry[0], 1 << i) for i, entry in enumerate(_KEYWORD_TABLE))
+_EMPTY_SCORE = {"Score": 0, "Length": 0, "Emotion": 0, "Structure": 0, "CTA": 0, "Specificity": 0}
+
+# Below this many ads the process pool costs more than it saves.
+PARALLEL_MIN_ADS = 20_000
+_CHUNK_SIZE = 5_000
+
+
+def _features(text: str) -> Tuple[int, int, bool]:
+    # (word count, bitmask of _KEYWORD_TABLE entries present, has a number/$/%).
+    # No keyword spans a newline, so the features of a text split on newlines
+    # combine exactly: counts add, masks OR, flags OR.
+    t = text.lower()
+    mask = 0
+    for k, bit in _KEYWORD_BITS:
+        if k in t:
+            mask |= bit
+    return len(_WORD_RE.findall(text)), mask, _SPECIFIC_RE.search(text) is not None
+
+
+def _score_features(n: int, mask: int, specific: bool) -> Dict[str, float]:
+    emo = struct = cta_hits = timeframe = 0
+    i = 0
+    while mask:
+        if mask & 1:
+            _, we, ws, wc, wt = _KEYWORD_TABLE[i]
+            emo += we
+            struct += ws
+            cta_hits += wc
+            timeframe += wt
+        mask >>= 1
+        i += 1
+    length = 20 if n < 80 else 60 if n <= 1500 else 50
+    emotion = min(emo/10,1)*100
+    structure = min(struct/6,1)*100
+    cta = min(cta_hits/3,1)*100
+    specificity = min((1 if specific else 0) + timeframe, 5)/5*100
+    score = round(0.2*length + 0.25*emotion + 0.2*structure + 0.15*cta + 0.2*specificity,1)
+    return {
+        "Score":score,
+        "Length":float(length),
+        "Emotion":round(emotion,1),
+        "Structure":round(structure,1),
+        "CTA":round(cta,1),
+        "Specificity":round(specificity,1)
+    }
+
+
+@timed()
+def analyze_copy_score(text: str) -> Dict[str, float]:
+    if not text.strip():
+        return dict(_EMPTY_SCORE)
+    return _score_features(*_features(text))
+
+
+class LiveScorer:
+    """Memoized ``analyze_copy_score`` for copy that is edited a little at a time.
+
+    Text is split into lines and each line's features are kept in an LRU
+    keyed by the line itself, so a rescore after an edit only tokenizes the
+    lines that changed; whole-text results sit in a second LRU capped by
+    total characters. Scores are identical to ``analyze_copy_score``. Safe
+    to share between threads.
+    """
+
+    def __init__(self, max_lines: int = 20_000, max_text_chars: int = 4_000_000):
+        self.max_lines = max_lines
+        self.max_text_chars = max_text_chars
+        self.hits = self.misses = 0
+        self._text_chars = 0
+        self._lines: "OrderedDict[str, Tuple[int, int, bool]]" = OrderedDict()
+        self._texts: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _line(self, line: str) -> Tuple[int, int, bool]:
+        f = self._lines.get(line)
+        if f is not None:
+            self._lines.move_to_end(line)
+            self.hits += 1
+            return f
+        self.misses += 1
+        f = self._lines[line] = _features(line)
+        if len(self._lines) > self.max_lines:
+            self._lines.popitem(last=False)
+        return f
+
+    @timed("LiveScorer.score")
+    def score(self, text: str) -> Dict[str, float]:
+        with self._lock:
+            hit = self._texts.get(text)
+            if hit is not None:
+                self._texts.move_to_end(text)
+                return dict(hit)
+            if not text.strip():
+                sc = dict(_EMPTY_SCORE)
+            else:
+                n = mask = 0
+                specific = False
+                for line in text.split("\n"):
+                    if line:
+                        ln, lm, ls = self._line(line)
+                        n += ln
+                        mask |= lm
+                        specific = specific or ls
+                sc = _score_features(n, mask, specific)
+            self._texts[text] = sc
+            self._text_chars += len(text)
+            while self._text_chars > self.max_text_chars and len(self._texts) > 1:
+                self._text_chars -= len(self._texts.popitem(last=False)[0])
+            return dict(sc)
+
+    def score_many(self, texts: Iterable[str]) -> List[Dict[str, float]]:
+        return [self.score(t) for t in texts]
+
+
+def _score_chunk(texts: List[str]) -> List[Tuple[float, ...]]:
+    out = []
+    for text in texts:
+        sc = analyze_copy_score(text)
+        out.append(tuple(sc[c] for c in SCORE_COLUMNS))
+    return out
+
+
+def iter_scores(texts: Iterable[str], workers: int = 1) -> Iterator[Tuple[float, ...]]:
+    """Stream one SCORE_COLUMNS tuple per text, in input order.
+
+    With ``workers > 1`` chunks are scored in a process pool; scores are
+    identical to calling ``analyze_copy_score`` on each text.
+    """
+    texts = ("" if t is None else str(t) for t in texts)
+    for part in ordered_map(_score_chunk, chunked(texts, _CHUNK_SIZE), workers):
+        yield from part
+
+
+def score_texts(texts: Iterable[str], workers: Optional[int] = None) -> "pd.DataFrame":
+    """Score many ads; returns one row per text with the SCORE_COLUMNS.
+
+    Corpora of PARALLEL_MIN_ADS or more use a process pool (``workers``
+    defaults to the CPU count).
+    """
+    import pandas as pd
+
+    items = list(texts)
+    workers = workers or os.cpu_count() or 1
+    if len(items) < PARALLEL_MIN_ADS:
+        workers = 1
+    return pd.DataFrame(list(iter_scores(items, workers)), columns=SCORE_COLUMNS)
+
+
+def ad_text(row: Dict[str, object]) -> str:
+    """Text to score for one record: ``text``, else headline + body."""
+    cols = {k.lower(): k for k in row}
+    if "text" in cols:
+        return str(row[cols["text"]] or "")
+    parts = [str(row[cols[c]] or "") for c in ("headline", "body") if c in cols]
+    if not parts:
+        raise ValueError("Expected a 'text' column or 'headline'/'body' columns.")
+    return "\n\n".join(parts)
+
+
+def _score_records(records: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    out = []
+    for r in records:
+        sc = analyze_copy_score(ad_text(r))
+        row = {k: v for k, v in r.items() if k not in sc}
+        row.update(sc)
+        out.append(row)
+    return out
+
+
+def iter_scored_records(records: Iterable[Dict[str, object]], workers: int = 1) -> Iterator[Dict[str, object]]:
+    """Stream records with the score fields added, chunked across ``workers`` processes."""
+    for part in ordered_map(_score_records, chunked(records, _CHUNK_SIZE), workers):
+        yield from part
+
+
+def ad_texts(df: "pd.DataFrame") -> "pd.Series":
+    """Pick the text to score: a ``text`` column, else headline + body."""
+    cols = {c.lower(): c for c in df.columns}
+    if "text" in cols:
+        return df[cols["text"]].fillna("").astype(str)
+    parts = [df[cols[c]].fillna("").astype(str) for c in ("headline", "body") if c in cols]
+    if not parts:
+        raise ValueError("Expected a 'text' column or 'headline'/'body' columns.")
+    if len(parts) == 1:
+        return parts[0]
+    return parts[0] + "\n\n" + parts[1]
+
+
+@timed()
+def load_ads_file(data: bytes, filename: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    buf = io.BytesIO(data)
+    name = filename.lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(buf, lines=True, dtype=False)
+    if name.endswith(".json"):
+        return pd.read_json(buf, dtype=False)
+    return pd.read_csv(buf, dtype=str, keep_default_na=False)
+
+
+@timed()
+def score_corpus(df: "pd.DataFrame", workers: Optional[int] = None) -> "pd.DataFrame":
+    """Return ``df`` with the score columns appended, in the original row order."""
+    import pandas as pd
+
+    scores = score_texts(ad_texts(df).tolist(), workers=workers)
+    base = df.reset_index(drop=True).drop(columns=SCORE_COLUMNS, errors="ignore")
+    return pd.concat([base, scores], axis=1)
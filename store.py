@@ -0,0 +1,570 @@
+"""Durable SQLite store for the posting history and campaign snapshots."""
+import csv
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, Tuple
+
+DATA_DIR = os.environ.get("ILLUMINATI_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+DB_PATH = os.path.join(DATA_DIR, "illuminati.db")
+
+# Column name -> SQLite type; names match the dicts the pages have always built.
+TABLES: Dict[str, Dict[str, str]] = {
+    "history": {
+        "time": "TEXT NOT NULL",
+        "site": "TEXT NOT NULL",
+        "note": "TEXT NOT NULL DEFAULT ''",
+        "link": "TEXT NOT NULL DEFAULT ''",
+        # The ad copy that was posted, so repeats can be detected later.
+        "headline": "TEXT NOT NULL DEFAULT ''",
+        "body": "TEXT NOT NULL DEFAULT ''",
+    },
+    "campaign": {
+        "time": "TEXT NOT NULL",
+        "site": "TEXT NOT NULL",
+        "impressions": "INTEGER NOT NULL DEFAULT 0",
+        "clicks": "INTEGER NOT NULL DEFAULT 0",
+        "leads": "INTEGER NOT NULL DEFAULT 0",
+        "sales": "INTEGER NOT NULL DEFAULT 0",
+        "revenue": "REAL NOT NULL DEFAULT 0",
+        "EPC": "REAL NOT NULL DEFAULT 0",
+        "Conv%": "REAL NOT NULL DEFAULT 0",
+        # variants.variant_id of the copy the snapshot measured; '' when untagged.
+        "variant_id": "TEXT NOT NULL DEFAULT ''",
+    },
+}
+
+
+# Campaign snapshots are also summed into per-site and per-time-bucket rollups,
+# maintained in the same transaction as each insert.
+ROLLUP_METRICS = ["impressions", "clicks", "leads", "sales", "revenue"]
+ROLLUP_BUCKETS = {
+    "site": "''",
+    "day": "substr(time, 1, 10)",
+    # Monday of the ISO week; falls back to the raw date for unparseable times.
+    "week": "coalesce(date(substr(time, 1, 10), 'weekday 0', '-6 days'), substr(time, 1, 10))",
+}
+
+
+# Bound parameters per statement; SQLite's default limit is 32766 since 3.32.
+_MAX_VARS = 30_000
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _default(sql_type: str) -> Any:
+    if "DEFAULT" not in sql_type:
+        return None
+    return "" if sql_type.startswith("TEXT") else 0.0 if sql_type.startswith("REAL") else 0
+
+
+_DEFAULTS = {table: {c: _default(t) for c, t in cols.items()} for table, cols in TABLES.items()}
+
+
+def _columns(table: str) -> List[str]:
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    return list(TABLES[table])
+
+
+class PostingStore:
+    """Thread-safe wrapper around one WAL-mode SQLite connection.
+
+    Rows go in through batched inserts and come back a page at a time via
+    the (site, time) and (time) indexes, so page loads never read the full
+    log. Row totals are kept in a counter table updated in the same
+    transaction as each batch, making ``count`` O(1) however large the log
+    grows.
+
+    A table can also be capped: once it holds 10% more rows than its cap,
+    the oldest rows beyond the cap are handed to ``spill`` (which writes
+    them somewhere durable) and deleted, so the live table behaves like a
+    ring buffer. Without a ``spill`` callback caps are never enforced.
+    """
+
+    def __init__(self, path: str = DB_PATH, spill: Optional[Callable[["PostingStore", str, int], Any]] = None):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        # Bumped on every write so callers can cache what they read per version.
+        self.versions: Dict[str, int] = {t: 0 for t in TABLES}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._create_schema()
+        self.spill = spill
+        self.spill_error: Optional[str] = None
+        self.caps: Dict[str, int] = dict(self._conn.execute("SELECT tbl, cap FROM table_caps").fetchall())
+
+    def _create_schema(self) -> None:
+        stmts = ["CREATE TABLE IF NOT EXISTS row_counts (tbl TEXT PRIMARY KEY, n INTEGER NOT NULL)"]
+        for table, cols in TABLES.items():
+            col_sql = ", ".join(f"{_q(c)} {t}" for c, t in cols.items())
+            stmts += [
+                f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {col_sql})",
+                f"CREATE INDEX IF NOT EXISTS {table}_site_time ON {table} (site, time)",
+                f"CREATE INDEX IF NOT EXISTS {table}_time ON {table} (time)",
+                f"INSERT OR IGNORE INTO row_counts VALUES ('{table}', (SELECT count(*) FROM {table}))",
+            ]
+        metric_sql = ", ".join(f"{m} {'REAL' if m == 'revenue' else 'INTEGER'} NOT NULL DEFAULT 0" for m in ROLLUP_METRICS)
+        stmts += [
+            "CREATE TABLE IF NOT EXISTS campaign_rollup (kind TEXT NOT NULL, bucket TEXT NOT NULL, site TEXT NOT NULL, "
+            f"snapshots INTEGER NOT NULL DEFAULT 0, {metric_sql}, PRIMARY KEY (kind, bucket, site)) WITHOUT ROWID",
+            "CREATE INDEX IF NOT EXISTS campaign_rollup_site ON campaign_rollup (kind, site, bucket)",
+            "CREATE TABLE IF NOT EXISTS rollup_state (tbl TEXT PRIMARY KEY, last_id INTEGER NOT NULL)",
+            "INSERT OR IGNORE INTO rollup_state VALUES ('campaign', 0)",
+            "CREATE TABLE IF NOT EXISTS table_caps (tbl TEXT PRIMARY KEY, cap INTEGER NOT NULL)",
+            # Highest id spilled out of each table; rows at or below it are still in the rollups.
+            "CREATE TABLE IF NOT EXISTS spill_marks (tbl TEXT PRIMARY KEY, upto INTEGER NOT NULL)",
+            # Tracker event ids taken by an import (stage), so re-imports skip them. An
+            # import's ids count as ingested once its stage is marked done.
+            "CREATE TABLE IF NOT EXISTS event_stages (id INTEGER PRIMARY KEY, started REAL NOT NULL, done INTEGER NOT NULL DEFAULT 0)",
+            "CREATE TABLE IF NOT EXISTS seen_events (event_id TEXT PRIMARY KEY, stage INTEGER NOT NULL) WITHOUT ROWID",
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for sql in stmts:
+                self._conn.execute(sql)
+            # Columns added to TABLES after a database was created (all have defaults).
+            for table, cols in TABLES.items():
+                have = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+                for c, t in cols.items():
+                    if c not in have:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {_q(c)} {t}")
+            # Catches up databases created before rollups existed.
+            self._apply_rollups()
+            self._conn.execute("COMMIT")
+
+    def _apply_rollups(self) -> None:
+        # Folds only campaign rows newer than the last rolled-up id into the totals.
+        last = self._conn.execute("SELECT last_id FROM rollup_state WHERE tbl = 'campaign'").fetchone()[0]
+        top = self._conn.execute("SELECT coalesce(max(id), 0) FROM campaign").fetchone()[0]
+        if top <= last:
+            return
+        sums = ", ".join(f"sum({m})" for m in ROLLUP_METRICS)
+        updates = ", ".join(f"{m} = {m} + excluded.{m}" for m in ["snapshots"] + ROLLUP_METRICS)
+        for kind, expr in ROLLUP_BUCKETS.items():
+            self._conn.execute(
+                f"INSERT INTO campaign_rollup (kind, bucket, site, snapshots, {', '.join(ROLLUP_METRICS)}) "
+                f"SELECT '{kind}', {expr} AS b, site, count(*), {sums} FROM campaign "
+                f"WHERE id > ? AND id <= ? GROUP BY b, site "
+                f"ON CONFLICT (kind, bucket, site) DO UPDATE SET {updates}",
+                (last, top),
+            )
+        self._conn.execute("UPDATE rollup_state SET last_id = ? WHERE tbl = 'campaign'", (top,))
+
+    def insert(self, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Append rows in a single transaction; returns how many were written."""
+        cols = _columns(table)
+        defaults = _DEFAULTS[table]
+        return self.insert_tuples(table, [tuple(r.get(c, defaults[c]) for c in cols) for r in rows])
+
+    def insert_tuples(self, table: str, params: List[tuple], skip_existing: bool = False) -> int:
+        """Append rows given as tuples in column order, in one transaction; returns how many were written.
+
+        With ``skip_existing`` a row identical to one already stored (found
+        through the (site, time) index) is not written again, which makes
+        re-importing an overlapping archive safe.
+        """
+        _columns(table)
+        if not params:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                written = self._write(table, params, skip_existing)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        if written:
+            self._enforce_cap(table)
+        return written
+
+    def _write(self, table: str, params: List[tuple], skip_existing: bool = False) -> int:
+        # The body of an insert; the caller holds the lock and an open transaction.
+        cols = _columns(table)
+        if skip_existing:
+            same = " AND ".join(f"o.{_q(c)} IS n.{_q(c)}" for c in cols if c not in ("site", "time"))
+            sql = (
+                f"INSERT INTO {table} ({', '.join(map(_q, cols))}) "
+                f"SELECT * FROM (SELECT {', '.join(f'? AS {_q(c)}' for c in cols)}) AS n "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS o WHERE o.site = n.site AND o.time = n.time AND {same})"
+            )
+        else:
+            sql = f"INSERT INTO {table} ({', '.join(map(_q, cols))}) VALUES ({', '.join('?' * len(cols))})"
+        before = self._conn.total_changes
+        self._conn.executemany(sql, params)
+        written = self._conn.total_changes - before
+        self._conn.execute("UPDATE row_counts SET n = n + ? WHERE tbl = ?", (written, table))
+        if table == "campaign":
+            self._apply_rollups()
+        if written:
+            self.versions[table] += 1
+        return written
+
+    def new_stage(self) -> int:
+        """Start an event import; its ids are reserved with ``stage_events``."""
+        with self._lock:
+            return self._conn.execute("INSERT INTO event_stages (started) VALUES (?)", (time.time(),)).lastrowid
+
+    def stage_events(self, stage: int, event_ids: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Reserve event ids for ``stage``; returns (ids already taken, ids held by another import).
+
+        Ids count as taken once ingested (their stage is done) or when
+        ``stage`` itself reserved them earlier. Ids reserved by an import
+        still in progress are held: they are neither reserved nor counted
+        as ingested, since that import may still abort. Reservations are
+        on disk, so an import can check millions of ids in bounded memory.
+        They count as ingested once ``commit_events`` marks the stage done
+        (a single-row update) and are dropped by ``abort_events``.
+        """
+        ids = list(dict.fromkeys(event_ids))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seen: Set[str] = set()
+                held: Set[str] = set()
+                for i in range(0, len(ids), _MAX_VARS):
+                    chunk = ids[i:i + _MAX_VARS]
+                    for event_id, owner, done in self._conn.execute(
+                        "SELECT s.event_id, s.stage, coalesce(e.done, 1) FROM seen_events AS s "
+                        "LEFT JOIN event_stages AS e ON e.id = s.stage "
+                        f"WHERE s.event_id IN ({', '.join('?' * len(chunk))})", chunk
+                    ):
+                        (seen if done or owner == stage else held).add(event_id)
+                self._conn.executemany(
+                    "INSERT INTO seen_events VALUES (?, ?)",
+                    [(e, stage) for e in ids if e not in seen and e not in held]
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return seen, held
+
+    def commit_events(self, stage: int, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Insert ``rows`` and mark ``stage`` done, in one transaction; returns rows written."""
+        cols = _columns(table)
+        defaults = _DEFAULTS[table]
+        params = [tuple(r.get(c, defaults[c]) for c in cols) for r in rows]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE event_stages SET done = 1 WHERE id = ?", (stage,))
+                written = self._write(table, params) if params else 0
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        if written:
+            self._enforce_cap(table)
+        return written
+
+    def abort_events(self, stage: int) -> None:
+        # Rare, so the scan over seen_events is cheaper than indexing every id by stage.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM seen_events WHERE stage = ?", (stage,))
+            self._conn.execute("DELETE FROM event_stages WHERE id = ?", (stage,))
+            self._conn.execute("COMMIT")
+
+    def release_stale_events(self, max_age: float = 86400.0) -> int:
+        """Abort imports that started over ``max_age`` seconds ago and never finished; returns how many."""
+        with self._lock:
+            stale = [r[0] for r in self._conn.execute(
+                "SELECT id FROM event_stages WHERE done = 0 AND started < ?", (time.time() - max_age,)
+            )]
+        for stage in stale:
+            self.abort_events(stage)
+        return len(stale)
+
+    def set_cap(self, table: str, cap: int) -> None:
+        """Keep at most about ``cap`` rows of ``table`` live (0 = unlimited); applied right away."""
+        _columns(table)
+        with self._lock:
+            if cap > 0:
+                self._conn.execute("INSERT OR REPLACE INTO table_caps VALUES (?, ?)", (table, int(cap)))
+                self.caps[table] = int(cap)
+            else:
+                self._conn.execute("DELETE FROM table_caps WHERE tbl = ?", (table,))
+                self.caps.pop(table, None)
+        self._enforce_cap(table, slack=0)
+
+    def _enforce_cap(self, table: str, slack: Optional[int] = None) -> None:
+        cap = self.caps.get(table)
+        if not cap or self.spill is None:
+            return
+        n = self.count(table)
+        if n <= cap + (max(cap // 10, 1) if slack is None else slack):
+            return
+        with self._lock:
+            upto = self._conn.execute(f"SELECT id FROM {table} ORDER BY id LIMIT 1 OFFSET ?", (n - cap - 1,)).fetchone()[0]
+        try:
+            self.spill(self, table, upto)
+            self.spill_error = None
+        except Exception as e:
+            # The insert itself succeeded; the rows stay live until a later spill works.
+            self.spill_error = f"{type(e).__name__}: {e}"
+
+    def delete_through(self, table: str, upto: int) -> int:
+        """Delete rows with ids up to ``upto`` (already spilled); returns how many went.
+
+        Campaign rollups keep counting them, so dashboard totals don't change.
+        ``upto`` is recorded as the table's spill mark (see ``restore_tuples``).
+        """
+        _columns(table)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                removed = self._conn.execute(f"DELETE FROM {table} WHERE id <= ?", (upto,)).rowcount
+                self._conn.execute("UPDATE row_counts SET n = n - ? WHERE tbl = ?", (removed, table))
+                self._conn.execute(
+                    "INSERT INTO spill_marks VALUES (?, ?) ON CONFLICT (tbl) DO UPDATE SET upto = max(upto, excluded.upto)",
+                    (table, int(upto)),
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self.versions[table] += 1
+        return removed
+
+    def spilled_through(self, table: str) -> int:
+        """Highest id ever spilled out of ``table`` (0 if none)."""
+        _columns(table)
+        with self._lock:
+            row = self._conn.execute("SELECT upto FROM spill_marks WHERE tbl = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def restore_tuples(self, table: str, params: List[tuple]) -> int:
+        """Put spilled rows back under their original ids; tuples are (id, *columns). Returns rows written.
+
+        Only ids at or below the spill mark are accepted, and an id already
+        live is skipped. Such rows were never removed from the rollups, and
+        incremental readers (``rollup_state``, bandit and site stats) have
+        read past their ids, so nothing counts them twice. Caps are not
+        applied here: restored rows count toward the cap at the next insert.
+        """
+        cols = ["id"] + _columns(table)
+        mark = self.spilled_through(table)
+        params = [p for p in params if p[0] <= mark]
+        if not params:
+            return 0
+        sql = f"INSERT OR IGNORE INTO {table} ({', '.join(map(_q, cols))}) VALUES ({', '.join('?' * len(cols))})"
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(sql, params)
+                written = self._conn.total_changes - before
+                self._conn.execute("UPDATE row_counts SET n = n + ? WHERE tbl = ?", (written, table))
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            if written:
+                self.versions[table] += 1
+        return written
+
+    def _where(self, site: Optional[str], since: Optional[str], until: Optional[str], table: str = "", search: str = ""):
+        clauses, params = [], []
+        if search:
+            # Substring match over the free-text columns; a scan, unlike the other filters.
+            text_cols = [c for c, t in TABLES[table].items() if t.startswith("TEXT") and c != "time"]
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(" + " OR ".join(f"{_q(c)} LIKE ? ESCAPE '\\'" for c in text_cols) + ")")
+            params += [pattern] * len(text_cols)
+        if site:
+            clauses.append("site = ?")
+            params.append(site)
+        if since:
+            clauses.append("time >= ?")
+            params.append(since)
+        if until:
+            clauses.append("time < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(
+        self,
+        table: str,
+        site: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        search: str = "",
+    ) -> int:
+        _columns(table)
+        with self._lock:
+            if not (site or since or until or search):
+                return self._conn.execute("SELECT n FROM row_counts WHERE tbl = ?", (table,)).fetchone()[0]
+            where, params = self._where(site, since, until, table, search)
+            return self._conn.execute(f"SELECT count(*) FROM {table}{where}", params).fetchone()[0]
+
+    def fetch(
+        self,
+        table: str,
+        limit: int = 100,
+        offset: int = 0,
+        site: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        newest_first: bool = True,
+        order_by: str = "time",
+        search: str = "",
+    ) -> List[Dict[str, Any]]:
+        """Return one page of rows, optionally filtered by site, a [since, until) time range and a search term.
+
+        Ordering by ``time`` (the default) or ``site`` walks an index; other
+        columns need a sort, which SQLite bounds to ``offset + limit`` rows.
+        """
+        names = _columns(table)
+        if order_by not in names:
+            raise ValueError(f"Unknown column: {order_by}")
+        cols = ", ".join(map(_q, names))
+        where, params = self._where(site, since, until, table, search)
+        order = "DESC" if newest_first else "ASC"
+        keys = f"{_q(order_by)} {order}, " + ("" if order_by == "time" else f"time {order}, ")
+        sql = f"SELECT {cols} FROM {table}{where} ORDER BY {keys}id {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            cur = self._conn.execute(sql, params + [int(limit), int(offset)])
+            return [dict(r) for r in cur.fetchall()]
+
+    def rollup(
+        self,
+        kind: str = "day",
+        by_site: bool = True,
+        site: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Campaign totals per ``kind`` bucket ("site", "day" or "week"), oldest bucket first.
+
+        With ``by_site=False`` the sites within each bucket are summed together.
+        """
+        if kind not in ROLLUP_BUCKETS:
+            raise ValueError(f"Unknown rollup: {kind}")
+        clauses, params = ["kind = ?"], [kind]
+        if site:
+            clauses.append("site = ?")
+            params.append(site)
+        if since:
+            clauses.append("bucket >= ?")
+            params.append(since)
+        if until:
+            clauses.append("bucket < ?")
+            params.append(until)
+        metrics = ["snapshots"] + ROLLUP_METRICS
+        if by_site:
+            sql = f"SELECT bucket, site, {', '.join(metrics)} FROM campaign_rollup WHERE {' AND '.join(clauses)} ORDER BY bucket, site"
+        else:
+            sums = ", ".join(f"sum({m}) AS {m}" for m in metrics)
+            sql = f"SELECT bucket, {sums} FROM campaign_rollup WHERE {' AND '.join(clauses)} GROUP BY bucket ORDER BY bucket"
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def _iter_raw(self, table: str, batch: int, site: Optional[str], after: int, upto: Optional[int] = None) -> Iterator[List[tuple]]:
+        # Tuples of (id, *columns) oldest-first, one primary-key range per batch.
+        cols = ", ".join(map(_q, _columns(table)))
+        last = after
+        while True:
+            params: List[Any] = [last]
+            extra = ""
+            if site:
+                extra = " AND site = ?"
+                params.append(site)
+            if upto is not None:
+                extra += " AND id <= ?"
+                params.append(upto)
+            with self._lock:
+                cur = self._conn.execute(
+                    f"SELECT id, {cols} FROM {table} WHERE id > ?{extra} ORDER BY id LIMIT ?",
+                    params + [batch],
+                )
+                cur.row_factory = None
+                rows = cur.fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield rows
+
+    def iter_rows(
+        self,
+        table: str,
+        batch: int = 10_000,
+        site: Optional[str] = None,
+        after: int = 0,
+        with_id: bool = False,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield every row with an id above ``after`` oldest-first in batches, walking the primary key."""
+        names = _columns(table)
+        for rows in self._iter_raw(table, batch, site, after):
+            if with_id:
+                yield [dict(zip(["id"] + names, r)) for r in rows]
+            else:
+                yield [dict(zip(names, r[1:])) for r in rows]
+
+    def iter_columns(
+        self,
+        table: str,
+        batch: int = 50_000,
+        after: int = 0,
+        upto: Optional[int] = None,
+        with_id: bool = False,
+    ) -> Iterator[Dict[str, list]]:
+        """Like ``iter_rows`` but each batch is column name -> values, skipping per-row dicts.
+
+        ``upto`` stops at that id, so a long export sees a fixed snapshot of the table.
+        """
+        names = (["id"] if with_id else []) + _columns(table)
+        first = 0 if with_id else 1
+        for rows in self._iter_raw(table, batch, None, after, upto):
+            yield {c: [r[i] for r in rows] for i, c in enumerate(names, first)}
+
+    def last_id(self, table: str) -> int:
+        _columns(table)
+        with self._lock:
+            return self._conn.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+
+    def get_many(self, table: str, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Rows by id, e.g. to resolve index hits back to full records."""
+        cols = ", ".join(map(_q, _columns(table)))
+        ids = [int(i) for i in ids]
+        out: Dict[int, Dict[str, Any]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                sql = f"SELECT id, {cols} FROM {table} WHERE id IN ({', '.join('?' * len(part))})"
+                for r in self._conn.execute(sql, part):
+                    out[r["id"]] = {k: r[k] for k in r.keys() if k != "id"}
+        return out
+
+    def iter_csv(self, table: str, batch: int = 10_000) -> Iterator[bytes]:
+        """Stream the table as UTF-8 CSV, one encoded chunk per batch."""
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=_columns(table))
+        writer.writeheader()
+        for rows in self.iter_rows(table, batch=batch):
+            writer.writerows(rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode("utf-8")
+
+    def sites(self, table: str) -> List[str]:
+        # Walks the (site, time) index one distinct key at a time.
+        _columns(table)
+        with self._lock:
+            return [r[0] for r in self._conn.execute(f"SELECT DISTINCT site FROM {table} ORDER BY site")]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
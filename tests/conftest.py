@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """A local HTTP stand-in: scripted statuses per method and path, and a log of every request.
+
+    ``script(method, path, *statuses)`` queues the statuses the next
+    requests get; the last one repeats, and unscripted requests get 200.
+    ``delay`` holds each response that long, to observe concurrency.
+    """
+
+    def __init__(self):
+        self.requests: List[Dict[str, Any]] = []
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._statuses: Dict[tuple, List[int]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def script(self, method: str, path: str, *statuses: int) -> None:
+        self._statuses[(method, path)] = list(statuses)
+
+    def calls(self, method: str = "", path: str = "") -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r for r in self.requests if (not method or r["method"] == method) and (not path or r["path"] == path)]
+
+    def _status(self, method: str, path: str) -> int:
+        with self._lock:
+            queued = self._statuses.get((method, path))
+            if not queued:
+                return 200
+            return queued.pop(0) if len(queued) > 1 else queued[0]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.requests.append({"method": self.command, "path": self.path, "body": body, "time": time.monotonic()})
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if stub.delay:
+                        time.sleep(stub.delay)
+                    status = stub._status(self.command, self.path)
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            do_GET = do_HEAD = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def http_stub():
+    stub = StubServer()
+    yield stub
+    stub.close()
@@ -0,0 +1,67 @@
+import time
+
+from health import HealthCache, SiteChecker
+
+
+def checker(**kwargs):
+    kwargs.setdefault("per_host_interval", 0.0)
+    kwargs.setdefault("timeout", 2.0)
+    return SiteChecker(HealthCache(""), **kwargs)
+
+
+def run(c, urls, timeout=10.0):
+    assert c.start(urls)
+    c.wait(timeout)
+    assert not c.running
+    return c
+
+
+def test_probes_and_classifies(http_stub):
+    http_stub.script("HEAD", "/gone", 404)
+    c = run(checker(), [f"{http_stub.url}/ok", f"{http_stub.url}/gone"])
+    assert (c.status, c.done, c.total) == ("done", 2, 2)
+    assert c.cache.health(f"{http_stub.url}/ok") == "up"
+    assert c.cache.health(f"{http_stub.url}/gone") == "down"
+
+
+def test_falls_back_to_get_when_head_is_refused(http_stub):
+    http_stub.script("HEAD", "/nohead", 405)
+    c = run(checker(), [f"{http_stub.url}/nohead"])
+    assert [r["method"] for r in http_stub.calls(path="/nohead")] == ["HEAD", "GET"]
+    assert c.cache.health(f"{http_stub.url}/nohead") == "up"
+
+
+def test_caps_concurrent_probes(http_stub):
+    http_stub.delay = 0.2
+    c = run(checker(concurrency=3), [f"{http_stub.url}/p{i}" for i in range(9)])
+    assert c.done == 9
+    assert http_stub.max_in_flight == 3
+
+
+def test_spaces_starts_to_one_host(http_stub):
+    interval = 0.2
+    run(checker(per_host_interval=interval), [f"{http_stub.url}/p{i}" for i in range(4)])
+    starts = [r["time"] for r in http_stub.calls("HEAD")]
+    assert len(starts) == 4
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= interval * 0.9
+
+
+def test_cancel_skips_pending_probes_promptly(http_stub):
+    c = checker(per_host_interval=1.0)
+    urls = [f"{http_stub.url}/p{i}" for i in range(20)]
+    assert c.start(urls)
+    time.sleep(0.2)
+    cancelled = time.monotonic()
+    c.cancel()
+    c.wait(5)
+    assert not c.running
+    assert time.monotonic() - cancelled < 1.0
+    assert (c.status, c.done, c.progress) == ("cancelled", 20, 1.0)
+    assert len(http_stub.calls("HEAD")) == 1
+
+
+def test_one_failing_probe_does_not_fail_the_run(http_stub):
+    c = run(checker(), ["http://[bad", f"{http_stub.url}/ok"])
+    assert (c.status, c.done) == ("done", 2)
+    assert c.cache.health("http://[bad") == "down"
+    assert c.cache.health(f"{http_stub.url}/ok") == "up"
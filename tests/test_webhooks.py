@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pytest
+
+from webhooks import WebhookDispatcher
+
+
+@pytest.fixture
+def dispatcher(tmp_path):
+    d = WebhookDispatcher(linger=0.0, max_retries=2, backoff=0.01, timeout=2.0, dead_letter_path=str(tmp_path / "dead.jsonl"))
+    yield d
+    d.close()
+
+
+def dead_letters(d):
+    with open(d.dead_letter_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_retries_retryable_statuses(http_stub, dispatcher, status):
+    http_stub.script("POST", "/hook", status, status, 200)
+    assert dispatcher.emit(f"{http_stub.url}/hook", "ping", {"n": 1})
+    assert dispatcher.flush(5)
+    assert len(http_stub.calls("POST", "/hook")) == 3
+    stats = dispatcher.stats()[f"{http_stub.url}/hook"]
+    assert (stats["requests"], stats["retries"], stats["last_status"]) == (1, 2, 200)
+    assert dispatcher.dead_letter_count() == 0
+
+
+def test_does_not_retry_client_errors(http_stub, dispatcher):
+    http_stub.script("POST", "/hook", 400)
+    dispatcher.emit(f"{http_stub.url}/hook", "ping", {"n": 1})
+    assert dispatcher.flush(5)
+    assert len(http_stub.calls("POST", "/hook")) == 1
+    assert [e["error"] for e in dead_letters(dispatcher)] == ["HTTP 400"]
+
+
+def test_dead_letters_after_retries_run_out(http_stub, dispatcher):
+    http_stub.script("POST", "/hook", 502)
+    dispatcher.emit(f"{http_stub.url}/hook", "ping", {"n": 1})
+    assert dispatcher.flush(5)
+    assert len(http_stub.calls("POST", "/hook")) == dispatcher.max_retries + 1
+    (entry,) = dead_letters(dispatcher)
+    assert entry["url"] == f"{http_stub.url}/hook"
+    assert entry["error"] == "HTTP 502"
+    assert entry["payload"]["event"] == "ping"
+    assert entry["payload"]["data"] == {"n": 1}
+
+
+def test_replay_dead_letters(http_stub, dispatcher):
+    http_stub.script("POST", "/hook", 502, 502, 502, 200)
+    dispatcher.emit(f"{http_stub.url}/hook", "ping", {"n": 1})
+    assert dispatcher.flush(5)
+    assert dispatcher.dead_letter_count() == 1
+    assert dispatcher.replay_dead_letters() == 1
+    assert dispatcher.flush(5)
+    assert dispatcher.dead_letter_count() == 0
+    sent = http_stub.calls("POST", "/hook")[-1]
+    assert json.loads(sent["body"])["data"] == {"n": 1}
+
+
+def test_batches_events_to_one_endpoint(http_stub, tmp_path):
+    d = WebhookDispatcher(linger=0.5, workers=1, dead_letter_path=str(tmp_path / "dead.jsonl"))
+    try:
+        for n in range(3):
+            d.emit(f"{http_stub.url}/hook", "ping", {"n": n})
+        assert d.flush(5)
+    finally:
+        d.close()
+    (call,) = http_stub.calls("POST", "/hook")
+    assert [e["data"]["n"] for e in json.loads(call["body"])["events"]] == [0, 1, 2]
+
+
+@pytest.mark.parametrize("data", [{"n": np.int64(3)}, {"x": float("nan")}])
+def test_worker_survives_unencodable_payload(http_stub, dispatcher, data):
+    url = f"{http_stub.url}/hook"
+    for _ in dispatcher._threads:
+        dispatcher.emit(url, "bad", data)
+    assert dispatcher.flush(5)
+    assert all(t.is_alive() for t in dispatcher._threads)
+    entries = dead_letters(dispatcher)
+    assert entries and all(e["payload"]["event"] == "bad" for e in entries)
+    # Encoding never succeeds, so it is not retried.
+    assert dispatcher.stats()[url]["retries"] == 0
+
+    dispatcher.emit(url, "ok", {"n": 1})
+    assert dispatcher.flush(5)
+    assert json.loads(http_stub.calls("POST", "/hook")[-1]["body"])["event"] == "ok"
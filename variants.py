@@ -0,0 +1,251 @@
+"""Ad variant generation: single briefs and background bulk jobs."""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+
+from parallel import chunked, ordered_map
+from perf import timed
+
+# ---------- Master Styles ----------
+MASTER_STYLES = {
+    "Gary Halbert": "raw, emotional hooks (greed/fear/curiosity), short punchy lines, story lead-ins",
+    "David Ogilvy": "benefit-first, specific proof, facts, and strong subheads",
+    "Dan Kennedy": "no-BS direct response, deadlines, risk reversal, clear offer",
+    "Claude Hopkins": "self-interest, testable claims, unique mechanism/USP",
+    "Joe Sugarman": "slippery-slide curiosity, sensory detail, axioms of trust",
+    "Eugene Schwartz": "awareness stages aligned to market desire, breakthrough promise",
+    "John Carlton": "killer hooks, urgency, vivid storytelling, exclusivity",
+    "Robert Bly": "4 U's (Urgent, Unique, Useful, Ultra-specific), long-form structure",
+    "Neville Medhora": "simple, scannable, problem→solution→proof",
+    "Joanna Wiebe": "voice-of-customer, message mining, test-ready copy",
+    "Hybrid Mix": "blend of the above tuned to conversion",
+}
+
+@timed()
+def make_variants(product: str, benefit: str, audience: str, master: str) -> List[Dict[str, str]]:
+    a = audience.strip() or "someone who needs this"
+    b = benefit.strip() or "get real results without the struggle"
+    short_b = b.split("(")[0].strip()
+    h = []
+    h.append(f"Finally: {product} That Helps You {short_b.capitalize()} — Without The Struggle")
+    h.append(f"How {a.capitalize()} Can {short_b} with {product}")
+    h.append(f"{product}: The “{short_b}” Shortcut You Can Start Using Today")
+    h.append(f"Do You Make These Mistakes When Trying to {short_b}?")
+    h.append(f"The Hidden Shortcut to {short_b} No One Told You About")
+    body = textwrap.dedent(f"""
+    [{master}-inspired tone – {MASTER_STYLES.get(master,'conversion-focused')}]
+
+    ATTENTION
+    If you're {a}, you're not alone. Most attempts to {short_b.lower()} fail because of confusing advice and copy that doesn't speak to what you actually want.
+
+    INTEREST
+    **{product}** is built to change that. It leads with the one thing you care about: {short_b.lower()} (backed by a clear, simple path).
+
+    DESIRE
+    • {short_b}
+    • Save time and guesswork
+    • See real progress you can feel
+
+    ACTION
+    Click to get started now. Limited attention = limited action. Act while it’s top of mind.
+    """).strip()
+    return [{"headline": x, "body": body} for x in h]
+
+
+def variant_id(ad: Dict[str, str]) -> str:
+    """Stable short ID for a variant's copy, used to tag snapshots and postings."""
+    text = f"{(ad.get('headline') or '').strip()}\x00{(ad.get('body') or '').strip()}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest()
+
+
+# ---------- Bulk Generation ----------
+BRIEF_FIELDS = ["product", "benefit", "audience", "body_extra"]
+BULK_COLUMNS = ["brief", "product", "audience", "benefit", "master", "variant", "headline", "body"]
+BULK_DIR = os.path.join(tempfile.gettempdir(), "illuminati_bulk")
+# Finished bulk CSVs older than this are deleted when the next job starts.
+BULK_MAX_AGE = 24 * 3600.0
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def prune_bulk_files(max_age: float = BULK_MAX_AGE) -> int:
+    """Delete bulk CSVs not written to for ``max_age`` seconds; returns how many were removed."""
+    if not os.path.isdir(BULK_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(BULK_DIR):
+        path = os.path.join(BULK_DIR, name)
+        if name.startswith("variants_") and name.endswith(".csv"):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _executor() -> ThreadPoolExecutor:
+    # One pool per process, shared by every session, so reruns never spawn threads.
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bulk-variants")
+        return _EXECUTOR
+
+
+def read_briefs(data: bytes) -> Tuple[List[Dict[str, str]], int]:
+    """Parse a briefs CSV; returns (briefs, skipped rows without product/benefit)."""
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    briefs, skipped = [], 0
+    for row in reader:
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        if not row.get("product") or not row.get("benefit"):
+            skipped += 1
+            continue
+        briefs.append({f: row.get(f, "") for f in BRIEF_FIELDS})
+    return briefs, skipped
+
+
+def _iter_combos(briefs: Iterable[Dict[str, str]], masters: List[str], start: int = 1) -> Iterator[List[Dict[str, str]]]:
+    # One list of variant rows per (brief, master) pair, produced on demand.
+    for bi, brief in enumerate(briefs, start=start):
+        extra = brief.get("body_extra", "").strip()
+        audience = brief.get("audience", "")
+        for master in masters:
+            yield [
+                {
+                    "brief": bi,
+                    "product": brief["product"],
+                    "audience": audience,
+                    "benefit": brief["benefit"],
+                    "master": master,
+                    "variant": vi,
+                    "headline": v["headline"],
+                    "body": v["body"] + ("\n\n" + extra if extra else ""),
+                }
+                for vi, v in enumerate(make_variants(brief["product"], brief["benefit"], audience, master), start=1)
+            ]
+
+
+def _expand_chunk(job: Tuple[int, List[Dict[str, str]], List[str]]) -> List[Dict[str, str]]:
+    start, briefs, masters = job
+    return [row for rows in _iter_combos(briefs, masters, start) for row in rows]
+
+
+def iter_bulk_variants(briefs: Iterable[Dict[str, str]], masters: List[str], workers: int = 1, chunk_size: int = 50) -> Iterator[Dict[str, str]]:
+    """Lazily expand briefs × master styles into flat variant rows.
+
+    ``workers > 1`` expands chunks of briefs in a process pool; rows still
+    come out in brief order.
+    """
+    if workers <= 1:
+        for rows in _iter_combos(briefs, masters):
+            yield from rows
+        return
+    jobs = ((1 + i * chunk_size, chunk, masters) for i, chunk in enumerate(chunked(briefs, chunk_size)))
+    for rows in ordered_map(_expand_chunk, jobs, workers):
+        yield from rows
+
+
+class BulkJob:
+    """A cancellable bulk generation run that streams variants to a CSV on disk."""
+
+    def __init__(self, briefs: List[Dict[str, str]], masters: List[str], chunk_size: int = 2000):
+        self.id = uuid.uuid4().hex[:12]
+        self.briefs = briefs
+        self.masters = list(masters)
+        self.chunk_size = chunk_size
+        self.total = len(briefs) * len(self.masters)
+        self.done = 0
+        self.rows_written = 0
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.path = os.path.join(BULK_DIR, f"variants_{self.id}.csv")
+        self._cancel = threading.Event()
+        self._discarded = False
+        self._future: Optional[Future] = None
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def available(self) -> bool:
+        """Whether the CSV is still on disk; old ones are pruned when later jobs start."""
+        return os.path.exists(self.path)
+
+    def start(self) -> "BulkJob":
+        self._future = _executor().submit(self._run)
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def _run(self) -> None:
+        self.status = "running"
+        try:
+            os.makedirs(BULK_DIR, exist_ok=True)
+            prune_bulk_files()
+            with open(self.path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=BULK_COLUMNS)
+                writer.writeheader()
+                chunk: List[Dict[str, str]] = []
+                pending = 0
+                for rows in _iter_combos(self.briefs, self.masters):
+                    if self._cancel.is_set():
+                        break
+                    chunk.extend(rows)
+                    pending += 1
+                    if len(chunk) >= self.chunk_size:
+                        writer.writerows(chunk)
+                        self.rows_written += len(chunk)
+                        self.done += pending
+                        chunk, pending = [], 0
+                writer.writerows(chunk)
+                self.rows_written += len(chunk)
+                self.done += pending
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished = time.time()
+            if self._discarded:
+                self._remove()
+
+    def preview(self, n: int = 20) -> List[Dict[str, str]]:
+        if not self.available:
+            return []
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return [row for _, row in zip(range(n), reader)]
+
+    def _remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def discard(self) -> None:
+        """Cancel the job and delete its CSV; a running job deletes it when its worker stops."""
+        self._discarded = True
+        self.cancel()
+        if not self.running:
+            self._remove()
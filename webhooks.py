@@ -0,0 +1,242 @@
+"""Background webhook dispatcher: pooled connections, batching, retries, dead letters."""
+import datetime
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from store import DATA_DIR
+
+SOURCE = "Illuminati Ad Poster"
+DEAD_LETTER_PATH = os.path.join(DATA_DIR, "webhook_dead_letter.jsonl")
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def make_event(event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "source": SOURCE,
+        "event": event,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "data": data,
+    }
+
+
+class EndpointStats:
+    __slots__ = ("sent", "events", "failed", "retries", "last_status", "last_error", "last_latency", "total_latency", "max_latency")
+
+    def __init__(self):
+        self.sent = self.events = self.failed = self.retries = 0
+        self.last_status: Optional[int] = None
+        self.last_error = ""
+        self.last_latency = self.total_latency = self.max_latency = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        attempts = self.sent + self.failed
+        return {
+            "requests": self.sent,
+            "events": self.events,
+            "failed": self.failed,
+            "retries": self.retries,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "avg_ms": round(self.total_latency / attempts * 1000, 1) if attempts else 0.0,
+            "last_ms": round(self.last_latency * 1000, 1),
+            "max_ms": round(self.max_latency * 1000, 1),
+        }
+
+
+class WebhookDispatcher:
+    """Sends webhook events from worker threads so the Streamlit script never blocks.
+
+    ``emit`` only enqueues. Workers drain the bounded queue, group events
+    that arrive within ``linger`` seconds by endpoint, and POST a single
+    event as-is or several as one ``{"events": [...]}`` payload over a
+    pooled ``requests.Session``. Failures are retried with exponential
+    backoff; payloads that still fail, or that find the queue full, are
+    appended to a JSONL dead-letter file for later replay.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        max_batch: int = 50,
+        linger: float = 0.25,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        workers: int = 2,
+        dead_letter_path: str = DEAD_LETTER_PATH,
+        session: Optional[requests.Session] = None,
+    ):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.dead_letter_path = dead_letter_path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=maxsize)
+        self._stats: Dict[str, EndpointStats] = {}
+        self._stats_lock = threading.Lock()
+        self._dead_lock = threading.Lock()
+        self._stop = threading.Event()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(workers, 4))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self._session = session
+        self._threads = [
+            threading.Thread(target=self._run, name=f"webhook-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ---------- Producer side ----------
+    def emit(self, url: str, event: str, data: Dict[str, Any]) -> bool:
+        return self.submit(url, make_event(event, data))
+
+    def submit(self, url: str, payload: Dict[str, Any]) -> bool:
+        """Queue a payload; returns False (and dead-letters it) if the queue is full."""
+        if not url:
+            return False
+        try:
+            self._queue.put_nowait({"url": url, "payload": payload})
+            return True
+        except queue.Full:
+            self._dead_letter(url, [payload], "queue full")
+            return False
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {url: s.as_dict() for url, s in self._stats.items()}
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until every queued event has been delivered or dead-lettered."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._session.close()
+
+    # ---------- Dead letters ----------
+    def _dead_letter(self, url: str, payloads: List[Dict[str, Any]], error: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+        now = datetime.datetime.utcnow().isoformat()
+        with self._dead_lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for p in payloads:
+                # default=str so a payload requests could not encode can still be kept.
+                f.write(json.dumps({"time": now, "url": url, "error": error, "payload": p}, default=str) + "\n")
+
+    def dead_letter_count(self) -> int:
+        if not os.path.exists(self.dead_letter_path):
+            return 0
+        with self._dead_lock, open(self.dead_letter_path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def replay_dead_letters(self) -> int:
+        """Re-queue every dead-lettered payload; returns how many were queued."""
+        with self._dead_lock:
+            if not os.path.exists(self.dead_letter_path):
+                return 0
+            with open(self.dead_letter_path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            os.remove(self.dead_letter_path)
+        return sum(self.submit(e["url"], e["payload"]) for e in entries)
+
+    # ---------- Worker side ----------
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            by_url: Dict[str, List[Dict[str, Any]]] = {}
+            for item in batch:
+                by_url.setdefault(item["url"], []).append(item["payload"])
+            try:
+                for url, payloads in by_url.items():
+                    try:
+                        self._deliver(url, payloads)
+                    except Exception as e:
+                        # Only reached if dead-lettering itself fails (e.g. a full
+                        # disk); the worker records it and keeps draining the queue.
+                        with self._stats_lock:
+                            stats = self._stats.setdefault(url, EndpointStats())
+                            stats.failed += 1
+                            stats.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, url: str, payloads: List[Dict[str, Any]]) -> None:
+        body = payloads[0] if len(payloads) == 1 else {"source": SOURCE, "events": payloads}
+        with self._stats_lock:
+            stats = self._stats.setdefault(url, EndpointStats())
+        error = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._stats_lock:
+                    stats.retries += 1
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+            start = time.perf_counter()
+            status: Optional[int] = None
+            retry = True
+            try:
+                r = self._session.post(url, json=body, timeout=self.timeout)
+                status = r.status_code
+                error = "" if r.ok else f"HTTP {status}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                # A payload that cannot be encoded (NaN, NumPy scalars, ...) fails the same way every time.
+                retry = isinstance(e, requests.RequestException) and not isinstance(e, requests.exceptions.InvalidJSONError)
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stats.last_latency = elapsed
+                stats.total_latency += elapsed
+                stats.max_latency = max(stats.max_latency, elapsed)
+                stats.last_status = status
+                stats.last_error = error
+                if not error:
+                    stats.sent += 1
+                    stats.events += len(payloads)
+                else:
+                    stats.failed += 1
+            if not error:
+                return
+            if not retry or (status is not None and status not in RETRY_STATUSES):
+                break
+        self._dead_letter(url, payloads, error)